@@ -1,6 +1,8 @@
 from .core.agent import Agent
+from .core.context import Context
 from .core.llm.base import LLMProvider
 from .core.llm.openai_compatible import OpenAICompatibleProvider
+from .core.session import SessionStore
 from .init import init
 
-__all__ = ["Agent", "LLMProvider", "OpenAICompatibleProvider", "init"]
+__all__ = ["Agent", "Context", "LLMProvider", "OpenAICompatibleProvider", "SessionStore", "init"]
@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from .core.agent import Agent
+from .core.context import Context
+from .core.skill_router import SkillRouter
+from .core.memory.manager import MemoryManager
+
+def _read_items(path):
+    """
+    Yields (id, turns) from a JSONL file. Each line is one of:
+    - {"id": ..., "prompt": "..."}: a single-turn conversation.
+    - {"id": ..., "turns": ["...", "..."]}: user turns, sent one after another.
+    - {"id": ..., "messages": [{"role": "user", "content": "..."}, ...]}: the user messages are the turns.
+    Lines without an id are numbered by position ("line-1", "line-2", ...).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"prompt": item}
+            if "turns" in item:
+                turns = list(item["turns"])
+            elif "messages" in item:
+                turns = [m["content"] for m in item["messages"] if m.get("role") == "user"]
+            else:
+                turns = [item["prompt"]]
+            yield str(item.get("id", f"line-{number}")), turns
+
+def _completed_ids(output_path, retry_errors):
+    """IDs already in the output file, i.e. the items to skip when resuming."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn last line from an interrupted run; that item runs again
+                continue
+            if retry_errors and record.get("error"):
+                continue
+            done.add(record["id"])
+    return done
+
+
+class BatchRunner:
+    """
+    Runs conversations through independent Agents with bounded concurrency.
+
+    All Agents share one Context and one provider, but each conversation gets its
+    own in-memory MemoryManager: it starts from the saved memories, and what one
+    conversation remembers is not seen by the others nor written back to the
+    memory file. `concurrency` workers each take
+    the next pending item, run its turns with `Agent.achat` and write the result
+    as one JSON line, flushed immediately. Results are in completion order.
+    """
+    def __init__(self, provider, context, concurrency=8, timeout=None, agent_kwargs=None):
+        self.provider = provider
+        self.context = context
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.agent_kwargs = agent_kwargs or {}
+        self.stats = {"done": 0, "errors": 0, "skipped": 0}
+
+    async def _run_item(self, item_id, turns):
+        memory = MemoryManager(persistent=False, initial=self.context.memory.storage.list_all())
+        agent = Agent(provider=self.provider, context=self.context, memory=memory, **self.agent_kwargs)
+        started = time.perf_counter()
+        responses = []
+        error = None
+        try:
+            for turn in turns:
+                response = await asyncio.wait_for(agent.achat(turn), self.timeout)
+                responses.append(response)
+                # A failed turn (e.g. a provider error) still returns a reply; the exception is kept on the agent
+                if agent.last_error is not None:
+                    error = f"{type(agent.last_error).__name__}: {agent.last_error}"
+                    break
+        except asyncio.TimeoutError:
+            error = f"Timed out after {self.timeout}s"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        return {
+            "id": item_id,
+            "response": responses[-1] if responses else None,
+            "responses": responses,
+            "error": error,
+            "duration_s": round(time.perf_counter() - started, 3),
+        }
+
+    async def run(self, input_path, output_path, resume=True, retry_errors=False, progress_every=100):
+        done = _completed_ids(output_path, retry_errors) if resume else set()
+        items = _read_items(input_path)
+
+        with open(output_path, "a" if resume else "w", encoding="utf-8") as out:
+            async def worker():
+                # Items are pulled lazily, so huge inputs are never loaded into memory at once
+                for item_id, turns in items:
+                    if item_id in done:
+                        self.stats["skipped"] += 1
+                        continue
+                    record = await self._run_item(item_id, turns)
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    self.stats["done"] += 1
+                    if record["error"]:
+                        self.stats["errors"] += 1
+                    if progress_every and self.stats["done"] % progress_every == 0:
+                        print(f"[batch] {self.stats['done']} done, {self.stats['errors']} errors, {self.stats['skipped']} skipped", file=sys.stderr)
+
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return self.stats
+
+
+def main(argv=None):
+    from .main import create_provider
+
+    parser = argparse.ArgumentParser(prog="ada batch", description="Run prompts from a JSONL file through independent agent sessions.")
+    parser.add_argument("input", help="JSONL file of prompts or conversations.")
+    parser.add_argument("-o", "--output", help="JSONL results file (default: <input>.results.jsonl).")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Conversations in flight at once.")
+    parser.add_argument("--provider", help="LLM provider (default: LLM_PROVIDER env var).")
+    parser.add_argument("--timeout", type=float, help="Seconds allowed per turn.")
+    parser.add_argument("--no-resume", action="store_true", help="Start over instead of skipping items already in the output.")
+    parser.add_argument("--retry-errors", action="store_true", help="When resuming, run items that failed last time again.")
+    parser.add_argument("--skill-router", action="store_true", help="Preselect skills before the first LLM call.")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    try:
+        provider = create_provider(args.provider)
+    except Exception as e:
+        print(f"Initialization Error: {e}")
+        return 1
+
+    # One Context for all sessions: persona, skills, knowledge and saved memories load once
+    context = Context()
+    runner = BatchRunner(
+        provider, context,
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+        agent_kwargs={"skill_router": SkillRouter(context.skill_index)} if args.skill_router else None
+    )
+    stats = asyncio.run(runner.run(args.input, output, resume=not args.no_resume, retry_errors=args.retry_errors))
+    print(f"[batch] Finished: {stats['done']} done, {stats['errors']} errors, {stats['skipped']} skipped -> {output}", file=sys.stderr)
+    return 0
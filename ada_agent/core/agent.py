@@ -1,137 +1,203 @@
 import os
 import json
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from openai import OpenAI
-from .tools import TOOLS_SCHEMA, AVAILABLE_TOOLS, run_command, read_file, list_files
-from .skill_loader import SkillRegistry, load_skill_by_name, search_skills, list_skills_in_category
-from .memory.manager import MemoryManager
-from .knowledge.rag import SimpleRAG
+from .tools import TOOLS_SCHEMA, AVAILABLE_TOOLS, run_command, arun_command, read_file, list_files
+from .context import Context
 from .llm.base import LLMProvider
+from .llm.types import StreamEvent, Usage, SessionUsage
+from .tool_registry import ToolRegistry
+from .shell_pool import ShellPool, ShellSession
+from .skill_executor import PythonWorkerPool, SkillExecutor
+from .utils import estimate_tokens, estimate_message_tokens
+from .compaction import SUMMARY_HEADER, heuristic_summary
+from .instrumentation import Event, usage_to_dict
+from .skill_router import SkillRouter
 
 class Agent:
-    def __init__(self, provider: LLMProvider, memory_path: str = None, skills_dirs: list[str] = None, knowledge_path: str = None, persona_path: str = None, verbose=False, show_full_context=False, max_chat_history=10):
-        # 1. Automatic Context Initialization (Simplification)
-        # If no paths are provided, default to ./context in the current working directory.
-        if memory_path is None and skills_dirs is None and knowledge_path is None and persona_path is None:
-            cwd = os.getcwd()
-            context_dir = os.path.join(cwd, "context")
-            
-            # Auto-init if missing
-            if not os.path.exists(context_dir):
-                if verbose:
-                    print(f"[Agent] No context found. Initializing default context in {context_dir}...")
-                try:
-                    # Local import to avoid circular dependency (ada_agent -> core.agent -> ada_agent)
-                    from ...init import init
-                    init(cwd)
-                except ImportError:
-                    # Fallback if relative import fails or structure is different
-                    try:
-                        from ada_agent.init import init
-                        init(cwd)
-                    except ImportError:
-                         print("[Agent] Warning: Could not auto-initialize context. Please run 'ada_agent.init()' manually.")
-            
-            # Set defaults
-            if verbose: print(f"[Agent] Using default context at {context_dir}")
-            
-            memory_path = os.path.join(context_dir, "memory", "memory.json")
-            knowledge_path = os.path.join(context_dir, "knowledge")
-            skills_dirs = [os.path.join(context_dir, "skills")]
-            persona_path = os.path.join(context_dir, "persona")
+    def __init__(self, provider: LLMProvider, memory_path: str = None, skills_dirs: list[str] = None, knowledge_path: str = None, persona_path: str = None, verbose=False, show_full_context=False, max_chat_history=10, max_parallel_tools=4, max_context_tokens=None, token_estimator=None, compaction_threshold_tokens=None, summarizer=None, compaction_archive_path=None, session_store=None, session_id=None, context=None, observers=None, skill_router=None, shell=None, skill_workers=None, memory=None):
+        # Persona, skill index, knowledge base, memory and the rendered system prompt
+        # live in a Context that many Agents can share. Without one, this Agent builds
+        # its own from the path arguments (which are ignored when `context` is given).
+        if context is None:
+            context = Context(memory_path=memory_path, skills_dirs=skills_dirs, knowledge_path=knowledge_path, persona_path=persona_path, verbose=verbose)
+        self.context = context
+        # Optional MemoryManager of this Agent's own, used instead of the Context's shared one
+        self._memory = memory
 
         self.provider = provider
         self.messages = []
         self.verbose = verbose
+        # Instrumentation: callables receiving an `Event` (see core/instrumentation.py)
+        self.observers = list(observers or [])
+        # Tokens, latency and finish reasons summed over this session's LLM requests
+        self.session_usage = SessionUsage()
         self.show_full_context = show_full_context
         self.max_chat_history = max_chat_history
+        # Token-budgeted windowing: when set, the context sent to the LLM is bounded
+        # by estimated tokens instead of by `max_chat_history` messages.
+        self.max_context_tokens = max_context_tokens
+        # Callable[[str], int]; plug in a real tokenizer for exact counts
+        self.token_estimator = token_estimator or estimate_tokens
+        # Guards `messages` and the window: compaction rewrites them from a background thread
+        self._history_lock = threading.RLock()
+        self._reset_window()
+        # Rolling compaction: once the conversation exceeds this many estimated tokens,
+        # older turns are summarized (in the background, after a turn returns) and
+        # moved to the archive. `summarizer(messages, previous_summary) -> str`.
+        self.compaction_threshold_tokens = compaction_threshold_tokens
+        self.summarizer = summarizer or heuristic_summary
+        self.compaction_archive_path = compaction_archive_path
+        self.archived_messages = [] # Compacted raw turns, when no archive path is set
+        self._summary_message = None
+        self._compaction_thread = None
+        # Upper bound on tool calls from a single assistant turn running at once
+        self.max_parallel_tools = max_parallel_tools
         # We start with NO specific skills loaded, only the directory info
         self.loaded_skill_names = set()
         self.pending_injections = [] # Buffer for system messages during tool loops
+        # (previous message, call, result) for each discovery step folded away during an `achat` turn
+        self._fold_log = None
         
-        # Initialize Memory
-        # If memory_path is provided, it overtakes default env var
-        mem_path = memory_path or os.getenv("ADA_MEMORY_PATH")
-        self.memory = MemoryManager(mem_path)
-
-        # Initialize Simple RAG
-        # If knowledge_path is provided, it overtakes default env var
-        self.rag = None
-        if knowledge_path and os.path.exists(knowledge_path):
-            self.rag = SimpleRAG(knowledge_path)
-            if self.verbose:
-                print(f"[DEBUG] RAG initialized with knowledge path: {knowledge_path}")
-        
-        # Initialize Skills
-        # We rely on the user to provide skills_dirs (e.g. from init or manual setup)
-        self.skills_dirs = []
-        if skills_dirs:
-            if isinstance(skills_dirs, str):
-                 self.skills_dirs.append(skills_dirs)
-            else:
-                 self.skills_dirs.extend(skills_dirs)
+        # memory and rag are properties: they may still be loading in the background
+        self.skills = context.skill_index
+        # Optional pre-turn routing: True for a default SkillRouter, or pass one (shareable between Agents)
+        if skill_router is True:
+            skill_router = SkillRouter(self.skills)
+        self.skill_router = skill_router or None
+        # Skills preselected for the current turn: name -> (strings showing it was used, instruction tokens)
+        self._routed_skills = {}
+        self._routed_used = set()
+        # The exception that ended the last turn, whose reply is then "Error: ..."; None if it finished normally
+        self.last_error = None
+        self.skills_dirs = list(context.skills_dirs)
+        self.persona_instruction = context.persona_instruction
                  
-        self.persona_instruction = ""
-        if persona_path and os.path.exists(persona_path):
-            if os.path.isfile(persona_path):
-                 with open(persona_path, "r", encoding="utf-8") as f:
-                     self.persona_instruction = f.read()
-            elif os.path.isdir(persona_path):
-                 # Load all .md or .txt files
-                 for filename in sorted(os.listdir(persona_path)):
-                     if filename.lower().endswith(('.md', '.txt')):
-                         with open(os.path.join(persona_path, filename), "r", encoding="utf-8") as f:
-                             self.persona_instruction += f"\n\n--- Persona: {filename} ---\n" + f.read()
-            
-            if self.verbose:
-                print(f"[DEBUG] Loaded persona from {persona_path} (Length: {len(self.persona_instruction)})")
+        # Opt-in persistent shell for run_command: True for a session on the shared ShellPool,
+        # or a ShellPool / ShellSession of your own (see core/shell_pool.py). Only a ShellSession
+        # with its own `cwd` / `env` isolates this Agent's directory and environment.
+        if shell is True or isinstance(shell, ShellPool):
+            shell = ShellSession(None if shell is True else shell)
+        self.shell = shell or None
+        # Opt-in pre-warmed interpreters for `python <skill script>` commands: True for the shared
+        # PythonWorkerPool, or a PythonWorkerPool / SkillExecutor (see core/skill_executor.py)
+        if skill_workers is True or isinstance(skill_workers, PythonWorkerPool):
+            skill_workers = SkillExecutor(None if skill_workers is True else skill_workers, self.skills_dirs)
+        self.skill_executor = skill_workers or None
+
+        # Built-in tools are registered once; add your own with `agent.tools.register(...)`
+        self.tools = ToolRegistry()
+        self._register_builtin_tools()
+
+        # Session persistence: every history change is appended to the session's log
+        self.session_store = session_store
+        self.session_id = session_id
+        self._session_log = None
+        if session_store is not None:
+            if self.session_id is None:
+                self.session_id = uuid.uuid4().hex
+            if session_store.exists(self.session_id):
+                self._restore_session()
+                return
+            self._session_log = session_store.open(self.session_id)
 
         self._init_system_prompt()
 
+    def add_observer(self, observer):
+        """Registers a callable (e.g. JSONLinesExporter, MetricsAggregator) that receives every Event."""
+        self.observers.append(observer)
+
+    def _emit(self, name, start, duration=None, **attrs):
+        if not self.observers:
+            return
+        session_id = getattr(self, "session_id", None)
+        if session_id is not None:
+            attrs["session_id"] = session_id
+        event = Event(name=name, start=start, duration=duration, attrs=attrs)
+        for observer in self.observers:
+            try:
+                observer(event)
+            except Exception as e:
+                print(f"[Agent] Observer error: {e}")
+
+    @contextmanager
+    def _span(self, name, **attrs):
+        # Times the block and emits one event at the end; the block can add attrs
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except Exception as e:
+            attrs["error"] = str(e)
+            raise
+        finally:
+            self._emit(name, start, time.perf_counter() - start, **attrs)
+
+    @contextmanager
+    def _llm_span(self, messages_to_send):
+        estimated_tokens = self._system_tokens + self._window_chat_tokens
+        self._emit("llm.start", time.perf_counter(), message_count=len(messages_to_send), estimated_tokens=estimated_tokens)
+        with self._span("llm.end", message_count=len(messages_to_send), estimated_tokens=estimated_tokens) as span:
+            yield span
+
+    def _record_usage(self, span, usage, latency=None, finish_reason=None):
+        span["usage"] = usage_to_dict(usage)
+        span["finish_reason"] = finish_reason
+        # Custom providers may return other usage shapes; only normalized ones are summed
+        self.session_usage.add(usage if isinstance(usage, Usage) else None, latency, finish_reason)
+
+    @property
+    def memory(self):
+        return self._memory if self._memory is not None else self.context.memory
+
+    @property
+    def rag(self):
+        return self.context.rag
+
+    @classmethod
+    def resume(cls, session_id, provider: LLMProvider, session_store, **kwargs):
+        """
+        Rebuilds an Agent from its session log: messages, enabled skills and the
+        context window, without rendering the system prompt or re-reading skills.
+        """
+        if not session_store.exists(session_id):
+            raise ValueError(f"Session '{session_id}' not found in {session_store.directory}")
+        return cls(provider, session_store=session_store, session_id=session_id, **kwargs)
+
+    def _restore_session(self):
+        messages, skills = self.session_store.load(self.session_id)
+        self._session_log = self.session_store.open(self.session_id)
+        with self._history_lock:
+            self.messages = messages
+            self.loaded_skill_names = skills
+            self._summary_message = next(
+                (m for m in messages if m.get('role') == 'system' and str(m.get('content', '')).startswith(SUMMARY_HEADER)),
+                None
+            )
+            self._rebuild_window()
+            # A crash mid tool loop can leave tool_calls without all their results,
+            # which providers reject; drop that partial block (and log the drop).
+            for i in range(len(messages) - 1, -1, -1):
+                if messages[i].get('role') == 'assistant' and messages[i].get('tool_calls'):
+                    call_ids = {tc['id'] for tc in messages[i]['tool_calls']}
+                    answered = {m.get('tool_call_id') for m in messages[i + 1:] if m.get('role') == 'tool'}
+                    if not call_ids <= answered:
+                        self._set_messages(messages[:i])
+                    break
+        if self.verbose:
+            print(f"[DEBUG] Resumed session {self.session_id} ({len(self.messages)} messages)")
+
+    def _log_session(self, record):
+        if self._session_log is not None:
+            self._session_log.append(record)
+
     def _init_system_prompt(self):
-        # Use provided skills_dirs
-        registry = SkillRegistry(skills_dirs=self.skills_dirs)
-        categories_meta = registry.get_categories()
-        
-        # Build category list string with descriptions
-        cat_str_list = []
-        for c in categories_meta:
-            cat_str_list.append(f"- {c.name}: {c.description}")
-        categories_display = "\n   ".join(cat_str_list)
-        
-        system_msg = f"""You are a helpful AI assistant.
-{self.persona_instruction}
-You operate in a potentially sandboxed environment where you can execute code.
-
-### Tool Capabilities
-1. **Primitive Tools**: `run_command`, `read_file`, `list_files`
-2. **Skill Discovery**:
-   - Your skills are organized by CATEGORY.
-   - Available Categories:
-   {categories_display}
-   - To see skills in a category, use: `list_skills(category="name")`
-   - To using a skill, you MUST enable it first: `enable_skill(skill_name="name")`
-
-### Workflow
-1. User asks a question.
-2. If you need a specific capability (e.g. Math), check the 'Math' category with `list_skills`.
-3. Read the descriptions. If one matches, `enable_skill` for it.
-4. Once enabled, the system will inject the specific instructions (which often tell you to run a python script).
-5. Follow those instructions.
-
-### Memory
-You have a long-term memory. 
-- **AGGRESSIVE MEMORY UPDATE**: You must proactively save **ALL** user profile details, preferences, and key facts using `remember`. Do not wait for explicit instructions. If the user mentions their profession, hobbies, name, or preferences, store it immediately.
-- Use `recall(query="ignored")` to retrieve ALL stored memories. The query parameter is currently ignored, so you will see everything.
-- ALWAYS check your memory (`recall`) if the user asks something that might be stored from a previous session.
-
-Always verify the output of your commands.
-
-### Response Guidelines
-- Answer the user's question directly and concisely.
-- Do NOT mention what skills or tools you are using or have available, unless the user explicitly asks about them.
-- Do NOT list other things you can do at the end of your response.
-"""
-        self.messages.append({"role": "system", "content": system_msg})
+        system_msg = self.context.system_prompt
+        self._append_message({"role": "system", "content": system_msg})
         if self.verbose:
             print("\n[DEBUG] Initial System Prompt:")
             print("-" * 40)
@@ -145,61 +211,74 @@ Always verify the output of your commands.
            if they were single-turn calls. This effectively 'folds' the discovery process.
         2. Minifies tool outputs for other discovery tools if they can't be removed.
         """
-        messages_to_keep = []
-        skip_indices = set()
+        start = time.perf_counter()
+        with self._history_lock:
+            messages_to_keep = []
+            skip_indices = set()
         
-        # 1. Identify pairs to remove
-        for i, msg in enumerate(self.messages):
-            if i in skip_indices:
-                continue
+            # 1. Identify pairs to remove
+            for i, msg in enumerate(self.messages):
+                if i in skip_indices:
+                    continue
                 
-            # Look for Assistant -> Tool pattern
-            if msg.get('role') == 'assistant' and msg.get('tool_calls'):
-                tool_calls = msg['tool_calls']
+                # Look for Assistant -> Tool pattern
+                if msg.get('role') == 'assistant' and msg.get('tool_calls'):
+                    tool_calls = msg['tool_calls']
                 
-                # Check if this is a standalone 'list_skills' call
-                if len(tool_calls) == 1:
-                    first_call = tool_calls[0]
-                    # Handle object or dict
-                    fname = first_call['function']['name'] if isinstance(first_call, dict) else first_call.function.name
+                    # Check if this is a standalone 'list_skills' call
+                    if len(tool_calls) == 1:
+                        first_call = tool_calls[0]
+                        # Handle object or dict
+                        fname = first_call['function']['name'] if isinstance(first_call, dict) else first_call.function.name
                     
-                    if fname in ('list_skills', 'list_files', 'search_skills'):
-                        # Check if next message is the corresponding tool output
-                        if i + 1 < len(self.messages):
-                            next_msg = self.messages[i+1]
-                            if next_msg.get('role') == 'tool':
-                                # Found a pair to remove!
-                                skip_indices.add(i)
-                                skip_indices.add(i+1)
-                                if self.verbose:
-                                    print(f"[DEBUG] Folding discovery step: Removed {fname} interaction.")
-                                continue
-
-        # 2. Rebuild message list (and apply content pruning to remainders)
-        for i, msg in enumerate(self.messages):
-            if i in skip_indices:
-                continue
+                        if fname in ('list_skills', 'list_files', 'search_skills'):
+                            # Check if next message is the corresponding tool output
+                            if i + 1 < len(self.messages):
+                                next_msg = self.messages[i+1]
+                                if next_msg.get('role') == 'tool':
+                                    # Found a pair to remove!
+                                    skip_indices.add(i)
+                                    skip_indices.add(i+1)
+                                    if self._fold_log is not None:
+                                        self._fold_log.append((self.messages[i - 1] if i else None, msg, next_msg))
+                                    if self.verbose:
+                                        print(f"[DEBUG] Folding discovery step: Removed {fname} interaction.")
+                                    continue
+
+            # 2. Rebuild message list (and apply content pruning to remainders)
+            for i, msg in enumerate(self.messages):
+                if i in skip_indices:
+                    continue
             
-            # Fallback: Content Pruning for anything that survived (e.g. part of parallel calls)
-            if msg.get('role') == 'tool':
-                # We need to check function name again if disjoint
-                # But simple heuristic: close substantial outputs
-                if len(msg.get('content', '')) > 200:
-                    # Double check if it's a discovery tool by content heuristics or ID mapping
-                    # For simplicity/safety, we assume previous pruning logic was fine, 
-                    # but since we are rebuilding, let's just leave it or specific check.
-                    # Let's trust the 'Folding' is the main optimization.
-                    pass 
+                # Fallback: Content Pruning for anything that survived (e.g. part of parallel calls)
+                if msg.get('role') == 'tool':
+                    # We need to check function name again if disjoint
+                    # But simple heuristic: close substantial outputs
+                    if len(msg.get('content', '')) > 200:
+                        # Double check if it's a discovery tool by content heuristics or ID mapping
+                        # For simplicity/safety, we assume previous pruning logic was fine, 
+                        # but since we are rebuilding, let's just leave it or specific check.
+                        # Let's trust the 'Folding' is the main optimization.
+                        pass 
             
-            messages_to_keep.append(msg)
+                messages_to_keep.append(msg)
             
-        self.messages = messages_to_keep
+            self._set_messages(messages_to_keep)
+        self._emit("prune.fold", start, time.perf_counter() - start, removed=len(skip_indices))
 
     def _enable_skill(self, skill_name):
+        with self._span("skill.enable", skill=skill_name) as span:
+            result = self._enable_skill_instructions(skill_name)
+            span["enabled"] = skill_name in self.loaded_skill_names
+        return result
+
+    def _enable_skill_instructions(self, skill_name):
         if skill_name in self.loaded_skill_names:
             return f"Skill '{skill_name}' is already enabled."
         
-        skill = load_skill_by_name(skill_name, skills_dirs=self.skills_dirs)
+        with self._span("skill.load", skill=skill_name) as span:
+            skill = self.skills.load_skill(skill_name)
+            span["found"] = skill is not None
         if not skill:
             return f"Error: Skill '{skill_name}' not found."
             
@@ -215,7 +294,7 @@ Path: {skill.metadata.path}
 """
         # Buffer this injection to avoid breaking tool call block
         self.pending_injections.append(injection)
-        self.loaded_skill_names.add(skill_name)
+        self._set_loaded_skills(self.loaded_skill_names | {skill_name})
         
         # Optimization: Remove previous discovery noise now that we succeeded
         self._prune_navigation_history()
@@ -225,210 +304,695 @@ Path: {skill.metadata.path}
             
         return f"Skill '{skill_name}' enabled successfully. Instructions have been added to your context."
 
+    def _preselect_skills(self, user_input):
+        """
+        Enables the skills the router is confident about before the first LLM call,
+        so the model can act right away instead of discovering them. The
+        injections are left in `pending_injections` for the caller to flush.
+        """
+        if self._routed_skills:
+            # A streamed turn the caller stopped reading never reached its end
+            self._finish_routing()
+        if self.skill_router is None:
+            return
+        with self._span("skill.route") as span:
+            matches = self.skill_router.route(user_input)
+            enabled = []
+            for skill_name, confidence in matches:
+                if skill_name in self.loaded_skill_names:
+                    continue
+                self._enable_skill_instructions(skill_name)
+                if skill_name in self.loaded_skill_names:
+                    enabled.append(skill_name)
+                    path = self.skills.load_skill(skill_name).metadata.path
+                    markers = {path, os.path.relpath(path)} if path else set()
+                    self._routed_skills[skill_name] = (markers, self.token_estimator(self.pending_injections[-1]))
+                    if self.verbose:
+                        print(f"[DEBUG] Preselected skill {skill_name} (confidence {confidence:.2f})")
+            span["matches"] = [[name, round(confidence, 3)] for name, confidence in matches]
+            span["enabled"] = enabled
+
+    def _note_skill_use(self, func_name, arguments):
+        # A preselected skill counts as used once a tool call names it or runs something from its directory
+        for skill_name, (markers, _) in self._routed_skills.items():
+            if skill_name not in self._routed_used and (func_name == skill_name or any(m in arguments for m in markers)):
+                self._routed_used.add(skill_name)
+
+    def _finish_routing(self):
+        """Reports how the turn's preselected skills paid off, once the turn is over."""
+        if self.skill_router is None:
+            return
+        routed, used = self._routed_skills, self._routed_used
+        self._routed_skills, self._routed_used = {}, set()
+        unused_tokens = sum(tokens for name, (_, tokens) in routed.items() if name not in used)
+        self.skill_router.record(len(routed), len(used), unused_tokens)
+        if routed:
+            self._emit(
+                "skill.route.result", time.perf_counter(), 0.0,
+                used=sorted(used), unused=sorted(set(routed) - used),
+                round_trips_saved=2 * len(used), unused_instruction_tokens=unused_tokens
+            )
+
+    def _reset_window(self):
+        # The context window is maintained incrementally as messages are appended:
+        # system messages are always sent; chat messages are sent from `_chat_start`.
+        # Token counts are computed once per message, at append time.
+        self._system_msgs = []
+        self._system_tokens = 0
+        self._chat_msgs = []
+        self._chat_tokens = []
+        self._chat_start = 0
+        self._window_chat_tokens = 0
+        self._history_chat_tokens = 0
+        self._last_user_pos = -1
+
+    def _append_message(self, msg):
+        tokens = estimate_message_tokens(msg, self.token_estimator)
+        with self._history_lock:
+            self.messages.append(msg)
+            self._log_session({"op": "msg", "m": msg})
+            self._track_message(msg, tokens)
+            self._advance_window()
+
+    def _set_messages(self, messages):
+        """
+        Replaces the history with a rewritten version of itself (folded, compacted
+        or rolled back) and records the difference, not the full list, in the session log.
+        Must be called with the history lock held.
+        """
+        if self._session_log is not None:
+            new_ids = {id(m) for m in messages}
+            old_ids = {id(m) for m in self.messages}
+            drop = [i for i, m in enumerate(self.messages) if id(m) not in new_ids]
+            insert = [[i, m] for i, m in enumerate(messages) if id(m) not in old_ids]
+            if drop or insert:
+                self._log_session({"op": "rewrite", "drop": drop, "insert": insert})
+        self.messages = messages
+        self._rebuild_window()
+
+    def _set_loaded_skills(self, names):
+        self.loaded_skill_names = names
+        self._log_session({"op": "skills", "names": sorted(names)})
+
+    def _track_message(self, msg, tokens):
+        if msg.get('role') == 'system':
+            self._system_msgs.append(msg)
+            self._system_tokens += tokens
+            return
+        if msg.get('role') == 'user':
+            self._last_user_pos = len(self._chat_msgs)
+        self._chat_msgs.append(msg)
+        self._chat_tokens.append(tokens)
+        self._window_chat_tokens += tokens
+        self._history_chat_tokens += tokens
+
+    def _rebuild_window(self):
+        """Re-derives the window after `self.messages` was rewritten rather than appended to."""
+        known = {id(m): t for m, t in zip(self._chat_msgs, self._chat_tokens)}
+        for m in self._system_msgs:
+            known[id(m)] = None
+        self._reset_window()
+        for msg in self.messages:
+            tokens = known.get(id(msg))
+            if tokens is None:
+                tokens = estimate_message_tokens(msg, self.token_estimator)
+            self._track_message(msg, tokens)
+        self._advance_window()
+
+    def _window_over_budget(self):
+        if self.max_context_tokens is not None:
+            return self._system_tokens + self._window_chat_tokens > self.max_context_tokens
+        return len(self._chat_msgs) - self._chat_start > self.max_chat_history
+
+    def _advance_window(self):
+        # In token mode the current turn (from the latest user message on) is always
+        # kept whole: dropping its start would leave the model without the question.
+        limit = len(self._chat_msgs)
+        if self.max_context_tokens is not None:
+            limit = max(self._last_user_pos, self._chat_start)
+        while self._chat_start < limit and self._window_over_budget():
+            self._window_chat_tokens -= self._chat_tokens[self._chat_start]
+            self._chat_start += 1
+        # Never start on a tool output whose assistant tool_calls were cut off
+        while 0 < self._chat_start < len(self._chat_msgs) and self._chat_msgs[self._chat_start].get('role') == 'tool':
+            self._window_chat_tokens -= self._chat_tokens[self._chat_start]
+            self._chat_start += 1
+
     def _get_pruned_messages(self):
         """
-        Creates a optimized context window:
+        Returns the optimized context window:
         1. Keeps ALL 'system' messages (Prompts + Skill Injections).
-        2. Keeps only the last 'max_chat_history' of conversation messages.
+        2. Keeps the most recent conversation messages that fit the budget: the last
+           'max_chat_history' messages, or, if 'max_context_tokens' is set, as many as
+           fit in that many estimated tokens.
         3. Ensures we don't cut off a tool call flow (orphaned tool outputs).
+        The window is maintained as messages are appended, so this is just a concat.
+        """
+        start = time.perf_counter()
+        with self._history_lock:
+            window = self._system_msgs + self._chat_msgs[self._chat_start:]
+        self._emit("prune.window", start, time.perf_counter() - start, message_count=len(window))
+        return window
+
+    def _compaction_cut(self):
+        """
+        Position in `_chat_msgs` up to which turns get compacted, or 0 for none.
+        Cuts land on a user message, so whole turns are summarized and the newest
+        ones (about half the threshold) plus the current turn stay verbatim.
         """
-        system_msgs = [m for m in self.messages if m.get('role') == 'system']
-        chat_msgs = [m for m in self.messages if m.get('role') != 'system']
+        if self.compaction_threshold_tokens is None or self._history_chat_tokens <= self.compaction_threshold_tokens:
+            return 0
+        keep_budget = self.compaction_threshold_tokens // 2
+        kept = 0
+        cut = 0
+        for pos in range(len(self._chat_msgs) - 1, 0, -1):
+            kept += self._chat_tokens[pos]
+            if self._chat_msgs[pos].get('role') == 'user':
+                cut = pos
+                if kept > keep_budget:
+                    break
+        return cut
+
+    def compact(self):
+        """
+        Replaces older turns with a summary message once the history crosses
+        `compaction_threshold_tokens`. The summarizer runs without holding the
+        history lock, so a turn can proceed while a background compaction runs.
+        Returns the number of messages compacted.
+        """
+        with self._history_lock:
+            cut = self._compaction_cut()
+            if cut == 0:
+                return 0
+            to_compact = self._chat_msgs[:cut]
+            previous = self._summary_message
         
-        if len(chat_msgs) > self.max_chat_history:
-            # Simple slicing - take last N
-            pruned_chat = chat_msgs[-self.max_chat_history:]
-            
-            # Safety check: Ensure the first message isn't a 'tool' output without its call
-            # or an assistant message with tool_calls but we lost the response?
-            # Actually, standard OpenAI flow: User -> Assistant(calls) -> Tool(results).
-            # If we cut in the middle, we might break things.
-            # Aggressive strategy: Only start with 'user' role if possible.
-            
-            while pruned_chat and pruned_chat[0].get('role') == 'tool':
-                pruned_chat.pop(0)
-            
-            # Also if first is assistant with tool_calls, we are fine, provided we have the tool responses (which we should, as we take the tail).
-            
-            chat_msgs = pruned_chat
-            
-        return system_msgs + chat_msgs
+        previous_summary = None
+        if previous is not None:
+            previous_summary = previous["content"][len(SUMMARY_HEADER):].strip()
+        summary = self.summarizer(to_compact, previous_summary)
+        summary_message = {"role": "system", "content": f"{SUMMARY_HEADER}\n{summary}"}
+        
+        with self._history_lock:
+            # Filter by identity: the history may have been appended to or folded meanwhile
+            compacted_ids = {id(m) for m in to_compact}
+            if previous is not None:
+                compacted_ids.add(id(previous))
+            remaining = [m for m in self.messages if id(m) not in compacted_ids]
+            # Right after the base system prompt, so the prompt prefix stays unchanged
+            insert_at = 1 if remaining and remaining[0].get('role') == 'system' else 0
+            remaining.insert(insert_at, summary_message)
+            self._set_messages(remaining)
+            self._summary_message = summary_message
+        
+        self._archive(to_compact)
+        if self.verbose:
+            print(f"[DEBUG] Compacted {len(to_compact)} messages into a summary.")
+        return len(to_compact)
+
+    def _archive(self, messages):
+        if not self.compaction_archive_path:
+            self.archived_messages.extend(messages)
+            return
+        with open(self.compaction_archive_path, "a", encoding="utf-8") as f:
+            for msg in messages:
+                f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+
+    def _maybe_schedule_compaction(self):
+        # Called once a turn has its answer; the work happens off the critical path
+        with self._history_lock:
+            if self._compaction_cut() == 0:
+                return
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self._run_compaction, daemon=True)
+        self._compaction_thread.start()
+
+    def _run_compaction(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"[Agent] Compaction failed: {e}")
+
+    def wait_for_compaction(self, timeout=None):
+        """Blocks until a background compaction (if any) has finished."""
+        if self._compaction_thread is not None:
+            self._compaction_thread.join(timeout)
+
+    def _register_builtin_tools(self):
+        # Primitive tools (run_command, read_file, list_files, read_output)
+        for schema in TOOLS_SCHEMA:
+            f = schema["function"]
+            func, afunc = AVAILABLE_TOOLS[f["name"]], None
+            if f["name"] == "run_command":
+                func, afunc = (self.shell.run_command, self.shell.arun_command) if self.shell else (run_command, arun_command)
+                if self.skill_executor:
+                    cwd, env = (self.shell.cwd, self.shell.env) if self.shell else (None, None)
+                    func, afunc = self.skill_executor.wrap(func, afunc, cwd=cwd, env=env)
+            self.tools.register(
+                f["name"], func, f["description"], f["parameters"],
+                parallel_safe=True,
+                afunc=afunc
+            )
+        
+        self.tools.register(
+            "list_skills", self._tool_list_skills,
+            "List available skills in a category.",
+            {
+                "type": "object",
+                "properties": {"category": {"type": "string"}},
+                "required": ["category"]
+            },
+            parallel_safe=True
+        )
+        # Dispatchable for compatibility, but not advertised to the model
+        self.tools.register("search_skills", self._tool_search_skills, parallel_safe=True, advertise=False)
+        self.tools.register(
+            "enable_skill", self._enable_skill,
+            "Enable a specific skill (load its instructions).",
+            {
+                "type": "object",
+                "properties": {"skill_name": {"type": "string"}},
+                "required": ["skill_name"]
+            }
+        )
+        self.tools.register(
+            "remember", self._tool_remember,
+            "Store a piece of information in long-term memory.",
+            {
+                "type": "object",
+                "properties": {
+                    "key": {"type": "string", "description": "The topic or key to store under."},
+                    "content": {"type": "string", "description": "The information to store."}
+                },
+                "required": ["key", "content"]
+            },
+            afunc=self._atool_remember
+        )
+        self.tools.register(
+            "recall", self._tool_recall,
+            "Search long-term memory for information.",
+            {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "The topic or keyword to search for."}
+                },
+                "required": ["query"]
+            },
+            parallel_safe=True
+        )
+        
+        # Dynamic Tool: Consult Knowledge Base (Only if RAG is active)
+        if self.context.has_knowledge:
+            self.tools.register(
+                "consult_knowledge_base", self._tool_consult_knowledge_base,
+                "Consult the knowledge base to answer questions using provided text files. Use this when the user asks about facts that might be in the knowledge base.",
+                {
+                    "type": "object",
+                    "properties": {
+                        "query": {"type": "string", "description": "The specific query to search for in the knowledge base."}
+                    },
+                    "required": ["query"]
+                },
+                parallel_safe=True
+            )
+
+    def _tool_list_skills(self, category=None):
+        # Use helper with configured dir
+        skills = self.skills.list_skills_in_category(category)
+        return json.dumps(skills, indent=2)
+
+    def _tool_search_skills(self, query=None):
+        results = self.skills.search_skills(query)
+        return json.dumps(results, indent=2)
+
+    def _tool_remember(self, key=None, content=None):
+        return self.memory.remember(content, key)
+
+    async def _atool_remember(self, key=None, content=None):
+        return await asyncio.to_thread(self.memory.remember, content, key)
+
+    def _tool_recall(self, query=None):
+        return self.memory.recall(query)
+
+    def _tool_consult_knowledge_base(self, query=None):
+        hits = self.rag.retrieve(query)
+        if hits:
+            result = "Found relevant info:\n"
+            for h in hits:
+                result += f"- [{h['source']}]: {h['content']}\n"
+        else:
+            result = "No relevant information found in the knowledge base."
+        return result
+
+    def _execute_tool(self, func_name, args):
+        return self.tools.dispatch(func_name, args)
+
+    async def _aexecute_tool(self, func_name, args):
+        # Tools with a native coroutine (run_command, remember) are awaited. Other
+        # parallel-safe tools are blocking work moved off the event loop. The rest
+        # mutate agent state (e.g. enable_skill rewrites the history), so they run
+        # on the loop where a cancelled turn can't have them finish behind the
+        # rollback's back.
+        tool = self.tools.get(func_name)
+        if tool is None:
+            return self._execute_tool(func_name, args)
+        if tool.afunc is not None:
+            return await tool.afunc(**args)
+        if tool.parallel_safe:
+            return await asyncio.to_thread(tool.func, **args)
+        return tool.func(**args)
+
+    def _log_request(self, messages_to_send):
+        if self.show_full_context:
+            print("\n" + "="*80)
+            print(f" SENDING REQUEST TO LLM (Messages: {len(messages_to_send)} / Total History: {len(self.messages)})")
+            print("="*80)
+            print(json.dumps(messages_to_send, indent=2, ensure_ascii=False))
+            print("="*80 + "\n")
+
+    def _parse_tool_call(self, tool_call):
+        func_name = tool_call.function.name
+        args = json.loads(tool_call.function.arguments)
+        if self._routed_skills:
+            self._note_skill_use(func_name, tool_call.function.arguments)
+        
+        if self.verbose:
+            print(f"\n[DEBUG] Tool Call: {func_name} (ID: {tool_call.id})")
+            print(f"[DEBUG] Args: {args}")
+        return func_name, args
+
+    def _call_tool(self, tool_call):
+        func_name = tool_call.function.name
+        with self._span("tool", tool=func_name, call_id=tool_call.id) as span:
+            try:
+                func_name, args = self._parse_tool_call(tool_call)
+                result = self._execute_tool(func_name, args)
+            except Exception as e:
+                span["error"] = str(e)
+                result = f"Error executing tool {func_name}: {str(e)}"
+            span["output_size"] = len(str(result))
+        return result
+
+    async def _acall_tool(self, tool_call):
+        func_name = tool_call.function.name
+        with self._span("tool", tool=func_name, call_id=tool_call.id) as span:
+            try:
+                func_name, args = self._parse_tool_call(tool_call)
+                result = await self._aexecute_tool(func_name, args)
+            except Exception as e:
+                span["error"] = str(e)
+                result = f"Error executing tool {func_name}: {str(e)}"
+            span["output_size"] = len(str(result))
+        return result
+
+    def _run_tool_calls(self, tool_calls):
+        """
+        Executes one assistant turn's tool calls and returns results in call order.
+        Parallel-safe calls go to a thread pool bounded by `max_parallel_tools`,
+        while stateful ones (enable_skill, remember) run inline, in order.
+        """
+        results = [None] * len(tool_calls)
+        parallel = [i for i, tc in enumerate(tool_calls) if self.tools.is_parallel_safe(tc.function.name)]
+        
+        if len(parallel) < 2 or self.max_parallel_tools < 2:
+            for i, tool_call in enumerate(tool_calls):
+                results[i] = self._call_tool(tool_call)
+            return results
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel_tools, len(parallel))) as pool:
+            futures = {i: pool.submit(self._call_tool, tool_calls[i]) for i in parallel}
+            for i, tool_call in enumerate(tool_calls):
+                if i not in futures:
+                    results[i] = self._call_tool(tool_call)
+            for i, future in futures.items():
+                results[i] = future.result()
+        return results
+
+    async def _arun_tool_calls(self, tool_calls):
+        """Async counterpart of `_run_tool_calls`, bounded by an asyncio semaphore."""
+        limit = asyncio.Semaphore(max(1, self.max_parallel_tools))
+        # Stateful calls keep their relative order: asyncio locks are FIFO and
+        # gather starts the coroutines in call order.
+        serial = asyncio.Lock()
+        
+        async def run(tool_call):
+            if self.tools.is_parallel_safe(tool_call.function.name):
+                async with limit:
+                    return await self._acall_tool(tool_call)
+            async with serial:
+                return await self._acall_tool(tool_call)
+        
+        return await asyncio.gather(*(run(tc) for tc in tool_calls))
+
+    def _append_tool_result(self, tool_call, result):
+        if self.verbose:
+            # Truncate long output for debug
+            debug_output = str(result)
+            if len(debug_output) > 200:
+                debug_output = debug_output[:200] + "..."
+            print(f"[DEBUG] Tool Output: {debug_output}")
+
+        # Append tool result
+        self._append_message({
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "content": str(result)
+        })
+
+    def _flush_injections(self):
+        # Process any pending system injections (e.g. from enable_skill) AFTER valid tool block
+        if self.pending_injections:
+            for injection in self.pending_injections:
+                self._append_message({"role": "system", "content": injection})
+            self.pending_injections = []
 
     def chat(self, user_input):
-        self.messages.append({"role": "user", "content": user_input})
+        self._append_message({"role": "user", "content": user_input})
         if self.verbose:
             print(f"[DEBUG] User Input: {user_input}")
+        self.pending_injections = []
+        self.last_error = None
+        self._preselect_skills(user_input)
+        self._flush_injections()
         
         while True:
             try:
                 # Use Pruned History for the actual API call
                 messages_to_send = self._get_pruned_messages()
+                current_tools = self.tools.schemas()
+                self._log_request(messages_to_send)
 
-                # ... (schema definition code) ...
-                
-                current_tools = [
-                    *TOOLS_SCHEMA,
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "list_skills",
-                            "description": "List available skills in a category.",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {"category": {"type": "string"}},
-                                "required": ["category"]
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "enable_skill",
-                            "description": "Enable a specific skill (load its instructions).",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {"skill_name": {"type": "string"}},
-                                "required": ["skill_name"]
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "remember",
-                            "description": "Store a piece of information in long-term memory.",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "key": {"type": "string", "description": "The topic or key to store under."},
-                                    "content": {"type": "string", "description": "The information to store."}
-                                },
-                                "required": ["key", "content"]
-                            }
-                        }
-                    },
-                    {
-                        "type": "function",
-                        "function": {
-                            "name": "recall",
-                            "description": "Search long-term memory for information.",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "query": {"type": "string", "description": "The topic or keyword to search for."}
-                                },
-                                "required": ["query"]
-                            }
-                        }
-                    }
-                ]
-                
-                # Dynamic Tool: Consult Knowledge Base (Only if RAG is active)
-                if self.rag:
-                    current_tools.append({
-                        "type": "function",
-                        "function": {
-                            "name": "consult_knowledge_base",
-                            "description": "Consult the knowledge base to answer questions using provided text files. Use this when the user asks about facts that might be in the knowledge base.",
-                            "parameters": {
-                                "type": "object",
-                                "properties": {
-                                    "query": {"type": "string", "description": "The specific query to search for in the knowledge base."}
-                                },
-                                "required": ["query"]
-                            }
-                        }
-                    })
-
-                if self.show_full_context:
-                    print("\n" + "="*80)
-                    print(f" SENDING REQUEST TO LLM (Messages: {len(messages_to_send)} / Total History: {len(self.messages)})")
-                    print("="*80)
-                    print(json.dumps(messages_to_send, indent=2, ensure_ascii=False))
-                    print("="*80 + "\n")
-
-                response = self.provider.chat(
-                    messages=messages_to_send,
-                    tools=current_tools,
-                    tool_choice="auto"
-                )
-                
-                # ... (rest of loop) ...
+                with self._llm_span(messages_to_send) as span:
+                    response = self.provider.chat(
+                        messages=messages_to_send,
+                        tools=current_tools,
+                        tool_choice="auto"
+                    )
+                    self._record_usage(span, getattr(response, "usage", None), getattr(response, "latency", None), getattr(response.choices[0], "finish_reason", None))
                 
                 message = response.choices[0].message
                 
                 if not message.tool_calls:
                     if self.verbose:
                         print(f"[DEBUG] Final Response: {message.content}")
-                    self.messages.append(message.model_dump())
+                    self._append_message(message.model_dump())
+                    self._maybe_schedule_compaction()
+                    self._finish_routing()
                     return message.content
                 
                 # Append assistant message (convert to dict to be safe)
-                self.messages.append(message.model_dump())
+                self._append_message(message.model_dump())
                 
                 # Execute tools
                 self.pending_injections = [] # Reset pending injections for this turn
                 
-                for tool_call in message.tool_calls:
-                    try:
-                        func_name = tool_call.function.name
-                        args = json.loads(tool_call.function.arguments)
-                        
-                        if self.verbose:
-                            print(f"\n[DEBUG] Tool Call: {func_name} (ID: {tool_call.id})")
-                            print(f"[DEBUG] Args: {args}")
-
-                        result = ""
-                        if func_name == "list_skills":
-                            # Use helper with configured dir
-                            skills = list_skills_in_category(args.get("category"), skills_dirs=self.skills_dirs)
-                            result = json.dumps(skills, indent=2)
-                        elif func_name == "search_skills":
-                            results = search_skills(args.get("query"), skills_dirs=self.skills_dirs)
-                            result = json.dumps(results, indent=2)
-                        elif func_name == "enable_skill":
-                            result = self._enable_skill(args.get("skill_name"))
-                        elif func_name == "remember":
-                            result = self.memory.remember(args.get("content"), args.get("key"))
-                        elif func_name == "recall":
-                            result = self.memory.recall(args.get("query"))
-                        elif func_name == "consult_knowledge_base" and self.rag:
-                             # Use RAG
-                            hits = self.rag.retrieve(args.get("query"))
-                            if hits:
-                                result = "Found relevant info:\n"
-                                for h in hits:
-                                    result += f"- [{h['source']}]: {h['content']}\n"
-                            else:
-                                result = "No relevant information found in the knowledge base."
-                        elif func_name in AVAILABLE_TOOLS:
-                            result = AVAILABLE_TOOLS[func_name](**args)
-                        else:
-                            result = f"Error: Tool {func_name} not found."
-                    except Exception as e:
-                        result = f"Error executing tool {func_name}: {str(e)}"
-
-                    if self.verbose:
-                        # Truncate long output for debug
-                        debug_output = str(result)
-                        if len(debug_output) > 200:
-                            debug_output = debug_output[:200] + "..."
-                        print(f"[DEBUG] Tool Output: {debug_output}")
-
-                    # Append tool result
-                    self.messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": str(result)
-                    })
+                results = self._run_tool_calls(message.tool_calls)
+                for tool_call, result in zip(message.tool_calls, results):
+                    self._append_tool_result(tool_call, result)
                 
-                # Process any pending system injections (e.g. from enable_skill) AFTER valid tool block
-                if self.pending_injections:
-                    for injection in self.pending_injections:
-                        self.messages.append({"role": "system", "content": injection})
-                    self.pending_injections = []
+                self._flush_injections()
             except Exception as e:
                  # If we crashed outside the inner tool loop but after appending assistant msg, we might still be in trouble.
                  # But the main risk was the tool execution itself.
                  print(f"CRITICAL AGENT ERROR: {e}") # Log it
+                 self.last_error = e
+                 self._finish_routing()
                  return f"Error: {e}"
+
+    def chat_stream(self, user_input):
+        """
+        Streaming counterpart of `chat`. A generator of StreamEvent objects:
+        - "text": content deltas as the model produces them.
+        - "tool_call": a tool call whose arguments are complete.
+        - "tool_result": the tool's output (`tool_call` + `text`), in call order.
+        - "done": the final response text; always the last event.
+
+        Parallel-safe tools start executing as soon as their "tool_call" event
+        arrives, while the rest of the response is still streaming.
+        """
+        self._append_message({"role": "user", "content": user_input})
+        if self.verbose:
+            print(f"[DEBUG] User Input: {user_input}")
+        self.pending_injections = []
+        self.last_error = None
+        self._preselect_skills(user_input)
+        self._flush_injections()
+        
+        while True:
+            pool = None
+            try:
+                messages_to_send = self._get_pruned_messages()
+                current_tools = self.tools.schemas()
+                self._log_request(messages_to_send)
+                
+                message = None
+                futures = {}
+                with self._llm_span(messages_to_send) as span:
+                    stream_start = time.perf_counter()
+                    for event in self.provider.chat_stream(
+                        messages=messages_to_send,
+                        tools=current_tools,
+                        tool_choice="auto"
+                    ):
+                        if "ttft_ms" not in span:
+                            span["ttft_ms"] = round((time.perf_counter() - stream_start) * 1000, 3)
+                        if event.type == "message":
+                            message = event.message
+                            self._record_usage(span, event.usage, time.perf_counter() - stream_start, event.finish_reason)
+                            continue
+                        if event.type == "tool_call" and self.tools.is_parallel_safe(event.tool_call.function.name) and self.max_parallel_tools > 1:
+                            if pool is None:
+                                pool = ThreadPoolExecutor(max_workers=self.max_parallel_tools)
+                            futures[event.tool_call.id] = pool.submit(self._call_tool, event.tool_call)
+                        yield event
+                
+                if not message.tool_calls:
+                    if self.verbose:
+                        print(f"[DEBUG] Final Response: {message.content}")
+                    self._append_message(message.model_dump())
+                    self._maybe_schedule_compaction()
+                    self._finish_routing()
+                    yield StreamEvent(type="done", text=message.content)
+                    return
+                
+                self._append_message(message.model_dump())
+                self.pending_injections = []
+                
+                # Stateful tools run here, in call order; early-started ones are collected
+                for tool_call in message.tool_calls:
+                    future = futures.get(tool_call.id)
+                    result = future.result() if future else self._call_tool(tool_call)
+                    self._append_tool_result(tool_call, result)
+                    yield StreamEvent(type="tool_result", tool_call=tool_call, text=str(result))
+                
+                self._flush_injections()
+            except Exception as e:
+                print(f"CRITICAL AGENT ERROR: {e}")
+                self.last_error = e
+                self._finish_routing()
+                yield StreamEvent(type="done", text=f"Error: {e}")
+                return
+            finally:
+                if pool is not None:
+                    pool.shutdown(wait=False, cancel_futures=True)
+
+    async def achat(self, user_input):
+        """
+        Asyncio-native counterpart of `chat`.
+
+        The LLM request, shell commands and blocking tool work (file IO, memory
+        writes) are all awaited, so one event loop can drive many conversations.
+        Cancelling the awaiting task aborts the turn: any running command is
+        killed, the messages added by this turn are rolled back and earlier
+        discovery steps folded away during it are put back. A background
+        compaction that finished in the meantime is kept.
+        """
+        turn_messages = []
+        skills_before = set(self.loaded_skill_names)
+        self._fold_log = []
+
+        def append(msg):
+            self._append_message(msg)
+            turn_messages.append(msg)
+
+        append({"role": "user", "content": user_input})
+        if self.verbose:
+            print(f"[DEBUG] User Input: {user_input}")
+
+        try:
+            self.pending_injections = []
+            self.last_error = None
+            self._preselect_skills(user_input)
+            for injection in self.pending_injections:
+                append({"role": "system", "content": injection})
+            self.pending_injections = []
+
+            while True:
+                try:
+                    messages_to_send = self._get_pruned_messages()
+                    current_tools = self.tools.schemas()
+                    self._log_request(messages_to_send)
+
+                    with self._llm_span(messages_to_send) as span:
+                        response = await self.provider.achat(
+                            messages=messages_to_send,
+                            tools=current_tools,
+                            tool_choice="auto"
+                        )
+                        self._record_usage(span, getattr(response, "usage", None), getattr(response, "latency", None), getattr(response.choices[0], "finish_reason", None))
+
+                    message = response.choices[0].message
+
+                    if not message.tool_calls:
+                        if self.verbose:
+                            print(f"[DEBUG] Final Response: {message.content}")
+                        append(message.model_dump())
+                        self._maybe_schedule_compaction()
+                        return message.content
+
+                    append(message.model_dump())
+                    self.pending_injections = []
+
+                    results = await self._arun_tool_calls(message.tool_calls)
+                    for tool_call, result in zip(message.tool_calls, results):
+                        self._append_tool_result(tool_call, result)
+                        turn_messages.append(self.messages[-1])
+
+                    for injection in self.pending_injections:
+                        append({"role": "system", "content": injection})
+                    self.pending_injections = []
+                except Exception as e:
+                    print(f"CRITICAL AGENT ERROR: {e}")
+                    self.last_error = e
+                    return f"Error: {e}"
+        except asyncio.CancelledError:
+            # Roll back by identity: `_prune_navigation_history` may have removed
+            # or shifted messages during the turn, so indices are not reliable.
+            turn_ids = {id(m) for m in turn_messages}
+            # Folded pairs go back right after the message they followed (if it still exists)
+            followers = {}
+            for previous, call, result in self._fold_log:
+                if id(call) not in turn_ids:
+                    followers.setdefault(id(previous), []).extend([call, result])
+            restored = []
+
+            def restore(msg):
+                restored.append(msg)
+                for follower in followers.pop(id(msg), []):
+                    restore(follower)
+
+            with self._history_lock:
+                for msg in self.messages:
+                    if id(msg) not in turn_ids:
+                        restore(msg)
+                self._set_messages(restored)
+            if self.loaded_skill_names != skills_before:
+                self._set_loaded_skills(skills_before)
+            self.pending_injections = []
+            if self.verbose:
+                print("[DEBUG] Turn cancelled; history rolled back.")
+            raise
+        finally:
+            self._fold_log = None
+            self._finish_routing()
@@ -0,0 +1,60 @@
+import json
+
+SUMMARY_HEADER = "[CONVERSATION SUMMARY]"
+
+def _clip(text, limit):
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def heuristic_summary(messages, previous_summary=None, max_chars=4000):
+    """
+    Summarizes turns without an LLM call: one clipped line per message, recording
+    what the user asked, what the assistant answered and which tools it ran.
+    Older lines are dropped first once the summary exceeds `max_chars`.
+    """
+    lines = []
+    if previous_summary:
+        lines.extend(previous_summary.splitlines())
+    for msg in messages:
+        role = msg.get("role")
+        if role == "user":
+            lines.append(f"- User: {_clip(msg.get('content'), 200)}")
+        elif role == "assistant":
+            if msg.get("content"):
+                lines.append(f"- Assistant: {_clip(msg.get('content'), 200)}")
+            for tc in msg.get("tool_calls") or []:
+                func = tc["function"] if isinstance(tc, dict) else tc.function
+                name = func["name"] if isinstance(func, dict) else func.name
+                arguments = func["arguments"] if isinstance(func, dict) else func.arguments
+                lines.append(f"- Assistant ran {name}({_clip(arguments, 100)})")
+        elif role == "tool":
+            lines.append(f"  -> {_clip(msg.get('content'), 100)}")
+
+    while len(lines) > 1 and sum(len(l) + 1 for l in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ProviderSummarizer:
+    """Summarizes turns with an LLM. Any LLMProvider works, e.g. a cheaper model than the agent's."""
+    def __init__(self, provider, max_input_chars=24000):
+        self.provider = provider
+        self.max_input_chars = max_input_chars
+
+    def __call__(self, messages, previous_summary=None):
+        transcript = []
+        for msg in messages:
+            content = msg.get("content") or ""
+            if msg.get("tool_calls"):
+                content += " " + json.dumps(msg["tool_calls"], ensure_ascii=False)
+            transcript.append(f"{msg.get('role')}: {_clip(content, 2000)}")
+        transcript = "\n".join(transcript)[-self.max_input_chars:]
+
+        prompt = "Summarize the conversation below for your own future reference. Keep user facts, preferences, decisions, open tasks and important tool results. Be concise."
+        if previous_summary:
+            prompt += f"\n\nSummary of the conversation before this part:\n{previous_summary}"
+        response = self.provider.chat(messages=[
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": transcript}
+        ])
+        return response.choices[0].message.content or ""
@@ -0,0 +1,151 @@
+import os
+from .skill_loader import SkillIndex
+from .memory.manager import MemoryManager
+from .knowledge.rag import SimpleRAG
+from .utils import LazyValue
+
+def load_persona(persona_path, verbose=False):
+    """Reads a persona file, or every .md/.txt file in a persona directory."""
+    persona_instruction = ""
+    if persona_path and os.path.exists(persona_path):
+        if os.path.isfile(persona_path):
+             with open(persona_path, "r", encoding="utf-8") as f:
+                 persona_instruction = f.read()
+        elif os.path.isdir(persona_path):
+             # Load all .md or .txt files
+             for filename in sorted(os.listdir(persona_path)):
+                 if filename.lower().endswith(('.md', '.txt')):
+                     with open(os.path.join(persona_path, filename), "r", encoding="utf-8") as f:
+                         persona_instruction += f"\n\n--- Persona: {filename} ---\n" + f.read()
+        
+        if verbose:
+            print(f"[DEBUG] Loaded persona from {persona_path} (Length: {len(persona_instruction)})")
+    return persona_instruction
+
+def render_system_prompt(persona_instruction, categories):
+    # Build category list string with descriptions
+    cat_str_list = []
+    for c in categories:
+        cat_str_list.append(f"- {c.name}: {c.description}")
+    categories_display = "\n   ".join(cat_str_list)
+    
+    return f"""You are a helpful AI assistant.
+{persona_instruction}
+You operate in a potentially sandboxed environment where you can execute code.
+
+### Tool Capabilities
+1. **Primitive Tools**: `run_command`, `read_file`, `list_files`, `read_output` (pages through output that was cut short)
+2. **Skill Discovery**:
+   - Your skills are organized by CATEGORY.
+   - Available Categories:
+   {categories_display}
+   - To see skills in a category, use: `list_skills(category="name")`
+   - To using a skill, you MUST enable it first: `enable_skill(skill_name="name")`
+
+### Workflow
+1. User asks a question.
+2. If you need a specific capability (e.g. Math), check the 'Math' category with `list_skills`.
+3. Read the descriptions. If one matches, `enable_skill` for it.
+4. Once enabled, the system will inject the specific instructions (which often tell you to run a python script).
+5. Follow those instructions.
+
+### Memory
+You have a long-term memory. 
+- **AGGRESSIVE MEMORY UPDATE**: You must proactively save **ALL** user profile details, preferences, and key facts using `remember`. Do not wait for explicit instructions. If the user mentions their profession, hobbies, name, or preferences, store it immediately.
+- Use `recall(query="ignored")` to retrieve ALL stored memories. The query parameter is currently ignored, so you will see everything.
+- ALWAYS check your memory (`recall`) if the user asks something that might be stored from a previous session.
+
+Always verify the output of your commands.
+
+### Response Guidelines
+- Answer the user's question directly and concisely.
+- Do NOT mention what skills or tools you are using or have available, unless the user explicitly asks about them.
+- Do NOT list other things you can do at the end of your response.
+"""
+
+
+
+class Context:
+    """
+    Everything an Agent needs that doesn't belong to one conversation: persona,
+    skill index, knowledge base (RAG), long-term memory and the rendered system
+    prompt. It is loaded once and then only read, so one Context can back many
+    Agents across threads; creating an Agent on top of it only allocates its history.
+
+    Only the system prompt (persona + skill categories) is built up front. Memory,
+    the RAG index and the skill scan load lazily, on a background thread when
+    `warmup` is True, so the first LLM request doesn't wait for them. A tool that
+    needs one before it's ready waits for it then.
+    """
+    def __init__(self, memory_path: str = None, skills_dirs: list[str] = None, knowledge_path: str = None, persona_path: str = None, verbose=False, warmup=True):
+        # 1. Automatic Context Initialization (Simplification)
+        # If no paths are provided, default to ./context in the current working directory.
+        if memory_path is None and skills_dirs is None and knowledge_path is None and persona_path is None:
+            cwd = os.getcwd()
+            context_dir = os.path.join(cwd, "context")
+            
+            # Auto-init if missing
+            if not os.path.exists(context_dir):
+                if verbose:
+                    print(f"[Agent] No context found. Initializing default context in {context_dir}...")
+                try:
+                    # Local import to avoid circular dependency (ada_agent -> core.context -> ada_agent)
+                    from ..init import init
+                    init(cwd)
+                except ImportError:
+                    # Fallback if relative import fails or structure is different
+                    try:
+                        from ada_agent.init import init
+                        init(cwd)
+                    except ImportError:
+                         print("[Agent] Warning: Could not auto-initialize context. Please run 'ada_agent.init()' manually.")
+            
+            # Set defaults
+            if verbose: print(f"[Agent] Using default context at {context_dir}")
+            
+            memory_path = os.path.join(context_dir, "memory", "memory.json")
+            knowledge_path = os.path.join(context_dir, "knowledge")
+            skills_dirs = [os.path.join(context_dir, "skills")]
+            persona_path = os.path.join(context_dir, "persona")
+
+        # Initialize Memory
+        # If memory_path is provided, it overtakes default env var
+        mem_path = memory_path or os.getenv("ADA_MEMORY_PATH")
+        self._memory = LazyValue(lambda: MemoryManager(mem_path))
+
+        # Initialize Simple RAG
+        # Whether there is a knowledge base is known now; indexing it can wait
+        self.has_knowledge = bool(knowledge_path and os.path.exists(knowledge_path))
+        self._rag = LazyValue(lambda: self._load_rag(knowledge_path, verbose))
+        
+        # Initialize Skills
+        # We rely on the user to provide skills_dirs (e.g. from init or manual setup)
+        if isinstance(skills_dirs, str):
+            skills_dirs = [skills_dirs]
+        self.skill_index = SkillIndex(skills_dirs or [])
+        self.skills_dirs = self.skill_index.skills_dirs
+
+        self.persona_instruction = load_persona(persona_path, verbose)
+        self.system_prompt = render_system_prompt(self.persona_instruction, self.skill_index.categories)
+
+        if warmup:
+            self._memory.start()
+            if self.has_knowledge:
+                self._rag.start()
+            self.skill_index.warm_up()
+
+    def _load_rag(self, knowledge_path, verbose):
+        if not self.has_knowledge:
+            return None
+        rag = SimpleRAG(knowledge_path)
+        if verbose:
+            print(f"[DEBUG] RAG initialized with knowledge path: {knowledge_path}")
+        return rag
+
+    @property
+    def memory(self) -> MemoryManager:
+        return self._memory.get()
+
+    @property
+    def rag(self) -> SimpleRAG:
+        return self._rag.get()
@@ -0,0 +1,146 @@
+import json
+import time
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+@dataclass
+class Event:
+    """
+    One instrumentation event emitted by an Agent.
+
+    Names:
+    - "llm.start" / "llm.end": one LLM request (message_count, estimated_tokens; usage, ttft on end).
+    - "tool": one tool call (tool, output_size, error).
+    - "prune.fold": `_prune_navigation_history` (removed).
+    - "prune.window": `_get_pruned_messages` (message_count).
+    - "skill.enable" / "skill.load": enabling a skill / reading its instructions.
+    `start` is a time.perf_counter() reading and `duration` is in seconds; both
+    are monotonic. `ts` is the wall-clock time, for correlating with other logs.
+    """
+    name: str
+    start: float
+    duration: Optional[float] = None
+    ts: float = field(default_factory=time.time)
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self):
+        d = {"name": self.name, "ts": self.ts, "start": self.start}
+        if self.duration is not None:
+            d["duration_ms"] = round(self.duration * 1000, 3)
+        d.update(self.attrs)
+        return d
+
+
+class Observer:
+    """Base class for Agent observers. Any callable taking an Event works as well."""
+    def on_event(self, event: Event):
+        pass
+
+    def __call__(self, event: Event):
+        self.on_event(event)
+
+
+class JSONLinesExporter(Observer):
+    """Writes every event as one JSON line to a path or an open text stream."""
+    def __init__(self, target):
+        self._owns_file = isinstance(target, str)
+        self._file = open(target, "a", encoding="utf-8") if self._owns_file else target
+        self._lock = threading.Lock()
+
+    def on_event(self, event: Event):
+        line = json.dumps(event.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        if self._owns_file:
+            self._file.close()
+
+
+def usage_to_dict(usage):
+    """Normalizes a provider's usage object (llm.types.Usage, pydantic, dict or None) to a plain dict."""
+    if usage is None or isinstance(usage, dict):
+        return usage
+    if hasattr(usage, "to_dict"):
+        return usage.to_dict()
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump()
+    if hasattr(usage, "__dict__"):
+        return {k: v for k, v in vars(usage).items() if not k.startswith("_")}
+    return {"value": str(usage)}
+
+
+def _percentile(sorted_values, p):
+    # Nearest-rank percentile on an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(p / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class MetricsAggregator(Observer):
+    """
+    Keeps recent durations per key in memory and reports count/mean/p50/p95/max.
+    Keys are "tool:<name>" for tool calls, "llm" for LLM requests and the event
+    name for everything else. Only the last `window` samples per key are kept.
+    """
+    def __init__(self, window=10000):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+        self._errors = defaultdict(int)
+        # Summed usage fields of LLM requests, e.g. input, output and prompt-cache tokens
+        self._tokens = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def on_event(self, event: Event):
+        if event.duration is None:
+            return
+        if event.name == "tool":
+            key = f"tool:{event.attrs.get('tool')}"
+        elif event.name == "llm.end":
+            key = "llm"
+        else:
+            key = event.name
+        with self._lock:
+            self._samples[key].append(event.duration)
+            self._counts[key] += 1
+            if event.attrs.get("error"):
+                self._errors[key] += 1
+            usage = event.attrs.get("usage")
+            if isinstance(usage, dict):
+                for name, value in usage.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        self._tokens[name] += value
+
+    def token_totals(self):
+        """Summed token usage over all LLM requests, as reported by the provider."""
+        with self._lock:
+            return dict(self._tokens)
+
+    def summary(self):
+        """Returns {key: {count, errors, mean_ms, p50_ms, p95_ms, max_ms}}."""
+        with self._lock:
+            snapshot = {k: sorted(v) for k, v in self._samples.items()}
+            counts = dict(self._counts)
+            errors = dict(self._errors)
+        result = {}
+        for key, values in snapshot.items():
+            result[key] = {
+                "count": counts[key],
+                "errors": errors.get(key, 0),
+                "mean_ms": round(sum(values) / len(values) * 1000, 3),
+                "p50_ms": round(_percentile(values, 50) * 1000, 3),
+                "p95_ms": round(_percentile(values, 95) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._errors.clear()
+            self._tokens.clear()
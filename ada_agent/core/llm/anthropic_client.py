@@ -1,111 +1,132 @@
 from .base import LLMProvider
+from .types import StreamEvent, FunctionCall, ToolCall, ChatMessage, ChatChoice, ChatResponse, Usage
 import anthropic
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Iterator
+import json
+import time
 
-# Mock objects to mimic OpenAI response structure for compatibility with existing Agent code
-@dataclass
-class MockFunction:
-    name: str
-    arguments: str
+# Marks the end of a cacheable prompt prefix
+CACHE_CONTROL = {"type": "ephemeral"}
 
-@dataclass
-class MockToolCall:
-    id: str
-    function: MockFunction
-    type: str = "function"
+# Anthropic stop_reason -> the OpenAI-style finish reasons used by ChatChoice
+FINISH_REASONS = {"end_turn": "stop", "stop_sequence": "stop", "tool_use": "tool_calls", "max_tokens": "length"}
 
-@dataclass
-class MockMessage:
-    content: Optional[str]
-    tool_calls: Optional[List[MockToolCall]]
-    def model_dump(self):
-        # Return dict representation compatible with the agent's expectations
-        d = {"role": "assistant", "content": self.content}
-        if self.tool_calls:
-            d["tool_calls"] = [
-                {
-                    "id": tc.id,
-                    "type": "function",
-                    "function": {
-                        "name": tc.function.name,
-                        "arguments": tc.function.arguments
-                    }
-                } for tc in self.tool_calls
-            ]
-        return d
-
-@dataclass
-class MockChoice:
-    message: MockMessage
-
-@dataclass
-class MockResponse:
-    choices: List[MockChoice]
+def _convert_usage(usage):
+    # Anthropic's input_tokens excludes the cached part; Usage.input_tokens is the whole prompt
+    if usage is None:
+        return None
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    return Usage(
+        input_tokens=(getattr(usage, "input_tokens", None) or 0) + cache_read + cache_write,
+        output_tokens=getattr(usage, "output_tokens", None) or 0,
+        cached_tokens=cache_read,
+        cache_write_tokens=cache_write
+    )
 
 class AnthropicProvider(LLMProvider):
-    def __init__(self, api_key: str, model_name: str = "claude-3-5-sonnet-20241022"):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    BASE_URL = "https://api.anthropic.com"
+
+    def __init__(self, api_key: str, model_name: str = "claude-3-5-sonnet-20241022", prompt_caching: bool = True, http_pool=None):
+        self.api_key = api_key
+        # Optional HTTPClientPool: share one connection pool with other providers
+        self.http_pool = http_pool
+        http_client = http_pool.client(self.BASE_URL, "anthropic") if http_pool is not None else None
+        self.client = anthropic.Anthropic(api_key=api_key, http_client=http_client)
         self.model_name = model_name
+        # Put cache_control breakpoints on the static prompt prefix (tools, base system prompt)
+        self.prompt_caching = prompt_caching
+        # Created on first `achat` so sync-only users don't pay for a second client
+        self._async_client = None
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            http_client = self.http_pool.async_client(self.BASE_URL, "anthropic") if self.http_pool is not None else None
+            self._async_client = anthropic.AsyncAnthropic(api_key=self.api_key, http_client=http_client)
+        return self._async_client
 
     def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        start = time.perf_counter()
+        response = self.client.messages.create(**self._build_request(messages, tools, tool_choice))
+        return self._convert_response(response, time.perf_counter() - start)
+
+    async def achat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        start = time.perf_counter()
+        response = await self.async_client.messages.create(**self._build_request(messages, tools, tool_choice))
+        return self._convert_response(response, time.perf_counter() - start)
+
+    def chat_stream(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Iterator[StreamEvent]:
+        stream = self.client.messages.create(stream=True, **self._build_request(messages, tools, tool_choice))
+        
+        content_text = ""
+        tool_calls = []
+        blocks = {} # content block index -> tool_use being assembled
+        usage = None
+        stop_reason = None
+        
+        for event in stream:
+            if event.type == "message_start":
+                # Input and cache token counts arrive up front, the output count at the end
+                usage = _convert_usage(getattr(event.message, "usage", None))
+            elif event.type == "message_delta":
+                stop_reason = getattr(event.delta, "stop_reason", None) or stop_reason
+                if usage is not None and getattr(event, "usage", None) is not None:
+                    usage.output_tokens = getattr(event.usage, "output_tokens", 0) or 0
+            elif event.type == "content_block_start" and event.content_block.type == "tool_use":
+                blocks[event.index] = {"id": event.content_block.id, "name": event.content_block.name, "input": []}
+            elif event.type == "content_block_delta":
+                if event.delta.type == "text_delta":
+                    content_text += event.delta.text
+                    yield StreamEvent(type="text", text=event.delta.text)
+                elif event.delta.type == "input_json_delta" and event.index in blocks:
+                    blocks[event.index]["input"].append(event.delta.partial_json)
+            elif event.type == "content_block_stop" and event.index in blocks:
+                # The tool_use block is closed, so its input JSON is complete
+                block = blocks.pop(event.index)
+                tool_call = ToolCall(
+                    id=block["id"],
+                    function=FunctionCall(
+                        name=block["name"],
+                        arguments="".join(block["input"]) or "{}"
+                    )
+                )
+                tool_calls.append(tool_call)
+                yield StreamEvent(type="tool_call", tool_call=tool_call)
+        
+        yield StreamEvent(type="message", message=ChatMessage(
+            content=content_text if content_text else None,
+            tool_calls=tool_calls if tool_calls else None
+        ), usage=usage, finish_reason=FINISH_REASONS.get(stop_reason, stop_reason))
+
+    def _build_request(self, messages, tools, tool_choice):
         # Convert OpenAI messages to Anthropic format
-        system_prompt = ""
+        # Each system message becomes its own block, so the base prompt (always the
+        # first one) stays byte-identical when skill instructions are added after it.
+        system_blocks = []
         filtered_messages = []
+        # The user message collecting the current run of tool results
+        tool_results = None
         
         for msg in messages:
             if msg["role"] == "system":
-                system_prompt += msg["content"] + "\n"
-            elif msg["role"] == "tool":
-                # Anthropic expects tool results to be part of the user role or a specific tool_result block
-                # OpenAI: role="tool", tool_call_id="..."
-                # Anthropic: role="user", content=[{"type": "tool_result", "tool_use_id": ..., "content": ...}]
-                filtered_messages.append({
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": msg["tool_call_id"],
-                            "content": msg["content"]
-                        }
-                    ]
-                })
-            elif msg["role"] == "assistant" and "tool_calls" in msg:
-                # Convert OpenAI tool calls to Anthropic tool_use
-                # OpenAI: tool_calls=[{function: {name, arguments}, id}]
-                # Anthropic: content=[{type: "tool_use", id, name, input}]
-                content_block = []
-                if msg.get("content"):
-                    content_block.append({"type": "text", "text": msg["content"]})
-                
-                for tc in msg["tool_calls"]:
-                    # Check if tc is dict or object (Agent might store dicts in history)
-                    tc_id = tc["id"] if isinstance(tc, dict) else tc.id
-                    func = tc["function"] if isinstance(tc, dict) else tc.function
-                    fname = func["name"] if isinstance(func, dict) else func.name
-                    import json
-                    fargs = json.loads(func["arguments"]) if isinstance(func, dict) else json.loads(func.arguments)
-                    
-                    content_block.append({
-                        "type": "tool_use",
-                        "id": tc_id,
-                        "name": fname,
-                        "input": fargs
-                    })
-                filtered_messages.append({"role": "assistant", "content": content_block})
+                # A fresh block every request: cache_control is set on it below
+                system_blocks.append({"type": "text", "text": msg["content"]})
+                continue
+            # Converted once per message, then served from the cache on later requests
+            converted = self._convert_message(msg, self._convert_history_message)
+            if msg["role"] == "tool":
+                # Anthropic wants every result of one assistant turn in a single user message
+                if tool_results is None:
+                    tool_results = {"role": "user", "content": []}
+                    filtered_messages.append(tool_results)
+                tool_results["content"].append(converted)
             else:
-                filtered_messages.append(msg)
+                tool_results = None
+                filtered_messages.append(converted)
 
         # Convert Tools
-        anthropic_tools = []
-        if tools:
-            for t in tools:
-                if t["type"] == "function":
-                    anthropic_tools.append({
-                        "name": t["function"]["name"],
-                        "description": t["function"]["description"],
-                        "input_schema": t["function"]["parameters"]
-                    })
+        anthropic_tools = self._convert_tools(tools, self._convert_tool_schemas) if tools else []
         
         # Make request
         kwargs = {
@@ -113,8 +134,14 @@ class AnthropicProvider(LLMProvider):
             "messages": filtered_messages,
             "max_tokens": 4096,
         }
-        if system_prompt:
-            kwargs["system"] = system_prompt
+        if system_blocks:
+            if self.prompt_caching:
+                # Breakpoints after the base prompt and after the last system block: skill
+                # injections are only ever appended, so the earlier ones stay cached too
+                system_blocks[0]["cache_control"] = CACHE_CONTROL
+                if len(system_blocks) > 1:
+                    system_blocks[-1]["cache_control"] = CACHE_CONTROL
+            kwargs["system"] = system_blocks
         if anthropic_tools:
             kwargs["tools"] = anthropic_tools
             # Anthropic tool_choice is different, simplified here:
@@ -123,9 +150,57 @@ class AnthropicProvider(LLMProvider):
             elif tool_choice == "none":
                 pass # Default is auto
             # else Leave as auto
+        return kwargs
 
-        response = self.client.messages.create(**kwargs)
+    def _convert_history_message(self, msg):
+        if msg["role"] == "tool":
+            # Anthropic expects tool results to be part of the user role or a specific tool_result block
+            # OpenAI: role="tool", tool_call_id="..."
+            # Anthropic: role="user", content=[{"type": "tool_result", "tool_use_id": ..., "content": ...}]
+            return {
+                "type": "tool_result",
+                "tool_use_id": msg["tool_call_id"],
+                "content": msg["content"]
+            }
+        if msg["role"] == "assistant" and "tool_calls" in msg:
+            # Convert OpenAI tool calls to Anthropic tool_use
+            # OpenAI: tool_calls=[{function: {name, arguments}, id}]
+            # Anthropic: content=[{type: "tool_use", id, name, input}]
+            content_block = []
+            if msg.get("content"):
+                content_block.append({"type": "text", "text": msg["content"]})
+            
+            for tc in msg["tool_calls"]:
+                # Check if tc is dict or object (Agent might store dicts in history)
+                tc_id = tc["id"] if isinstance(tc, dict) else tc.id
+                func = tc["function"] if isinstance(tc, dict) else tc.function
+                fname = func["name"] if isinstance(func, dict) else func.name
+                fargs = json.loads(func["arguments"]) if isinstance(func, dict) else json.loads(func.arguments)
+                
+                content_block.append({
+                    "type": "tool_use",
+                    "id": tc_id,
+                    "name": fname,
+                    "input": fargs
+                })
+            return {"role": "assistant", "content": content_block}
+        return msg
+
+    def _convert_tool_schemas(self, tools):
+        anthropic_tools = []
+        for t in tools:
+            if t["type"] == "function":
+                anthropic_tools.append({
+                    "name": t["function"]["name"],
+                    "description": t["function"]["description"],
+                    "input_schema": t["function"]["parameters"]
+                })
+        if self.prompt_caching and anthropic_tools:
+            # Tools come first in the prompt; a breakpoint on the last one caches them all
+            anthropic_tools[-1]["cache_control"] = CACHE_CONTROL
+        return anthropic_tools
 
+    def _convert_response(self, response, latency=None):
         # Convert back to OpenAI Response format for Agent compatibility
         content_text = ""
         tool_calls = []
@@ -134,18 +209,24 @@ class AnthropicProvider(LLMProvider):
             if block.type == "text":
                 content_text += block.text
             elif block.type == "tool_use":
-                import json
-                tool_calls.append(MockToolCall(
+                tool_calls.append(ToolCall(
                     id=block.id,
-                    function=MockFunction(
+                    function=FunctionCall(
                         name=block.name,
                         arguments=json.dumps(block.input)
                     )
                 ))
         
-        return MockResponse(choices=[
-            MockChoice(message=MockMessage(
-                content=content_text if content_text else None,
-                tool_calls=tool_calls if tool_calls else None
-            ))
-        ])
+        stop_reason = getattr(response, "stop_reason", None)
+        return ChatResponse(
+            choices=[ChatChoice(
+                message=ChatMessage(
+                    content=content_text if content_text else None,
+                    tool_calls=tool_calls if tool_calls else None
+                ),
+                finish_reason=FINISH_REASONS.get(stop_reason, stop_reason)
+            )],
+            usage=_convert_usage(getattr(response, "usage", None)),
+            latency=latency,
+            model=getattr(response, "model", None) or self.model_name
+        )
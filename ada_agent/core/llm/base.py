@@ -1,7 +1,17 @@
+import json
+import asyncio
+import threading
+from collections import OrderedDict
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
+from .types import StreamEvent
 
 class LLMProvider(ABC):
+    # Converted tool schemas kept per provider instance, see `_convert_tools`
+    _TOOL_CACHE_SIZE = 32
+    # Converted history messages kept per provider instance, see `_convert_message`
+    _MESSAGE_CACHE_SIZE = 4096
+
     @abstractmethod
     def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
         """
@@ -26,3 +36,94 @@ class LLMProvider(ABC):
             (choices[0].message.content, choices[0].message.tool_calls) to minimize Agent refactoring.
         """
         pass
+
+    async def achat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        """
+        Async counterpart of `chat`. Returns the same response shape.
+
+        Providers with a native async SDK client should override this. The default
+        runs the blocking `chat` in a worker thread so any provider can be awaited.
+        """
+        return await asyncio.to_thread(self.chat, messages, tools, tool_choice)
+
+    def chat_stream(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Iterator[StreamEvent]:
+        """
+        Streams a chat response as StreamEvent objects: "text" deltas and "tool_call"
+        events as soon as each call's arguments are complete, then one final
+        "message" event carrying the assembled message.
+
+        The default falls back to a single `chat` call, so providers without
+        streaming support still satisfy the interface.
+        """
+        message = self.chat(messages, tools, tool_choice).choices[0].message
+        if message.content:
+            yield StreamEvent(type="text", text=message.content)
+        for tool_call in message.tool_calls or []:
+            yield StreamEvent(type="tool_call", tool_call=tool_call)
+        yield StreamEvent(type="message", message=message)
+
+    def _cache_lock(self):
+        # A provider is shared by every Agent built on it, so its caches are guarded
+        return self.__dict__.setdefault("_conversion_lock", threading.Lock())
+
+    def _convert_tools(self, tools: List[Dict[str, Any]], convert) -> Any:
+        """
+        Returns `convert(tools)`, cached on the identity of the `tools` list.
+
+        `ToolRegistry.schemas()` hands out the same list until the tool set changes,
+        so providers that need their own schema format convert it once per change.
+        Each Agent has its own registry, so a list not seen before is also looked
+        up by content: Agents with the same tools share one conversion. Both caches
+        are LRU. The identity cache holds a reference to each list, so a recycled
+        id() can't alias.
+        """
+        by_id = self.__dict__.setdefault("_tool_cache", OrderedDict())
+        by_content = self.__dict__.setdefault("_tool_content_cache", OrderedDict())
+        with self._cache_lock():
+            entry = by_id.get(id(tools))
+            if entry is not None and entry[0] is tools:
+                by_id.move_to_end(id(tools))
+                return entry[1]
+        key = json.dumps(tools, sort_keys=True, default=str)
+        with self._cache_lock():
+            converted = by_content.get(key)
+            if converted is not None:
+                by_content.move_to_end(key)
+        if converted is None:
+            converted = convert(tools)
+        with self._cache_lock():
+            by_id[id(tools)] = (tools, converted)
+            by_content[key] = converted
+            for cache in (by_id, by_content):
+                while len(cache) > self._TOOL_CACHE_SIZE:
+                    cache.popitem(last=False)
+        return converted
+
+    def _convert_message(self, msg: Dict[str, Any], convert) -> Any:
+        """
+        Returns `convert(msg)`, cached on the identity of the message dict.
+
+        The Agent never edits a message once it is in the history (folding and
+        compaction replace the list, not its items), so providers that translate
+        the OpenAI format convert each message once instead of re-converting the
+        whole history on every request. The content is compared as well, in case a
+        caller does edit a message in place.
+
+        The cache is LRU: every request touches its whole history, so the live
+        conversations of all Agents sharing the provider stay cached, and messages
+        dropped from every history are the first to go.
+        """
+        cache = self.__dict__.setdefault("_message_cache", OrderedDict())
+        content = msg.get("content")
+        with self._cache_lock():
+            entry = cache.get(id(msg))
+            if entry is not None and entry[0] is msg and entry[1] is content:
+                cache.move_to_end(id(msg))
+                return entry[2]
+        converted = convert(msg)
+        with self._cache_lock():
+            cache[id(msg)] = (msg, content, converted)
+            cache.move_to_end(id(msg))
+            if len(cache) > self._MESSAGE_CACHE_SIZE:
+                cache.popitem(last=False)
+        return converted
@@ -0,0 +1,132 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+from typing import List, Dict, Any, Optional
+from .base import LLMProvider
+from .types import FunctionCall, ToolCall, ChatMessage, ChatChoice, ChatResponse, Usage
+from ..instrumentation import usage_to_dict
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def request_key(messages, tools=None, tool_choice="auto", model=None):
+    """Content hash of a request: the sha256 of its canonical JSON form."""
+    payload = {"messages": messages, "tools": tools, "tool_choice": tool_choice, "model": model}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _attr(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+def dump_response(response):
+    """
+    Reduces a provider's response to plain JSON: the shared ChatResponse type as well
+    as raw OpenAI SDK objects returned by custom providers.
+    """
+    choice = response.choices[0]
+    message = choice.message
+    tool_calls = []
+    for tc in message.tool_calls or []:
+        func = _attr(tc, "function")
+        tool_calls.append({"id": _attr(tc, "id"), "name": _attr(func, "name"), "arguments": _attr(func, "arguments")})
+    return {
+        "content": message.content,
+        "tool_calls": tool_calls,
+        "finish_reason": getattr(choice, "finish_reason", None),
+        "usage": usage_to_dict(getattr(response, "usage", None)),
+        "model": getattr(response, "model", None),
+    }
+
+def load_response(record):
+    tool_calls = [
+        ToolCall(id=tc["id"], function=FunctionCall(name=tc["name"], arguments=tc["arguments"]))
+        for tc in record.get("tool_calls") or []
+    ]
+    message = ChatMessage(content=record.get("content"), tool_calls=tool_calls or None)
+    usage = record.get("usage")
+    return ChatResponse(
+        choices=[ChatChoice(message=message, finish_reason=record.get("finish_reason"))],
+        usage=Usage.from_dict(usage) if usage else None,
+        latency=0.0,
+        model=record.get("model")
+    )
+
+
+class CassetteProvider(LLMProvider):
+    """
+    Wraps a provider to record its responses on disk and replay them later.
+
+    Responses are stored content-addressed: one gzipped JSON file per request,
+    named by the hash of the normalized request (messages, tools, tool_choice,
+    model) and fanned out over subdirectories like git objects.
+
+    Modes:
+    - "record": always call the wrapped provider and (over)write the recording.
+    - "replay": never call it; a request without a recording raises CassetteMiss.
+    - "auto": replay when a recording exists, record otherwise.
+    `provider` may be None in replay mode, e.g. on an offline CI box; then pass
+    the `model_name` the recordings were made with.
+    """
+    MODES = ("record", "replay", "auto")
+
+    def __init__(self, provider: Optional[LLMProvider], directory: str, mode: str = "auto", model_name: str = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid cassette mode: {mode!r}. Expected one of {self.MODES}.")
+        if provider is None and mode != "replay":
+            raise ValueError("A provider is required unless mode is 'replay'.")
+        self.provider = provider
+        self.directory = directory
+        self.mode = mode
+        # Part of the request key, so recordings of different models never collide
+        self.model_name = model_name or getattr(provider, "model_name", None)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:] + ".json.gz")
+
+    def _lookup(self, key):
+        if self.mode == "record":
+            return None
+        try:
+            with gzip.open(self.path(key), "rt", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            if self.mode == "replay":
+                raise CassetteMiss(f"No recording for request {key} in {self.directory}")
+            return None
+        with self._lock:
+            self.hits += 1
+        return load_response(record)
+
+    def _store(self, key, response):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(dump_response(response), f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        key = request_key(messages, tools, tool_choice, self.model_name)
+        response = self._lookup(key)
+        if response is None:
+            response = self.provider.chat(messages, tools, tool_choice)
+            self._store(key, response)
+        return response
+
+    async def achat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        key = request_key(messages, tools, tool_choice, self.model_name)
+        response = self._lookup(key)
+        if response is None:
+            response = await self.provider.achat(messages, tools, tool_choice)
+            self._store(key, response)
+        return response
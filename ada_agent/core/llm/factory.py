@@ -0,0 +1,74 @@
+import os
+import threading
+from .http_pool import HTTPClientPool, PoolConfig
+
+class ProviderFactory:
+    """
+    Builds providers on top of one HTTPClientPool, so every session talking to the
+    same API reuses the same pooled, kept-alive connections.
+
+    Providers are cached by their arguments: asking twice for the same API key,
+    base URL and model returns the same instance, which is safe to share between
+    Agents.
+
+    With `pooled=False` providers are only cached and each SDK keeps its default
+    HTTP client. Gemini's SDK manages its own transport (and `genai.configure` is
+    process-wide), so Gemini providers are cached but never pooled here.
+    """
+    def __init__(self, pool_config: PoolConfig = None, pooled: bool = True):
+        self.pool = HTTPClientPool(pool_config) if pooled else None
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key, build):
+        with self._lock:
+            provider = self._providers.get(key)
+            if provider is None:
+                provider = self._providers[key] = build()
+            return provider
+
+    def openai_compatible(self, api_key: str, base_url: str, model_name: str):
+        from .openai_compatible import OpenAICompatibleProvider
+        return self._cached(
+            ("openai", api_key, base_url, model_name),
+            lambda: OpenAICompatibleProvider(api_key=api_key, base_url=base_url, model_name=model_name, http_pool=self.pool)
+        )
+
+    def anthropic(self, api_key: str, model_name: str = None, prompt_caching: bool = True):
+        from .anthropic_client import AnthropicProvider
+        kwargs = {"model_name": model_name} if model_name else {}
+        return self._cached(
+            ("anthropic", api_key, model_name, prompt_caching),
+            lambda: AnthropicProvider(api_key=api_key, prompt_caching=prompt_caching, http_pool=self.pool, **kwargs)
+        )
+
+    def gemini(self, api_key: str, model_name: str = None):
+        from .gemini_client import GeminiProvider
+        kwargs = {"model_name": model_name} if model_name else {}
+        return self._cached(("gemini", api_key, model_name), lambda: GeminiProvider(api_key=api_key, **kwargs))
+
+    def metrics(self):
+        """Connection pool saturation per base URL, see HTTPClientPool.metrics."""
+        return self.pool.metrics() if self.pool is not None else {}
+
+    def close(self):
+        with self._lock:
+            self._providers.clear()
+        if self.pool is not None:
+            self.pool.close()
+
+
+_default_factory = None
+_default_lock = threading.Lock()
+
+def default_factory():
+    """
+    The process-wide factory, configured from ADA_HTTP_* environment variables on
+    first use. Connection pooling is opt-in with ADA_HTTP_POOL=1.
+    """
+    global _default_factory
+    with _default_lock:
+        if _default_factory is None:
+            pooled = os.getenv("ADA_HTTP_POOL", "").lower() in ("1", "true", "yes")
+            _default_factory = ProviderFactory(PoolConfig.from_env(), pooled=pooled)
+        return _default_factory
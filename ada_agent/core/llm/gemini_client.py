@@ -1,54 +1,81 @@
 from .base import LLMProvider
+from .types import StreamEvent, FunctionCall, ToolCall, ChatMessage, ChatChoice, ChatResponse, Usage
 import google.generativeai as genai
 from google.generativeai.types import content_types
-from google.protobuf import struct_pb2
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Iterator
 import json
+import time
+import hashlib
+import threading
 
-# Reuse Mock objects
-@dataclass
-class MockFunction:
-    name: str
-    arguments: str
-
-@dataclass
-class MockToolCall:
-    id: str  # Gemini function calls don't strictly have IDs in the same way, but we will generate key
-    function: MockFunction
-    type: str = "function"
-
-@dataclass
-class MockMessage:
-    content: Optional[str]
-    tool_calls: Optional[List[MockToolCall]]
-    def model_dump(self):
-        d = {"role": "assistant", "content": self.content}
-        if self.tool_calls:
-            d["tool_calls"] = [
-                {
-                    "id": tc.id,
-                    "type": "function",
-                    "function": {
-                        "name": tc.function.name,
-                        "arguments": tc.function.arguments
-                    }
-                } for tc in self.tool_calls
-            ]
-        return d
-
-@dataclass
-class MockChoice:
-    message: MockMessage
-
-@dataclass
-class MockResponse:
-    choices: List[MockChoice]
+# Gemini FinishReason names -> the OpenAI-style finish reasons used by ChatChoice
+FINISH_REASONS = {"STOP": "stop", "MAX_TOKENS": "length", "SAFETY": "content_filter", "RECITATION": "content_filter"}
+
+def _convert_usage(usage_metadata):
+    # prompt_token_count already includes cached_content_token_count
+    if usage_metadata is None:
+        return None
+    return Usage(
+        input_tokens=getattr(usage_metadata, "prompt_token_count", None) or 0,
+        output_tokens=getattr(usage_metadata, "candidates_token_count", None) or 0,
+        cached_tokens=getattr(usage_metadata, "cached_content_token_count", None) or 0
+    )
+
+# JSON Schema keys Gemini's Schema proto understands (camelCase ones renamed); the rest, like "default", are dropped
+SCHEMA_KEYS = {"type": "type", "format": "format", "description": "description", "nullable": "nullable", "enum": "enum",
+               "maxItems": "max_items", "minItems": "min_items", "required": "required"}
+
+def _clean_schema(schema):
+    """Reduces a JSON Schema to the subset Gemini function declarations accept."""
+    cleaned = {}
+    for key, value in schema.items():
+        if key in SCHEMA_KEYS:
+            cleaned[SCHEMA_KEYS[key]] = value
+        elif key == "properties":
+            cleaned["properties"] = {name: _clean_schema(prop) for name, prop in value.items()}
+        elif key == "items" and isinstance(value, dict):
+            cleaned["items"] = _clean_schema(value)
+    if isinstance(cleaned.get("type"), list):
+        # ["string", "null"] -> a nullable string
+        types = [t for t in cleaned["type"] if t != "null"]
+        if len(types) < len(cleaned["type"]):
+            cleaned["nullable"] = True
+        cleaned["type"] = types[0] if types else "string"
+    return cleaned
+
+def _finish_reason(candidate, has_tool_calls):
+    reason = getattr(candidate, "finish_reason", None)
+    if reason is None:
+        return None
+    name = getattr(reason, "name", str(reason))
+    if has_tool_calls and name == "STOP":
+        return "tool_calls"
+    return FINISH_REASONS.get(name, name.lower())
 
 class GeminiProvider(LLMProvider):
     def __init__(self, api_key: str, model_name: str = "gemini-2.0-flash-exp"):
         genai.configure(api_key=api_key)
+        self.api_key = api_key
+        self.model_name = model_name
         self.model = genai.GenerativeModel(model_name)
+        # GenerativeModel handles by system prompt hash: the system instruction is fixed per
+        # handle, and the base prompt rarely changes, so one handle serves a whole session
+        self._models = {}
+        self._models_lock = threading.Lock()
+
+    _MODEL_CACHE_SIZE = 16
+
+    def _model_for(self, system_instruction):
+        if not system_instruction:
+            return self.model
+        key = hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()
+        with self._models_lock:
+            model = self._models.get(key)
+            if model is None:
+                if len(self._models) >= self._MODEL_CACHE_SIZE:
+                    self._models.pop(next(iter(self._models)))
+                model = self._models[key] = genai.GenerativeModel(self.model_name, system_instruction=system_instruction)
+            return model
 
     def _convert_tool_calls_to_parts(self, tool_calls_data):
         parts = []
@@ -57,155 +84,207 @@ class GeminiProvider(LLMProvider):
             name = func["name"] if isinstance(func, dict) else func.name
             args = json.loads(func["arguments"]) if isinstance(func, dict) else json.loads(func.arguments)
             
-            fc = content_types.FunctionCall(name=name, args=args)
-            parts.append(fc)
+            parts.append(genai.protos.Part(function_call=genai.protos.FunctionCall(name=name, args=args)))
         return parts
 
     def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        contents, gemini_tools, system_instruction = self._build_request(messages, tools)
+        start = time.perf_counter()
+        response = self._model_for(system_instruction).generate_content(
+            contents=contents,
+            tools=gemini_tools or None,
+            # tool_config=... # for tool_choice
+        )
+        return self._convert_response(response, time.perf_counter() - start)
+
+    async def achat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        contents, gemini_tools, system_instruction = self._build_request(messages, tools)
+        start = time.perf_counter()
+        response = await self._model_for(system_instruction).generate_content_async(
+            contents=contents,
+            tools=gemini_tools or None,
+        )
+        return self._convert_response(response, time.perf_counter() - start)
+
+    def chat_stream(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Iterator[StreamEvent]:
+        contents, gemini_tools, system_instruction = self._build_request(messages, tools)
+        response = self._model_for(system_instruction).generate_content(
+            contents=contents,
+            tools=gemini_tools or None,
+            stream=True
+        )
+        
+        content_text = None
+        tool_calls = []
+        usage = None
+        candidate = None
+        
+        for chunk in response:
+            # Every chunk carries the running totals; the last one wins
+            usage = _convert_usage(getattr(chunk, "usage_metadata", None)) or usage
+            if getattr(chunk, "candidates", None):
+                candidate = chunk.candidates[0]
+            try:
+                parts = chunk.parts
+            except Exception:
+                continue # e.g. a trailing chunk that only carries finish metadata
+            for part in parts:
+                if part.text:
+                    if content_text is None: content_text = ""
+                    content_text += part.text
+                    yield StreamEvent(type="text", text=part.text)
+                if part.function_call:
+                    # Gemini sends each function call whole, never split across chunks
+                    tool_call = self._convert_function_call(part.function_call)
+                    tool_calls.append(tool_call)
+                    yield StreamEvent(type="tool_call", tool_call=tool_call)
+        
+        yield StreamEvent(type="message", message=ChatMessage(
+            content=content_text,
+            tool_calls=tool_calls if tool_calls else None
+        ), usage=usage, finish_reason=_finish_reason(candidate, bool(tool_calls)))
+
+    def _convert_function_call(self, function_call):
+        import uuid
+        return ToolCall(
+            id=f"call_{uuid.uuid4().hex[:8]}", # Gemini doesn't verify IDs
+            function=FunctionCall(
+                name=function_call.name,
+                arguments=json.dumps(dict(function_call.args))
+            )
+        )
+
+    def _build_request(self, messages, tools):
         # Convert History
-        # Gemini uses 'user' and 'model'. System instructions are passed at init or separate.
-        # We will try to map system role to system instruction if possible, or merge into first user msg
+        # Gemini uses 'user' and 'model'. The base system prompt is returned separately and
+        # sent as the model's native system_instruction (see `_model_for`).
         
         gemini_history = []
         system_instruction = None
+        # System messages after the base prompt (skill instructions, summaries). They go
+        # near the end of the request so the prefix Gemini can cache stays unchanged.
+        system_updates = []
+        # tool_call_id -> function name, filled in as assistant turns go by: a tool
+        # result needs the name of its call, which OpenAI's format leaves out
+        tool_names = {}
+        # The turn collecting the current run of function responses
+        tool_results = None
         
         for msg in messages:
             role = msg["role"]
             content = msg.get("content")
             
             if role == "system":
-                # Gemini supports system_instruction on GenerativeModel init or request
-                # We can prepend to history or set as instruction. 
-                # Ideally, we collect all system prompts.
+                # The first system message is the base prompt; it alone forms the prefix.
                 if system_instruction is None:
                     system_instruction = content
                 else:
-                    system_instruction += "\n" + content
+                    system_updates.append(content)
+                continue
             
-            elif role == "user":
-                gemini_history.append({"role": "user", "parts": [content]})
+            if role == "tool":
+                # Gemini expects a FunctionResponse named after the call it answers
+                func_name = tool_names.get(msg["tool_call_id"], "unknown_tool")
+                part = self._convert_message(msg, lambda m: self._convert_tool_result(m, func_name))
+                if part.function_response.name != func_name:
+                    part = self._convert_tool_result(msg, func_name)
+                # Responses to parallel calls belong in one turn, like the calls themselves
+                if tool_results is None:
+                    tool_results = {"role": "user", "parts": []}
+                    gemini_history.append(tool_results)
+                tool_results["parts"].append(part)
+                continue
             
-            elif role == "assistant":
-                parts = []
-                if content:
-                    parts.append(content)
-                if "tool_calls" in msg and msg["tool_calls"]:
-                    # Convert OpenAI tool calls to Gemini FunctionCalls
-                    # Note: We need to reconstruct the FunctionCall objects
-                     fc_parts = self._convert_tool_calls_to_parts(msg["tool_calls"])
-                     parts.extend(fc_parts)
-                
+            tool_results = None
+            # Parts are converted once per message and shared between requests: copy the
+            # list before changing it
+            parts = self._convert_message(msg, self._convert_history_message)
+            if role == "assistant":
+                for tc in msg.get("tool_calls") or []:
+                    tc_id = tc["id"] if isinstance(tc, dict) else tc.id
+                    func = tc["function"] if isinstance(tc, dict) else tc.function
+                    tool_names[tc_id] = func["name"] if isinstance(func, dict) else func.name
                 gemini_history.append({"role": "model", "parts": parts})
-                
-            elif role == "tool":
-                # Gemini expects FunctionResponse
-                # We need to match the previous FunctionCall. 
-                # OpenAI has tool_call_id. Gemini flow is strictly sequential in parts usually.
-                # Simplification: We map the tool response to a FunctionResponse part.
-                # We need the function name for the response, which OpenAI role='tool' doesn't explicitly have without lookback.
-                # BUT the agent stores the history. The provider receives the FULL history.
-                # We can attempt to deduce the name or just pass the ID as part of the response if Gemini allowed.
-                # Gemini SDK wants: part = FunctionResponse(name=..., response={...})
-                
-                # Look back in messages to find the tool call with this ID
-                # This is O(N) but history is short.
-                func_name = "unknown_tool"
-                for prev in reversed(messages):
-                    if prev.get("tool_calls"):
-                        for tc in prev["tool_calls"]:
-                            tc_id = tc["id"] if isinstance(tc, dict) else tc.id
-                            if tc_id == msg["tool_call_id"]:
-                                func = tc["function"] if isinstance(tc, dict) else tc.function
-                                func_name = func["name"] if isinstance(func, dict) else func.name
-                                break
-                    if func_name != "unknown_tool": 
-                        break
-                
-                # Gemini expects dict response
-                try:
-                    resp_dict = json.loads(msg["content"])
-                except:
-                    resp_dict = {"result": msg["content"]}
-                    
-                gemini_history.append({
-                    "role": "user",
-                    "parts": [
-                        content_types.FunctionResponse(name=func_name, response=resp_dict)
-                    ]
-                })
+            elif role == "user":
+                gemini_history.append({"role": "user", "parts": parts})
 
         # Configure Tools
-        gemini_tools = []
-        if tools:
-            # Convert OpenAI schema to Gemini
-            # Luckily Gemini SDK supports passing the function declarations relatively easily
-            # But we have JSON schema.
-            # We can pass a list of tools.
-            declarations = []
-            for t in tools:
-                if t["type"] == "function":
-                     # We need to convert JSON Schema to Gemini's format manually or use helpers
-                     # For simplicity in this Adapter, we will rely on internal helpers or
-                     # just construct the Tool object if possible.
-                     # Actually, `genai.configure` and passing tools arg often accepts list of functions.
-                     # Since we have schema, we might need `genai.protos.Tool`.
-                     
-                     # Simple workaround: The `tools` arg in `model.generate_content` is robust.
-                     # We can define the function declaration dictionary.
-                     f = t["function"]
-                     declarations.append({
-                         "name": f["name"],
-                         "description": f.get("description"),
-                         "parameters": f.get("parameters")
-                     })
-            gemini_tools = [declarations] # List of lists of tools (Tool dicts)
-
-        # Generate
-        # Note: Gemini 1.5/2.0 supports system_instruction argument in generate_content (sometimes) or model init.
-        # Safest is model init, but we want stateless per request if possible.
-        # `model.generate_content` accepts `system_instruction`? 
-        # Yes, in newer versions.
-        
-        request_options = {}
-        if system_instruction:
-            # We might need to re-instantiate model if system prompt changes dynamically and isn't supported in generate_content
-            # Actually for now let's hope it is.
-            # If not, we just prepend to history parts[0].
-            pass
-
-        # Since we are using chat, we should use start_chat for history management? 
-        # Or just generate_content with full history.
-        # generate_content with full history is effectively stateless "chat"
-        
-        # Adjust history for generate_content: it expects a list of Content objects or dicts
-        # The first message must be user.
-        if gemini_history and gemini_history[0]["role"] == "model":
-             # Insert a dummy user message or merge?
-             gemini_history.insert(0, {"role": "user", "parts": ["Hi"]}) 
-        
-        if system_instruction:
-             # Prepend system instruction as a user message or system if supported
-             # Current API often prefers system configs on model.
-             # Let's try adding it as the very first USER part for compatibility
-             if gemini_history:
-                existing_parts = gemini_history[0]["parts"]
-                if isinstance(existing_parts, list):
-                    existing_parts.insert(0, f"System Instruction: {system_instruction}")
-                else:
-                    # just overwrite?
-                    gemini_history[0]["parts"] = [f"System Instruction: {system_instruction}", str(existing_parts)]
-        
-        response = self.model.generate_content(
-            contents=gemini_history,
-            tools=gemini_tools or None,
-            # tool_config=... # for tool_choice
-        )
-        
+        gemini_tools = self._convert_tools(tools, self._convert_tool_schemas) if tools else []
+
+        if system_updates:
+            self._insert_system_notes(gemini_history, system_updates)
+        if gemini_history and gemini_history[0]["role"] != "user":
+            # The window can start mid tool loop, but Gemini wants a user turn first (and a
+            # function call right after one); say where the conversation picks up
+            gemini_history.insert(0, {"role": "user", "parts": ["[System note, not from the user] Earlier turns of this conversation are omitted."]})
+
+        return gemini_history, gemini_tools, system_instruction
+
+    def _insert_system_notes(self, history, system_updates):
+        # Gemini has no system role mid-conversation: the notes go in a user turn, labelled
+        # as such, placed before the trailing tool exchange (a function response must
+        # directly follow its call). Earlier turns, and so the cached prefix, stay as they were.
+        note = "[System notes, not from the user]\n" + "\n\n".join(system_updates)
+        start = len(history)
+        while start > 0 and not all(isinstance(part, str) for part in history[start - 1]["parts"]):
+            start -= 1
+        before = history[start - 1] if start > 0 else None
+        if before is not None and before["role"] == "user":
+            # Share the user's turn rather than sending two user turns in a row
+            before["parts"] = [note] + list(before["parts"])
+        else:
+            history.insert(start, {"role": "user", "parts": [note]})
+
+    def _convert_history_message(self, msg):
+        # User and assistant messages -> Gemini parts
+        parts = []
+        if msg.get("content"):
+            parts.append(msg["content"])
+        if msg["role"] == "assistant" and msg.get("tool_calls"):
+            # Convert OpenAI tool calls to Gemini FunctionCalls
+            parts.extend(self._convert_tool_calls_to_parts(msg["tool_calls"]))
+        return parts
+
+    def _convert_tool_result(self, msg, func_name):
+        # Gemini expects dict response
+        try:
+            resp_dict = json.loads(msg["content"])
+        except:
+            resp_dict = None
+        if not isinstance(resp_dict, dict):
+            resp_dict = {"result": msg["content"]}
+        return genai.protos.Part(function_response=genai.protos.FunctionResponse(name=func_name, response=resp_dict))
+
+    def _convert_tool_schemas(self, tools):
+        # Convert OpenAI schema to Gemini function declarations, built into the SDK's
+        # FunctionLibrary once per tool set (cached by `_convert_tools`), so requests
+        # don't rebuild the protos from dicts every time
+        declarations = []
+        for t in tools:
+            if t["type"] == "function":
+                f = t["function"]
+                declaration = {"name": f["name"], "description": f.get("description")}
+                parameters = _clean_schema(f.get("parameters") or {})
+                # Gemini rejects an object schema without properties; leave it out for no-arg tools
+                if parameters.get("properties"):
+                    declaration["parameters"] = parameters
+                declarations.append(declaration)
+        return content_types.to_function_library([declarations])
+
+    def _convert_response(self, response, latency=None):
         # Convert response to OpenAI format
+        usage = _convert_usage(getattr(response, "usage_metadata", None))
+        candidate = response.candidates[0] if getattr(response, "candidates", None) else None
         try:
             p = response.parts[0]
         except:
-             return MockResponse(choices=[MockChoice(message=MockMessage(content="Error: Empty response from Gemini", tool_calls=None))])
+             return ChatResponse(
+                 choices=[ChatChoice(
+                     message=ChatMessage(content="Error: Empty response from Gemini", tool_calls=None),
+                     finish_reason=_finish_reason(candidate, False)
+                 )],
+                 usage=usage, latency=latency, model=self.model_name
+             )
              
         content_text = None
         tool_calls = []
@@ -215,18 +294,17 @@ class GeminiProvider(LLMProvider):
                 if content_text is None: content_text = ""
                 content_text += part.text
             if part.function_call:
-                import uuid
-                tool_calls.append(MockToolCall(
-                    id=f"call_{uuid.uuid4().hex[:8]}", # Gemini doesn't verify IDs
-                    function=MockFunction(
-                        name=part.function_call.name,
-                        arguments=json.dumps(dict(part.function_call.args))
-                    )
-                ))
+                tool_calls.append(self._convert_function_call(part.function_call))
         
-        return MockResponse(choices=[
-            MockChoice(message=MockMessage(
-                content=content_text,
-                tool_calls=tool_calls if tool_calls else None
-            ))
-        ])
+        return ChatResponse(
+            choices=[ChatChoice(
+                message=ChatMessage(
+                    content=content_text,
+                    tool_calls=tool_calls if tool_calls else None
+                ),
+                finish_reason=_finish_reason(candidate, bool(tool_calls))
+            )],
+            usage=usage,
+            latency=latency,
+            model=self.model_name
+        )
@@ -0,0 +1,268 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator
+from .base import LLMProvider
+from .types import StreamEvent
+from ..instrumentation import _percentile
+
+
+class LatencyStats:
+    """Rolling latency window and counters for one backend."""
+    def __init__(self, name, window=200):
+        self.name = name
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        # Requests whose response was the one returned to the caller
+        self.wins = 0
+        # Requests started as a hedge or a failover, not as the first attempt
+        self.hedges = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def start(self, hedge=False):
+        with self._lock:
+            self.requests += 1
+            if hedge:
+                self.hedges += 1
+
+    def record(self, latency=None, error=False):
+        with self._lock:
+            if error:
+                self.errors += 1
+            else:
+                self.latencies.append(latency)
+
+    def win(self):
+        with self._lock:
+            self.wins += 1
+
+    def percentile(self, p):
+        with self._lock:
+            values = sorted(self.latencies)
+        return _percentile(values, p)
+
+    def snapshot(self):
+        with self._lock:
+            values = sorted(self.latencies)
+            result = {
+                "requests": self.requests,
+                "wins": self.wins,
+                "hedges": self.hedges,
+                "errors": self.errors,
+            }
+        for p in (50, 95, 99):
+            value = _percentile(values, p)
+            result[f"p{p}_ms"] = round(value * 1000, 3) if value is not None else None
+        return result
+
+
+class HedgedProvider(LLMProvider):
+    """
+    Sends each request to the first provider and, if it hasn't answered by the
+    hedge deadline, also to the next one, returning whichever response arrives
+    first. A provider that fails hands the request to the next one right away, so
+    the request only fails once every provider has.
+
+    The deadline is the `hedge_percentile` of the first provider's recent
+    latencies: with the default 95, roughly one request in twenty is hedged, and
+    those are exactly the slow tail. Until `min_samples` latencies are known,
+    `initial_deadline` seconds is used instead.
+
+    Sync requests run on a pool of `max_workers` threads. A request's deadline
+    counts from when it gets a thread, not from when it was queued, and no hedge
+    is sent while every thread is busy (it would only queue too); failover still
+    is. A sync request that loses the race keeps its thread until its provider
+    answers (an HTTP call can't be interrupted); async ones are cancelled.
+    Streams are not hedged, since the first events may already be shown, but fail
+    over to the next provider if they break before their first event.
+
+    `stats()` reports requests, wins, hedges, errors and p50/p95/p99 latency per provider.
+    """
+    def __init__(self, providers: List[LLMProvider], names: Optional[List[str]] = None, hedge_percentile=95,
+                 initial_deadline=10.0, min_deadline=0.5, min_samples=20, window=200, max_workers=32):
+        if not providers:
+            raise ValueError("HedgedProvider needs at least one provider")
+        self.providers = list(providers)
+        names = list(names or [getattr(p, "model_name", None) or type(p).__name__ for p in self.providers])
+        for i, name in enumerate(names):
+            # Keep stats() keys apart when two providers share a name
+            if name in names[:i]:
+                names[i] = f"{name}#{i}"
+        self.backends = [LatencyStats(name, window) for name in names]
+        self.model_name = getattr(self.providers[0], "model_name", None)
+        self.hedge_percentile = hedge_percentile
+        self.initial_deadline = initial_deadline
+        # Never hedge sooner than this, whatever the percentile says
+        self.min_deadline = min_deadline
+        self.min_samples = min_samples
+        self._max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Sync requests submitted and not yet finished, losers included
+        self._in_flight = 0
+
+    @property
+    def executor(self):
+        # Created on first sync request; async requests don't need threads
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="ada-hedge")
+            return self._executor
+
+    def hedge_deadline(self):
+        """Seconds to wait for the first provider before sending a hedge request."""
+        primary = self.backends[0]
+        if len(primary.latencies) < self.min_samples:
+            return self.initial_deadline
+        return max(self.min_deadline, primary.percentile(self.hedge_percentile))
+
+    def stats(self):
+        return {backend.name: backend.snapshot() for backend in self.backends}
+
+    def _call(self, index, messages, tools, tool_choice):
+        backend = self.backends[index]
+        start = time.perf_counter()
+        try:
+            response = self.providers[index].chat(messages, tools, tool_choice)
+        except Exception:
+            backend.record(error=True)
+            raise
+        backend.record(time.perf_counter() - start)
+        return response
+
+    async def _acall(self, index, messages, tools, tool_choice):
+        backend = self.backends[index]
+        start = time.perf_counter()
+        try:
+            response = await self.providers[index].achat(messages, tools, tool_choice)
+        except asyncio.CancelledError:
+            # Lost the race: it took at least this long, which keeps the slow tail in the window
+            backend.record(time.perf_counter() - start)
+            raise
+        except Exception:
+            backend.record(error=True)
+            raise
+        backend.record(time.perf_counter() - start)
+        return response
+
+    def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        pending = {}
+        # Hedge deadline of each request, set once it has a thread rather than when it was queued
+        deadlines = {}
+        cond = threading.Condition()
+        next_index = 0
+        error = None
+
+        def run(index):
+            with cond:
+                deadlines[index] = time.monotonic() + self.hedge_deadline()
+                cond.notify_all()
+            return self._call(index, messages, tools, tool_choice)
+
+        def finished(future):
+            with self._executor_lock:
+                self._in_flight -= 1
+            with cond:
+                cond.notify_all()
+
+        def launch():
+            nonlocal next_index
+            self.backends[next_index].start(hedge=next_index > 0)
+            with self._executor_lock:
+                self._in_flight += 1
+            future = self.executor.submit(run, next_index)
+            pending[future] = next_index
+            next_index += 1
+            future.add_done_callback(finished)
+
+        launch()
+        while pending:
+            with cond:
+                while True:
+                    done = [future for future in pending if future.done()]
+                    if done:
+                        break
+                    # Wait for a result or the next hedge, or indefinitely once every provider is running
+                    deadline = deadlines.get(next_index - 1) if next_index < len(self.providers) else None
+                    if deadline is not None and deadline <= time.monotonic():
+                        break
+                    cond.wait(None if deadline is None else deadline - time.monotonic())
+            failed = False
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    failed = True
+                    continue
+                self.backends[index].win()
+                return response
+            if next_index < len(self.providers):
+                if failed or self._has_free_worker():
+                    launch()
+                else:
+                    # A hedge would only queue behind busy threads: keep waiting on what is running
+                    deadlines.pop(next_index - 1, None)
+        raise error
+
+    def _has_free_worker(self):
+        with self._executor_lock:
+            return self._in_flight < self._max_workers
+
+    async def achat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        pending = {}
+        next_index = 0
+        error = None
+
+        def launch():
+            nonlocal next_index
+            self.backends[next_index].start(hedge=next_index > 0)
+            pending[asyncio.ensure_future(self._acall(next_index, messages, tools, tool_choice))] = next_index
+            next_index += 1
+
+        launch()
+        deadline = time.monotonic() + self.hedge_deadline()
+        try:
+            while pending:
+                timeout = max(0.0, deadline - time.monotonic()) if next_index < len(self.providers) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = pending.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    self.backends[index].win()
+                    return response
+                if next_index < len(self.providers):
+                    launch()
+                    deadline = time.monotonic() + self.hedge_deadline()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def chat_stream(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Iterator[StreamEvent]:
+        for index, provider in enumerate(self.providers):
+            backend = self.backends[index]
+            backend.start(hedge=index > 0)
+            start = time.perf_counter()
+            started = False
+            try:
+                for event in provider.chat_stream(messages, tools, tool_choice):
+                    started = True
+                    yield event
+            except Exception:
+                backend.record(error=True)
+                # Events already handed out can't be taken back; otherwise try the next provider
+                if started or index == len(self.providers) - 1:
+                    raise
+                continue
+            backend.record(time.perf_counter() - start)
+            backend.win()
+            return
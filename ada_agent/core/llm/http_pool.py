@@ -0,0 +1,269 @@
+import os
+import sys
+import threading
+import importlib
+from dataclasses import dataclass
+
+@dataclass
+class PoolConfig:
+    """Connection pool settings, applied to every pooled client."""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    # Seconds an idle connection is kept open for reuse
+    keepalive_expiry: float = 60.0
+    # HTTP/2 multiplexes requests over one connection; needs the `h2` package
+    http2: bool = False
+    timeout: float = 600.0
+
+    @classmethod
+    def from_env(cls):
+        """Reads ADA_HTTP_MAX_CONNECTIONS, ADA_HTTP_MAX_KEEPALIVE, ADA_HTTP_KEEPALIVE_EXPIRY, ADA_HTTP2 and ADA_HTTP_TIMEOUT."""
+        config = cls()
+        if os.getenv("ADA_HTTP_MAX_CONNECTIONS"):
+            config.max_connections = int(os.getenv("ADA_HTTP_MAX_CONNECTIONS"))
+        if os.getenv("ADA_HTTP_MAX_KEEPALIVE"):
+            config.max_keepalive_connections = int(os.getenv("ADA_HTTP_MAX_KEEPALIVE"))
+        if os.getenv("ADA_HTTP_KEEPALIVE_EXPIRY"):
+            config.keepalive_expiry = float(os.getenv("ADA_HTTP_KEEPALIVE_EXPIRY"))
+        if os.getenv("ADA_HTTP2"):
+            config.http2 = os.getenv("ADA_HTTP2").lower() in ("1", "true", "yes")
+        if os.getenv("ADA_HTTP_TIMEOUT"):
+            config.timeout = float(os.getenv("ADA_HTTP_TIMEOUT"))
+        return config
+
+    def limits(self, httpx):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+
+class PoolStats:
+    """
+    Saturation counters for one pool. A request counts as in flight from the
+    moment it is sent until its response body is closed, which is how long it
+    holds a connection; requests still waiting for a free connection count too,
+    so `peak_in_flight` above `max_connections` means the pool was too small.
+    """
+    def __init__(self, max_connections):
+        self.max_connections = max_connections
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        # Requests that found every connection busy and had to queue for one
+        self.saturated_requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.max_connections and self.in_flight >= self.max_connections:
+                self.saturated_requests += 1
+            self.in_flight += 1
+            self.requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def release(self, error=False):
+        with self._lock:
+            self.in_flight -= 1
+            if error:
+                self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "max_connections": self.max_connections,
+                "utilization": round(self.in_flight / self.max_connections, 3) if self.max_connections else None,
+                "requests": self.requests,
+                "saturated_requests": self.saturated_requests,
+                "errors": self.errors,
+            }
+
+
+def _once(fn):
+    # A response body can be closed more than once; count the release only the first time
+    done = []
+    def wrapper():
+        if not done:
+            done.append(True)
+            fn()
+    return wrapper
+
+
+def _http_module(sdk):
+    """
+    The HTTP library (httpx or a fork of it) whose Client the `sdk` package accepts
+    as `http_client`, found from the SDK's own DefaultHttpxClient; None if unavailable.
+    """
+    try:
+        client_class = importlib.import_module(sdk).DefaultHttpxClient
+    except (ImportError, AttributeError):
+        return None
+    for base in client_class.__mro__:
+        if base.__name__ == "Client" and not base.__module__.startswith(sdk):
+            return sys.modules.get(base.__module__.split(".")[0])
+    return None
+
+
+_transport_types = {}
+
+def _counting_transports(httpx):
+    """(CountingTransport, AsyncCountingTransport) built on the given HTTP library's base classes."""
+    types = _transport_types.get(httpx.__name__)
+    if types is not None:
+        return types
+
+    class _CountedStream(httpx.SyncByteStream):
+        def __init__(self, stream, release):
+            self._stream = stream
+            self._release = release
+
+        def __iter__(self):
+            yield from self._stream
+
+        def close(self):
+            try:
+                self._stream.close()
+            finally:
+                self._release()
+
+    class _AsyncCountedStream(httpx.AsyncByteStream):
+        def __init__(self, stream, release):
+            self._stream = stream
+            self._release = release
+
+        async def __aiter__(self):
+            async for chunk in self._stream:
+                yield chunk
+
+        async def aclose(self):
+            try:
+                await self._stream.aclose()
+            finally:
+                self._release()
+
+    class CountingTransport(httpx.BaseTransport):
+        """Wraps a transport to keep PoolStats up to date."""
+        def __init__(self, transport, stats):
+            self._transport = transport
+            self.stats = stats
+
+        def handle_request(self, request):
+            self.stats.acquire()
+            try:
+                response = self._transport.handle_request(request)
+            except BaseException:
+                self.stats.release(error=True)
+                raise
+            response.stream = _CountedStream(response.stream, _once(self.stats.release))
+            return response
+
+        def close(self):
+            self._transport.close()
+
+    class AsyncCountingTransport(httpx.AsyncBaseTransport):
+        """Async counterpart of CountingTransport."""
+        def __init__(self, transport, stats):
+            self._transport = transport
+            self.stats = stats
+
+        async def handle_async_request(self, request):
+            self.stats.acquire()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except BaseException:
+                self.stats.release(error=True)
+                raise
+            response.stream = _AsyncCountedStream(response.stream, _once(self.stats.release))
+            return response
+
+        async def aclose(self):
+            await self._transport.aclose()
+
+    types = _transport_types[httpx.__name__] = (CountingTransport, AsyncCountingTransport)
+    return types
+
+
+class HTTPClientPool:
+    """
+    Hands out one shared httpx client per base URL (a sync and an async one), so
+    every provider, and every Agent using it, talks to an API over the same
+    connection pool instead of each opening and TLS-handshaking its own.
+
+    Clients are built from the HTTP library the requesting SDK accepts ("openai"
+    or "anthropic"), so each SDK's `http_client` type check passes. If it can't be
+    found, `client` / `async_client` return None and the SDK uses its own client.
+
+    Async clients are bound to the event loop that first uses them; use one loop
+    per process (as `ada batch` does) or a separate pool per loop.
+    """
+    def __init__(self, config: PoolConfig = None):
+        self.config = config or PoolConfig()
+        self._clients = {}
+        self._async_clients = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _key(self, base_url):
+        return (base_url or "").rstrip("/")
+
+    def _stats_for(self, key, kind):
+        stats = self._stats.get((key, kind))
+        if stats is None:
+            stats = self._stats[(key, kind)] = PoolStats(self.config.max_connections)
+        return stats
+
+    def client(self, base_url, sdk="openai"):
+        key = self._key(base_url)
+        httpx = _http_module(sdk)
+        if httpx is None:
+            return None
+        with self._lock:
+            client = self._clients.get((sdk, key))
+            if client is None:
+                counting, _ = _counting_transports(httpx)
+                transport = httpx.HTTPTransport(limits=self.config.limits(httpx), http2=self.config.http2)
+                client = self._clients[(sdk, key)] = httpx.Client(
+                    transport=counting(transport, self._stats_for(key, "sync")),
+                    timeout=self.config.timeout,
+                    follow_redirects=True
+                )
+            return client
+
+    def async_client(self, base_url, sdk="openai"):
+        key = self._key(base_url)
+        httpx = _http_module(sdk)
+        if httpx is None:
+            return None
+        with self._lock:
+            client = self._async_clients.get((sdk, key))
+            if client is None:
+                _, counting = _counting_transports(httpx)
+                transport = httpx.AsyncHTTPTransport(limits=self.config.limits(httpx), http2=self.config.http2)
+                client = self._async_clients[(sdk, key)] = httpx.AsyncClient(
+                    transport=counting(transport, self._stats_for(key, "async")),
+                    timeout=self.config.timeout,
+                    follow_redirects=True
+                )
+            return client
+
+    def metrics(self):
+        """Pool saturation per base URL: {base_url: {"sync": {...}, "async": {...}}}."""
+        with self._lock:
+            items = list(self._stats.items())
+        result = {}
+        for (key, kind), stats in items:
+            result.setdefault(key, {})[kind] = stats.snapshot()
+        return result
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            # Async clients need a running loop to close; their connections drop with the process
+            self._async_clients.clear()
+        for client in clients:
+            client.close()
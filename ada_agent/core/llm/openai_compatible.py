@@ -1,13 +1,29 @@
 from .base import LLMProvider
-from openai import OpenAI
-from typing import List, Dict, Any, Optional
+from .types import ChatMessage, ChatChoice, ChatResponse, ToolCall, FunctionCall, StreamEvent, Usage
+from openai import OpenAI, AsyncOpenAI
+import time
+from typing import List, Dict, Any, Optional, Iterator
 
 class OpenAICompatibleProvider(LLMProvider):
-    def __init__(self, api_key: str, base_url: str, model_name: str):
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
+    def __init__(self, api_key: str, base_url: str, model_name: str, http_pool=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        # Optional HTTPClientPool: share one connection pool per base URL with other providers
+        self.http_pool = http_pool
+        http_client = http_pool.client(base_url, "openai") if http_pool is not None else None
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
         self.model_name = model_name
+        # Created on first `achat` so sync-only users don't pay for a second client
+        self._async_client = None
 
-    def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            http_client = self.http_pool.async_client(self.base_url, "openai") if self.http_pool is not None else None
+            self._async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http_client)
+        return self._async_client
+
+    def _build_request(self, messages, tools, tool_choice):
         # OpenAI SDK handles the format natively
         kwargs = {
             "model": self.model_name,
@@ -16,5 +32,88 @@ class OpenAICompatibleProvider(LLMProvider):
         if tools:
             kwargs["tools"] = tools
             kwargs["tool_choice"] = tool_choice
-            
-        return self.client.chat.completions.create(**kwargs)
+        return kwargs
+
+    def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        start = time.perf_counter()
+        response = self.client.chat.completions.create(**self._build_request(messages, tools, tool_choice))
+        return self._convert_response(response, time.perf_counter() - start)
+
+    async def achat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        start = time.perf_counter()
+        response = await self.async_client.chat.completions.create(**self._build_request(messages, tools, tool_choice))
+        return self._convert_response(response, time.perf_counter() - start)
+
+    def _convert_usage(self, usage):
+        if usage is None:
+            return None
+        details = getattr(usage, "prompt_tokens_details", None)
+        return Usage(
+            input_tokens=usage.prompt_tokens or 0,
+            output_tokens=usage.completion_tokens or 0,
+            cached_tokens=getattr(details, "cached_tokens", None) or 0
+        )
+
+    def _convert_response(self, response, latency):
+        # Normalize the SDK object to the shared ChatResponse type
+        choice = response.choices[0]
+        message = choice.message
+        tool_calls = [
+            ToolCall(id=tc.id, function=FunctionCall(name=tc.function.name, arguments=tc.function.arguments))
+            for tc in message.tool_calls or []
+        ]
+        return ChatResponse(
+            choices=[ChatChoice(
+                message=ChatMessage(content=message.content, tool_calls=tool_calls or None),
+                finish_reason=choice.finish_reason
+            )],
+            usage=self._convert_usage(getattr(response, "usage", None)),
+            latency=latency,
+            model=getattr(response, "model", None) or self.model_name
+        )
+
+    def chat_stream(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Iterator[StreamEvent]:
+        # include_usage adds a final chunk, without choices, that carries the token counts
+        stream = self.client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **self._build_request(messages, tools, tool_choice))
+        
+        content = ""
+        tool_calls = []
+        usage = None
+        finish_reason = None
+        # Tool call deltas arrive keyed by index and in index order, so a call is
+        # complete as soon as the next index (or the end of the stream) shows up.
+        pending = None
+        
+        def finish(call):
+            tool_call = ToolCall(id=call["id"], function=FunctionCall(name=call["name"], arguments="".join(call["arguments"])))
+            tool_calls.append(tool_call)
+            return StreamEvent(type="tool_call", tool_call=tool_call)
+        
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = self._convert_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].finish_reason:
+                finish_reason = chunk.choices[0].finish_reason
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content += delta.content
+                yield StreamEvent(type="text", text=delta.content)
+            for tc in delta.tool_calls or []:
+                if pending is None or tc.index != pending["index"]:
+                    if pending is not None:
+                        yield finish(pending)
+                    pending = {"index": tc.index, "id": tc.id, "name": "", "arguments": []}
+                if tc.function:
+                    if tc.function.name:
+                        pending["name"] += tc.function.name
+                    if tc.function.arguments:
+                        pending["arguments"].append(tc.function.arguments)
+        if pending is not None:
+            yield finish(pending)
+        
+        yield StreamEvent(type="message", message=ChatMessage(
+            content=content or None,
+            tool_calls=tool_calls or None
+        ), usage=usage, finish_reason=finish_reason)
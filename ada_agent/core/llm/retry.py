@@ -0,0 +1,282 @@
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, Optional, Iterator
+from .base import LLMProvider
+from .types import StreamEvent
+from ..utils import estimate_message_tokens, estimate_tokens
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, server errors, overload (Anthropic 529)
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+# Exception class names of the SDKs' transient failures (matched by name, so no SDK import is needed)
+RETRYABLE_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "InternalServerError", "RateLimitError", "OverloadedError",
+    "ConnectError", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout", "ReadError", "RemoteProtocolError",
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "TooManyRequests",
+}
+
+
+def _status_code(exc):
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if not isinstance(status, int):
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def _retry_after(exc):
+    """Seconds the server asked us to wait (Retry-After / retry-after-ms headers), if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            # HTTP-date form
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+def classify_error(exc):
+    """Returns (retryable, retry_after_seconds) for an exception raised by a provider."""
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS, _retry_after(exc)
+    if isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True, None
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    return bool(names & RETRYABLE_ERRORS), _retry_after(exc)
+
+
+class TokenBucket:
+    """
+    Refills `rate_per_minute` units per minute up to `capacity` (default: one
+    minute's worth). `reserve` takes units right away, letting the balance go
+    negative, and returns how long the caller must wait before using them, so
+    waiters are served in order and never spin.
+    """
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount=1):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def adjust(self, amount):
+        """Gives back (positive) or takes more (negative) units, e.g. once the real token count is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class RateLimiter:
+    """Client-side limits on requests per minute and (estimated) tokens per minute."""
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def reserve(self, tokens):
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def settle(self, estimated, actual):
+        # Correct the token bucket once the provider reports what the request really cost
+        if self.tokens is not None and actual is not None:
+            self.tokens.adjust(estimated - actual)
+
+    def refund(self, estimated):
+        # A failed attempt generated nothing; its retry reserves the tokens again
+        if self.tokens is not None:
+            self.tokens.adjust(estimated)
+
+
+_shared_limiters = {}
+_shared_lock = threading.Lock()
+
+def shared_limiter(api_key, requests_per_minute=None, tokens_per_minute=None):
+    """
+    The RateLimiter for an API key, created on first use. Every RetryingProvider
+    (and so every session) using the same key draws from the same buckets, since
+    that is the granularity the provider enforces its limits at.
+    Raises ValueError if the key already has a limiter with different limits.
+    """
+    key = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+    with _shared_lock:
+        limiter = _shared_limiters.get(key)
+        if limiter is None:
+            limiter = _shared_limiters[key] = RateLimiter(requests_per_minute, tokens_per_minute)
+        elif (limiter.requests_per_minute, limiter.tokens_per_minute) != (requests_per_minute, tokens_per_minute):
+            raise ValueError(
+                f"This API key already has a shared rate limiter with requests_per_minute={limiter.requests_per_minute}, "
+                f"tokens_per_minute={limiter.tokens_per_minute}; pass the same limits or your own `limiter`"
+            )
+        return limiter
+
+
+class RetryingProvider(LLMProvider):
+    """
+    Wraps a provider with retries and client-side rate limiting.
+
+    Transient failures (rate limits, timeouts, connection errors, 5xx, overload)
+    are retried up to `max_retries` times with exponential backoff and full jitter,
+    or after the server's Retry-After when it sends one. Other errors are raised
+    at once. A streamed response is only retried if it fails before its first event.
+
+    With `requests_per_minute` / `tokens_per_minute`, requests wait for capacity
+    from a limiter shared by every provider using the same API key; pass `limiter`
+    to use your own instead. Token counts are estimated up front, corrected
+    from the response's usage and refunded when an attempt fails.
+
+    The OpenAI and Anthropic SDKs also retry on their own (twice by default).
+    """
+    def __init__(self, provider: LLMProvider, max_retries=4, base_delay=0.5, max_delay=30.0, max_retry_after=60.0,
+                 requests_per_minute=None, tokens_per_minute=None, limiter=None):
+        self.provider = provider
+        self.model_name = getattr(provider, "model_name", None)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Upper bound on a server-requested wait, so a bogus header can't stall a session
+        self.max_retry_after = max_retry_after
+        if limiter is None and (requests_per_minute or tokens_per_minute):
+            limiter = shared_limiter(getattr(provider, "api_key", None), requests_per_minute, tokens_per_minute)
+        self.limiter = limiter
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "backoff_s": 0.0, "throttled_s": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _estimate(self, messages, tools):
+        tokens = sum(estimate_message_tokens(m) for m in messages)
+        if tools:
+            # Schemas are re-sent with every request; a rough size is enough here
+            tokens += estimate_tokens(str(tools))
+        return tokens
+
+    def _throttle_delay(self, estimated):
+        if self.limiter is None:
+            return 0.0
+        wait = self.limiter.reserve(estimated)
+        if wait:
+            self._count("throttled_s", wait)
+        return wait
+
+    def _settle(self, estimated, response):
+        if self.limiter is None:
+            return
+        usage = getattr(response, "usage", None)
+        if usage is not None and hasattr(usage, "input_tokens"):
+            self.limiter.settle(estimated, usage.input_tokens + usage.output_tokens)
+
+    def _refund(self, estimated):
+        if self.limiter is not None:
+            self.limiter.refund(estimated)
+
+    def _backoff(self, exc, attempt):
+        """Seconds to wait before the next attempt, or None if `exc` should be raised."""
+        retryable, retry_after = classify_error(exc)
+        if not retryable or attempt >= self.max_retries:
+            self._count("failures")
+            return None
+        if retry_after is not None:
+            delay = min(retry_after, self.max_retry_after)
+        else:
+            # Full jitter: spreads retries from many sessions instead of having them collide again
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        self._count("retries")
+        self._count("backoff_s", delay)
+        return delay
+
+    def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        estimated = self._estimate(messages, tools)
+        self._count("requests")
+        attempt = 0
+        while True:
+            wait = self._throttle_delay(estimated)
+            if wait:
+                time.sleep(wait)
+            try:
+                response = self.provider.chat(messages, tools, tool_choice)
+            except Exception as e:
+                self._refund(estimated)
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+            self._settle(estimated, response)
+            return response
+
+    async def achat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        estimated = self._estimate(messages, tools)
+        self._count("requests")
+        attempt = 0
+        while True:
+            wait = self._throttle_delay(estimated)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                response = await self.provider.achat(messages, tools, tool_choice)
+            except Exception as e:
+                self._refund(estimated)
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            self._settle(estimated, response)
+            return response
+
+    def chat_stream(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Iterator[StreamEvent]:
+        estimated = self._estimate(messages, tools)
+        self._count("requests")
+        attempt = 0
+        while True:
+            wait = self._throttle_delay(estimated)
+            if wait:
+                time.sleep(wait)
+            started = False
+            try:
+                for event in self.provider.chat_stream(messages, tools, tool_choice):
+                    started = True
+                    if event.type == "message":
+                        self._settle(estimated, event)
+                    yield event
+                return
+            except Exception as e:
+                # Events already handed out can't be taken back
+                if not started:
+                    self._refund(estimated)
+                delay = None if started else self._backoff(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
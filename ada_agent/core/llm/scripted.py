@@ -0,0 +1,97 @@
+import json
+import threading
+from typing import List, Dict, Any, Optional
+from .base import LLMProvider
+from .types import FunctionCall, ToolCall, ChatMessage, ChatChoice, ChatResponse
+
+def text(content):
+    """A script step answering with plain text."""
+    return {"content": content}
+
+def tool_call(name, **arguments):
+    """A script step calling one tool. Pass several to `tool_calls` for a parallel turn."""
+    return {"tool_calls": [{"name": name, "arguments": arguments}]}
+
+def tool_calls(*steps):
+    """Merges several `tool_call(...)` steps into one assistant turn."""
+    return {"tool_calls": [c for step in steps for c in step["tool_calls"]]}
+
+def skill_discovery_flow(category, skill_name, answer):
+    """The three steps a model takes to use a skill: list the category, enable the skill, answer."""
+    return [
+        tool_call("list_skills", category=category),
+        tool_call("enable_skill", skill_name=skill_name),
+        text(answer),
+    ]
+
+
+class ScriptedProvider(LLMProvider):
+    """
+    Replays canned responses in order, without any network. Useful for tests,
+    demos and benchmarking the agent loop itself.
+
+    Each script step is one of:
+    - a str: a text reply.
+    - a dict with "content" and/or "tool_calls" ([{"name", "arguments"}]); see `text` / `tool_call`.
+    - a ChatMessage, returned as is.
+    - a callable(messages, tools) returning any of the above.
+
+    With `loop=True` the script starts over when it runs out; otherwise running
+    out raises IndexError. `record=True` keeps every request in `requests`.
+    """
+    def __init__(self, script, loop=False, record=False, model_name="scripted"):
+        self.script = list(script)
+        self.loop = loop
+        self.record = record
+        self.model_name = model_name
+        self.requests = []
+        self.calls = 0
+        self._position = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._position = 0
+            self.calls = 0
+            self.requests = []
+
+    def _next_step(self):
+        with self._lock:
+            if self._position >= len(self.script):
+                if not self.loop or not self.script:
+                    raise IndexError(f"ScriptedProvider ran out of responses after {self.calls} calls")
+                self._position = 0
+            step = self.script[self._position]
+            self._position += 1
+            self.calls += 1
+            return step
+
+    def _to_message(self, step, messages, tools):
+        if callable(step):
+            step = step(messages, tools)
+        if isinstance(step, ChatMessage):
+            return step
+        if isinstance(step, str):
+            return ChatMessage(content=step, tool_calls=None)
+
+        calls = []
+        for i, call in enumerate(step.get("tool_calls") or []):
+            arguments = call.get("arguments", {})
+            if not isinstance(arguments, str):
+                arguments = json.dumps(arguments)
+            calls.append(ToolCall(
+                id=call.get("id") or f"call_{self.calls}_{i}",
+                function=FunctionCall(name=call["name"], arguments=arguments)
+            ))
+        return ChatMessage(content=step.get("content"), tool_calls=calls or None)
+
+    def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        if self.record:
+            self.requests.append({"messages": list(messages), "tools": tools})
+        message = self._to_message(self._next_step(), messages, tools)
+        finish_reason = "tool_calls" if message.tool_calls else "stop"
+        return ChatResponse(choices=[ChatChoice(message=message, finish_reason=finish_reason)], latency=0.0, model=self.model_name)
+
+    async def achat(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, tool_choice: Any = "auto") -> Any:
+        # Nothing blocks here, so skip the worker thread of the default implementation
+        return self.chat(messages, tools, tool_choice)
@@ -0,0 +1,135 @@
+from typing import List, Optional, Any, Dict
+from dataclasses import dataclass, field
+
+# Provider-agnostic objects shaped like OpenAI's response structure
+# (choices[0].message.content / .tool_calls), so the Agent can stay provider-blind.
+# Every provider returns these; they are slotted since one is built per request.
+@dataclass(slots=True)
+class FunctionCall:
+    name: str
+    arguments: str
+
+@dataclass(slots=True)
+class ToolCall:
+    id: str
+    function: FunctionCall
+    type: str = "function"
+
+@dataclass(slots=True)
+class ChatMessage:
+    content: Optional[str]
+    tool_calls: Optional[List[ToolCall]]
+    def model_dump(self):
+        d = {"role": "assistant", "content": self.content}
+        if self.tool_calls:
+            d["tool_calls"] = [
+                {
+                    "id": tc.id,
+                    "type": "function",
+                    "function": {
+                        "name": tc.function.name,
+                        "arguments": tc.function.arguments
+                    }
+                } for tc in self.tool_calls
+            ]
+        return d
+
+@dataclass(slots=True)
+class Usage:
+    """
+    Token counts of one request, the same way for every provider:
+    - input_tokens: the whole prompt, including any part served from the prompt cache.
+    - output_tokens: generated tokens.
+    - cached_tokens: prompt tokens read from the provider's cache.
+    - cache_write_tokens: prompt tokens written to the cache (Anthropic only).
+    """
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0
+
+    def to_dict(self):
+        return {
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**{k: d.get(k) or 0 for k in ("input_tokens", "output_tokens", "cached_tokens", "cache_write_tokens")})
+
+@dataclass(slots=True)
+class ChatChoice:
+    message: ChatMessage
+    # "stop", "tool_calls", "length", "content_filter" or the provider's own reason
+    finish_reason: Optional[str] = None
+
+@dataclass(slots=True)
+class ChatResponse:
+    """
+    The response every provider returns: `choices[0].message` as in OpenAI's SDK, plus
+    token `usage`, wall-clock `latency` of the request in seconds and the `model`.
+    """
+    choices: List[ChatChoice]
+    usage: Optional[Usage] = None
+    latency: Optional[float] = None
+    model: Optional[str] = None
+
+    @property
+    def finish_reason(self):
+        return self.choices[0].finish_reason if self.choices else None
+
+@dataclass(slots=True)
+class SessionUsage:
+    """Running totals over the LLM requests of one Agent session."""
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0
+    latency: float = 0.0
+    finish_reasons: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, usage=None, latency=None, finish_reason=None):
+        self.requests += 1
+        if usage is not None:
+            self.input_tokens += usage.input_tokens
+            self.output_tokens += usage.output_tokens
+            self.cached_tokens += usage.cached_tokens
+            self.cache_write_tokens += usage.cache_write_tokens
+        if latency is not None:
+            self.latency += latency
+        if finish_reason is not None:
+            self.finish_reasons[finish_reason] = self.finish_reasons.get(finish_reason, 0) + 1
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "latency_s": round(self.latency, 3),
+            "finish_reasons": dict(self.finish_reasons),
+        }
+
+@dataclass
+class StreamEvent:
+    """
+    One item of a streamed response.
+
+    type is one of:
+    - "text": a content delta in `text`.
+    - "tool_call": a tool call whose arguments are complete, in `tool_call`.
+    - "message": the fully assembled assistant message, in `message` (always last).
+    The Agent adds "tool_result" (`tool_call` + `text`) and "done" (final `text`).
+    "message" events also carry the request's `usage` and `finish_reason` when the provider reports them.
+    """
+    type: str
+    text: Optional[str] = None
+    tool_call: Any = None
+    message: Any = None
+    usage: Any = None
+    finish_reason: Optional[str] = None
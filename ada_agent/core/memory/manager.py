@@ -2,7 +2,12 @@ import os
 from .storage import MemoryStorage
 
 class MemoryManager:
-    def __init__(self, storage_path: str = None):
+    def __init__(self, storage_path: str = None, persistent: bool = True, initial: dict = None):
+        # persistent=False keeps memories in this object only (e.g. one batch conversation)
+        if not persistent:
+            self.storage = MemoryStorage(None)
+            self.storage.data.update(initial or {})
+            return
         if storage_path is None:
             # Use user home directory
             home = os.path.expanduser("~")
@@ -1,16 +1,20 @@
 
 import json
 import os
+import threading
 from typing import Dict, Any, List
 
 class MemoryStorage:
+    # With filepath=None the data lives in memory only and is never written out
     def __init__(self, filepath: str = "memory.json"):
         self.filepath = filepath
         self.data: Dict[str, Any] = {}
+        # Guards `data` and the file: tool calls from one turn may run in parallel
+        self._lock = threading.RLock()
         self._load()
 
     def _load(self):
-        if os.path.exists(self.filepath):
+        if self.filepath and os.path.exists(self.filepath):
             try:
                 with open(self.filepath, 'r', encoding='utf-8') as f:
                     self.data = json.load(f)
@@ -21,6 +25,12 @@ class MemoryStorage:
             self.data = {}
 
     def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        if not self.filepath:
+            return
         try:
             with open(self.filepath, 'w', encoding='utf-8') as f:
                 json.dump(self.data, f, indent=2, ensure_ascii=False)
@@ -28,16 +38,19 @@ class MemoryStorage:
             print(f"Error saving memory to {self.filepath}: {e}")
 
     def get(self, key: str) -> Any:
-        return self.data.get(key)
+        with self._lock:
+            return self.data.get(key)
 
     def set(self, key: str, value: Any):
-        self.data[key] = value
-        self.save()
+        with self._lock:
+            self.data[key] = value
+            self._save()
 
     def delete(self, key: str):
-        if key in self.data:
-            del self.data[key]
-            self.save()
+        with self._lock:
+            if key in self.data:
+                del self.data[key]
+                self._save()
 
     def search(self, query: str) -> List[tuple]:
         """
@@ -45,7 +58,7 @@ class MemoryStorage:
         """
         query = query.lower()
         results = []
-        for k, v in self.data.items():
+        for k, v in self.list_all().items():
             # Convert value to string for searching
             str_val = str(v).lower()
             if query in k.lower() or query in str_val:
@@ -53,4 +66,6 @@ class MemoryStorage:
         return results
 
     def list_all(self) -> Dict[str, Any]:
-        return self.data
+        # Snapshot, so callers can iterate while another thread writes
+        with self._lock:
+            return dict(self.data)
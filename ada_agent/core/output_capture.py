@@ -0,0 +1,160 @@
+import os
+import time
+import atexit
+import tempfile
+import threading
+
+# Bytes of tool output kept in the conversation; the rest is spilled to a file
+OUTPUT_BUDGET = int(os.getenv("ADA_TOOL_OUTPUT_BYTES", "32768"))
+SPILL_DIR = os.path.join(tempfile.gettempdir(), "ada-output")
+# Spill files left behind by processes that didn't exit cleanly are removed after this many seconds
+SPILL_MAX_AGE = 24 * 3600
+
+_spill_files = set()
+_spill_lock = threading.Lock()
+_spill_dir_pruned = False
+
+
+def track_spill_file(path):
+    """Registers a spill file to be deleted when this process exits."""
+    global _spill_dir_pruned
+    with _spill_lock:
+        if not _spill_files and not _spill_dir_pruned:
+            atexit.register(remove_spill_files)
+        _spill_files.add(path)
+        prune = not _spill_dir_pruned
+        _spill_dir_pruned = True
+    if prune:
+        _prune_spill_dir()
+
+
+def remove_spill_files():
+    """Deletes every spill file this process has written."""
+    with _spill_lock:
+        paths = list(_spill_files)
+        _spill_files.clear()
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _prune_spill_dir():
+    # Once per process: clear out stale files from earlier runs
+    cutoff = time.time() - SPILL_MAX_AGE
+    try:
+        entries = list(os.scandir(SPILL_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _decode(data):
+    # Same newline handling as subprocess's text mode
+    return data.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+
+class OutputCapture:
+    """
+    Collects a stream of bytes in bounded memory.
+
+    Up to `budget` bytes are kept as they are. Beyond that only the first half
+    (head) and the last half (tail) are kept, and everything is written to a spill
+    file under SPILL_DIR so the model can page through it with `read_output`.
+    Spill files are deleted when the process exits.
+    """
+    def __init__(self, budget=None, label="output"):
+        self.budget = OUTPUT_BUDGET if budget is None else budget
+        self.head_bytes = self.budget // 2
+        self.tail_bytes = self.budget - self.head_bytes
+        self.label = label
+        self.total = 0
+        self._buffer = bytearray()
+        self._head = None
+        self._tail = None
+        self._spill = None
+        self.spill_path = None
+
+    def write(self, data):
+        if not data:
+            return
+        self.total += len(data)
+        if self._spill is None:
+            self._buffer += data
+            if len(self._buffer) <= self.budget:
+                return
+            # Over budget: from here on the full stream goes to disk
+            os.makedirs(SPILL_DIR, exist_ok=True)
+            self._spill = tempfile.NamedTemporaryFile(dir=SPILL_DIR, prefix=f"{self.label}-", suffix=".txt", delete=False)
+            self.spill_path = self._spill.name
+            track_spill_file(self.spill_path)
+            self._spill.write(self._buffer)
+            self._head = bytes(self._buffer[:self.head_bytes])
+            self._tail = bytearray(self._buffer[-self.tail_bytes:]) if self.tail_bytes else bytearray()
+            self._buffer = None
+            return
+        self._spill.write(data)
+        if self.tail_bytes:
+            self._tail += data
+            del self._tail[:-self.tail_bytes]
+
+    @property
+    def truncated(self):
+        return self._spill is not None
+
+    def close(self):
+        if self._spill is not None and not self._spill.closed:
+            self._spill.close()
+
+    def text(self):
+        """The captured output, or its head and tail around a note on where the rest is."""
+        self.close()
+        if not self.truncated:
+            return _decode(bytes(self._buffer))
+        omitted = self.total - len(self._head) - len(self._tail)
+        note = truncation_note(self.label, self.total, omitted, self.spill_path, len(self._head))
+        return _decode(self._head) + note + _decode(bytes(self._tail))
+
+
+def truncation_note(label, total, omitted, path, offset):
+    """The marker put between the head and the tail of a truncated output."""
+    return (
+        f"\n\n... [{omitted} bytes omitted: {label} was {total} bytes. "
+        f"Full {label} saved to {path}; read it with "
+        f"read_output(path=\"{path}\", offset={offset})] ...\n\n"
+    )
+
+
+def capture_bytes(data, budget=None, label="output"):
+    """Bounds an already collected output the same way OutputCapture does."""
+    capture = OutputCapture(budget, label)
+    capture.write(data)
+    return capture.text()
+
+
+def read_output(path: str, offset: int = 0, length: int = None) -> str:
+    """
+    Reads `length` bytes (default: the output budget) of a saved output or any
+    other file, starting at byte `offset`, and says where the next page starts.
+    """
+    length = length or OUTPUT_BUDGET
+    offset = offset or 0
+    try:
+        size = os.path.getsize(path)
+        if offset < 0 or offset > size or length < 0:
+            return f"Read Error: offset must be between 0 and the file size ({size}) and length >= 0."
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+    except Exception as e:
+        return f"Read Error: {str(e)}"
+    end = offset + len(data)
+    footer = f"\n\n[bytes {offset}-{end} of {size}"
+    footer += f"; next offset: {end}]" if end < size else "; end of file]"
+    return _decode(data) + footer
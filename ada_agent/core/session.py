@@ -0,0 +1,117 @@
+import os
+import re
+import gzip
+import json
+import threading
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+class SessionLog:
+    """
+    Append-only writer for one session. Every record is one JSON line, written
+    and flushed as it happens, so a checkpoint costs O(new records), never a
+    rewrite of the whole conversation.
+    """
+    def __init__(self, path, compress=False):
+        self.path = path
+        self._lock = threading.Lock()
+        # Appending to a gzip file starts a new gzip member; readers handle multi-member files
+        if compress:
+            self._file = gzip.open(path, "at", encoding="utf-8")
+        else:
+            self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class SessionStore:
+    """
+    Stores conversations as per-session JSONL logs under `directory`.
+
+    Records (the "op" field):
+    - "msg": a message appended to the history.
+    - "rewrite": the history was rewritten in place (discovery folding, compaction,
+      a cancelled turn). "drop" lists removed positions, "insert" [position, message] pairs.
+    - "skills": the full set of enabled skill names.
+    """
+    def __init__(self, directory, compress=False):
+        self.directory = directory
+        self.compress = compress
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, session_id):
+        if not _SESSION_ID.match(session_id):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        ext = ".jsonl.gz" if self.compress else ".jsonl"
+        return os.path.join(self.directory, session_id + ext)
+
+    def exists(self, session_id):
+        return os.path.exists(self.path(session_id))
+
+    def open(self, session_id):
+        return SessionLog(self.path(session_id), compress=self.compress)
+
+    def _read_records(self, session_id):
+        """Returns (records, damaged). A crash mid-write leaves a torn tail, which is dropped."""
+        records = []
+        path = self.path(session_id)
+        opener = gzip.open if self.compress else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        return records, True
+            except EOFError:
+                # gzip member cut short; everything flushed before it is intact
+                return records, True
+        return records, False
+
+    def load(self, session_id):
+        """
+        Replays a session log. Returns (messages, loaded_skill_names).
+        A log with a torn tail is compacted into a fresh one, so records appended
+        after resuming don't end up behind the damage.
+        """
+        records, damaged = self._read_records(session_id)
+        messages, skills = self._replay(records)
+        if damaged:
+            self.rewrite(session_id, messages, skills)
+        return messages, skills
+
+    def rewrite(self, session_id, messages, skills):
+        """Atomically replaces a session's log with a minimal one for the given state."""
+        path = self.path(session_id)
+        tmp_path = path + ".tmp"
+        opener = gzip.open if self.compress else open
+        with opener(tmp_path, "wt", encoding="utf-8") as f:
+            for msg in messages:
+                f.write(json.dumps({"op": "msg", "m": msg}, ensure_ascii=False) + "\n")
+            f.write(json.dumps({"op": "skills", "names": sorted(skills)}) + "\n")
+        os.replace(tmp_path, path)
+
+    def _replay(self, records):
+        messages = []
+        skills = set()
+        for record in records:
+            op = record.get("op")
+            if op == "msg":
+                messages.append(record["m"])
+            elif op == "rewrite":
+                drop = set(record.get("drop", []))
+                if drop:
+                    messages = [m for i, m in enumerate(messages) if i not in drop]
+                for position, msg in record.get("insert", []):
+                    messages.insert(position, msg)
+            elif op == "skills":
+                skills = set(record.get("names", []))
+        return messages, skills
@@ -0,0 +1,319 @@
+import os
+import re
+import time
+import uuid
+import shlex
+import shutil
+import signal
+import tempfile
+import asyncio
+import selectors
+import threading
+import subprocess
+from .tools import COMMAND_TIMEOUT, _command_env, _format_command_result
+from .output_capture import OutputCapture
+
+_ENV_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class ShellWorkerError(RuntimeError):
+    """The worker shell died while running a command."""
+
+
+class ShellWorker:
+    """
+    One long-lived shell process that runs commands sent over its stdin.
+
+    Each command runs in a subshell (`cd`, `exit` and exports don't leak into the
+    next one) with stdin from /dev/null, and writes its stdout and stderr to a pair
+    of FIFOs of its own. The shell reports the exit code on its stdout after a
+    random marker. As with a fresh process, a run only ends once every writer of
+    the FIFOs, background children included, has closed them, so no command's
+    output can spill into the next one. A command that times out gets its whole
+    process group killed; the worker respawns on next use.
+    """
+    def __init__(self, shell="/bin/sh", env=None):
+        self.shell = shell
+        self.env = env
+        self.proc = None
+        self.runs = 0
+        self.spawns = 0
+        self._dir = None
+        self._kill_lock = threading.Lock()
+
+    def _spawn(self):
+        # Its own session, so a timeout can kill the shell and everything it started
+        self.proc = subprocess.Popen(
+            [self.shell],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=self.env,
+            start_new_session=True
+        )
+        if self._dir is None:
+            self._dir = tempfile.mkdtemp(prefix="ada-shell-")
+        self.spawns += 1
+
+    @property
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def interrupt(self):
+        """
+        Kills the running command (and the shell) from another thread. The pipes are
+        left to the thread in `run`, which sees them close and cleans up.
+        """
+        proc = self.proc
+        if proc is not None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    def kill(self):
+        with self._kill_lock:
+            proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        for stream in (proc.stdin, proc.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+        proc.wait()
+
+    def close(self):
+        self.kill()
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+    def _script(self, command, marker, cwd, env, out_path, err_path):
+        lines = ["("]
+        if cwd:
+            lines.append(f"cd {shlex.quote(cwd)} || exit 1")
+        for name, value in (env or {}).items():
+            lines.append(f"export {name}={shlex.quote(str(value))}")
+        # eval keeps a malformed command from breaking the framing around it
+        lines.append(f"eval {shlex.quote(command)}")
+        lines.append(f") </dev/null >{shlex.quote(out_path)} 2>{shlex.quote(err_path)}")
+        lines.append(f"printf '{marker}%d\\n' $?")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def run(self, command, cwd=None, env=None, timeout=COMMAND_TIMEOUT):
+        """
+        Runs `command` and returns (returncode, stdout, stderr).
+        Raises TimeoutError after `timeout` seconds and ShellWorkerError if the shell dies.
+        """
+        if not self.alive:
+            self._spawn()
+        proc = self.proc
+        self.runs += 1
+        marker = f"__ADA_DONE_{uuid.uuid4().hex}__"
+        paths = [os.path.join(self._dir, f"{marker}.{name}") for name in ("out", "err")]
+        readers, holds = [], []
+        try:
+            for path in paths:
+                os.mkfifo(path)
+                readers.append(os.open(path, os.O_RDONLY | os.O_NONBLOCK))
+                # Our own write end keeps the FIFO from reading as closed before the
+                # command has opened it; it is dropped once the shell reports the exit code
+                holds.append(os.open(path, os.O_WRONLY | os.O_NONBLOCK))
+            proc.stdin.write(self._script(command, marker, cwd, env, *paths))
+            proc.stdin.flush()
+            return self._collect(command, marker.encode("ascii"), readers, holds, timeout)
+        except TimeoutError:
+            # An OSError subclass, but not a dead shell
+            raise
+        except (OSError, ValueError) as e:
+            self.kill()
+            raise ShellWorkerError(f"shell worker exited: {e}")
+        finally:
+            for fd in readers + holds:
+                os.close(fd)
+            for path in paths:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def _collect(self, command, marker, readers, holds, timeout):
+        out_fd, err_fd = readers
+        status_fd = self.proc.stdout.fileno()
+        stdout, stderr = OutputCapture(label="stdout"), OutputCapture(label="stderr")
+        captures = {out_fd: stdout, err_fd: stderr}
+        status = bytearray()
+        returncode = None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            with selectors.DefaultSelector() as selector:
+                for fd in (status_fd, out_fd, err_fd):
+                    selector.register(fd, selectors.EVENT_READ)
+                while returncode is None or captures:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.kill()
+                        raise TimeoutError(f"Command '{command}' timed out after {timeout} seconds")
+                    for key, _ in selector.select(remaining):
+                        try:
+                            chunk = os.read(key.fd, 65536)
+                        except BlockingIOError:
+                            continue
+                        if key.fd == status_fd:
+                            if not chunk:
+                                self.kill()
+                                raise ShellWorkerError("shell worker exited while running the command")
+                            status += chunk
+                            if status.startswith(marker) and status.endswith(b"\n"):
+                                returncode = int(status[len(marker):])
+                                selector.unregister(status_fd)
+                                # From now on only the command's own leftovers hold the FIFOs open
+                                for fd in holds:
+                                    os.close(fd)
+                                holds.clear()
+                        elif chunk:
+                            captures[key.fd].write(chunk)
+                        else:
+                            # Every writer is gone: this stream is complete
+                            selector.unregister(key.fd)
+                            del captures[key.fd]
+        finally:
+            stdout.close()
+            stderr.close()
+        return returncode, stdout.text(), stderr.text()
+
+
+class ShellPool:
+    """
+    Up to `size` pre-spawned ShellWorkers shared by any number of sessions, so a
+    command costs a write to a running shell instead of starting /bin/sh (and
+    copying the environment) from Python every time.
+
+    The environment is computed once for the pool. POSIX only.
+    """
+    def __init__(self, size=4, shell="/bin/sh", env=None, prewarm=False):
+        if os.name == "nt":
+            raise OSError("ShellPool needs a POSIX shell")
+        self.size = size
+        self.shell = shell
+        self.env = env if env is not None else _command_env()
+        self._idle = []
+        self._workers = 0
+        self._cond = threading.Condition()
+        self.stats = {"runs": 0, "timeouts": 0, "crashes": 0}
+        if prewarm:
+            self.warm()
+
+    def warm(self):
+        """Starts every worker now rather than on first use."""
+        workers = []
+        while True:
+            with self._cond:
+                if self._workers >= self.size:
+                    break
+                self._workers += 1
+            worker = ShellWorker(self.shell, self.env)
+            worker._spawn()
+            workers.append(worker)
+        for worker in workers:
+            self.release(worker)
+
+    def acquire(self):
+        with self._cond:
+            while not self._idle and self._workers >= self.size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._workers += 1
+        return ShellWorker(self.shell, self.env)
+
+    def release(self, worker):
+        with self._cond:
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def _count(self, key):
+        with self._cond:
+            self.stats[key] += 1
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._workers -= len(idle)
+        for worker in idle:
+            worker.close()
+
+
+class ShellSession:
+    """
+    One Agent's view of a ShellPool: commands run in its own working directory
+    with its own extra environment variables, on whichever worker is free.
+
+    `run_command` / `arun_command` are drop-in replacements for the tools of the
+    same name (see `Agent(shell=...)`).
+    """
+    def __init__(self, pool: ShellPool = None, cwd=None, env=None, timeout=COMMAND_TIMEOUT):
+        self.pool = pool or default_shell_pool()
+        self.cwd = os.path.abspath(cwd) if cwd else None
+        self.env = dict(env or {})
+        for name in self.env:
+            if not _ENV_NAME.match(name):
+                raise ValueError(f"Invalid environment variable name: {name!r}")
+        self.timeout = timeout
+
+    def run_command(self, command: str, timeout: int = None) -> str:
+        return self._run_command(command, timeout)
+
+    async def arun_command(self, command: str, timeout: int = None) -> str:
+        """
+        Async counterpart of `run_command`. If the awaiting task is cancelled, the
+        worker running the command is killed (it respawns on next use).
+        """
+        state = {}
+        try:
+            return await asyncio.to_thread(self._run_command, command, timeout, state)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            worker = state.get("worker")
+            if worker is not None:
+                worker.interrupt()
+            raise
+
+    def _run_command(self, command, timeout=None, state=None):
+        worker = self.pool.acquire()
+        try:
+            if state is not None:
+                # Publish the worker before checking, so a concurrent cancel either sees it or is seen
+                state["worker"] = worker
+                if state.get("cancelled"):
+                    return "Execution Error: cancelled"
+            self.pool._count("runs")
+            returncode, stdout, stderr = worker.run(command, self.cwd, self.env, timeout or self.timeout)
+        except TimeoutError as e:
+            self.pool._count("timeouts")
+            return f"Execution Error: {e}"
+        except ShellWorkerError as e:
+            self.pool._count("crashes")
+            return f"Execution Error: {e}"
+        except Exception as e:
+            return f"Execution Error: {str(e)}"
+        finally:
+            self.pool.release(worker)
+        return _format_command_result(returncode, stdout, stderr)
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+def default_shell_pool():
+    """The process-wide ShellPool, created on first use (ADA_SHELL_WORKERS workers, default 4)."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ShellPool(size=int(os.getenv("ADA_SHELL_WORKERS", "4")))
+        return _default_pool
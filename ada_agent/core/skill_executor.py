@@ -0,0 +1,324 @@
+import os
+import sys
+import json
+import time
+import shlex
+import asyncio
+import selectors
+import threading
+import subprocess
+from .tools import COMMAND_TIMEOUT, _format_command_result
+from .output_capture import OUTPUT_BUDGET, SPILL_DIR, truncation_note, track_spill_file
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "skill_worker.py")
+
+# Characters that need a real shell when they appear outside quotes (pipes, redirects,
+# expansions, globs, ...); inside double quotes only expansions and escapes do
+_UNQUOTED_META = set("|&;<>()$`\\*?[]{}~#!\n")
+_DOUBLE_QUOTED_META = set("$`\\")
+
+
+def _is_simple_command(command):
+    """True if `command` is plain words and quotes, i.e. `shlex.split` gives exactly what sh would."""
+    quote = None
+    for ch in command:
+        if quote == "'":
+            if ch == "'":
+                quote = None
+        elif quote == '"':
+            if ch == '"':
+                quote = None
+            elif ch in _DOUBLE_QUOTED_META:
+                return False
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch in _UNQUOTED_META:
+            return False
+    return quote is None
+
+
+def _output_text(output, label):
+    # The worker answers over-budget output as head, tail and the file holding all of it
+    if isinstance(output, str):
+        return output
+    track_spill_file(output["path"])
+    omitted = output["total"] - output["head_bytes"] - output["tail_bytes"]
+    note = truncation_note(label, output["total"], omitted, output["path"], output["head_bytes"])
+    return output["head"] + note + output["tail"]
+
+
+def _is_python(executable):
+    name = os.path.basename(executable)
+    if name in ("python", "python3") or executable == sys.executable:
+        return True
+    return name.startswith("python3.") and name[len("python3."):].isdigit()
+
+
+class PythonWorker:
+    """One pre-started worker interpreter (skill_worker.py) and its pipes."""
+    def __init__(self, preload=None):
+        args = [sys.executable, WORKER_SCRIPT]
+        if preload is not None:
+            args.append(json.dumps(list(preload)))
+        self.proc = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.runs = 0
+        self.base_rss_kb = None
+        self.rss_kb = None
+        # Wait for the preloads so the first run doesn't pay for them
+        self._read_response(None)
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None
+
+    def kill(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        for stream in (self.proc.stdin, self.proc.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def _read_response(self, timeout):
+        fd = self.proc.stdout.fileno()
+        line = bytearray()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while not line.endswith(b"\n"):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError()
+                if not selector.select(remaining):
+                    continue
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise EOFError("Python worker exited")
+                line += chunk
+        return json.loads(line)
+
+    def run(self, script, argv, cwd=None, env=None, timeout=COMMAND_TIMEOUT):
+        """Returns (returncode, stdout, stderr); raises TimeoutError or EOFError."""
+        request = {
+            "script": script, "argv": argv, "cwd": cwd, "env": env or {},
+            "budget": OUTPUT_BUDGET, "spill_dir": SPILL_DIR,
+        }
+        self.proc.stdin.write(json.dumps(request).encode("utf-8") + b"\n")
+        self.proc.stdin.flush()
+        response = self._read_response(timeout)
+        self.runs += 1
+        self.rss_kb = response["rss_kb"]
+        if self.base_rss_kb is None:
+            self.base_rss_kb = self.rss_kb
+        return response["code"], _output_text(response["stdout"], "stdout"), _output_text(response["stderr"], "stderr")
+
+
+class PythonWorkerPool:
+    """
+    Up to `size` worker interpreters with `preload` modules already imported, which
+    run Python scripts in-process (runpy) instead of starting a new interpreter.
+
+    Scripts run one at a time per worker, with argv, cwd, environment, stdin
+    (/dev/null), stdout, stderr and exit status handled as for `python script.py`.
+    Module state can still leak from one run to the next, so a worker is replaced
+    after `max_runs` runs or once its peak RSS has grown by `max_rss_growth_mb`.
+    A run that times out kills its worker.
+    """
+    def __init__(self, size=2, max_runs=200, max_rss_growth_mb=100, preload=None, prewarm=False):
+        self.size = size
+        self.max_runs = max_runs
+        self.max_rss_growth_mb = max_rss_growth_mb
+        self.preload = preload
+        self._idle = []
+        self._workers = 0
+        self._cond = threading.Condition()
+        self.stats = {"runs": 0, "spawns": 0, "recycled": 0, "timeouts": 0, "crashes": 0}
+        if prewarm:
+            self.warm()
+
+    def _spawn(self):
+        worker = PythonWorker(self.preload)
+        self._count("spawns")
+        return worker
+
+    def warm(self):
+        """Starts every worker now rather than on first use."""
+        workers = []
+        while True:
+            with self._cond:
+                if self._workers >= self.size:
+                    break
+                self._workers += 1
+            try:
+                workers.append(self._spawn())
+            except Exception:
+                self._discard(None)
+                raise
+        for worker in workers:
+            self.release(worker)
+
+    def acquire(self):
+        with self._cond:
+            while not self._idle and self._workers >= self.size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._workers += 1
+        try:
+            return self._spawn()
+        except Exception:
+            self._discard(None)
+            raise
+
+    def _discard(self, worker):
+        if worker is not None:
+            worker.kill()
+        with self._cond:
+            self._workers -= 1
+            self._cond.notify()
+
+    def _replace(self):
+        with self._cond:
+            if self._workers >= self.size:
+                return
+            self._workers += 1
+        try:
+            worker = self._spawn()
+        except Exception:
+            self._discard(None)
+            return
+        self.release(worker)
+
+    def _worn_out(self, worker):
+        if worker.runs >= self.max_runs:
+            return True
+        if self.max_rss_growth_mb and worker.base_rss_kb is not None:
+            # ru_maxrss is in KB on Linux (bytes on macOS, where this recycles later)
+            return worker.rss_kb - worker.base_rss_kb > self.max_rss_growth_mb * 1024
+        return False
+
+    def release(self, worker):
+        if not worker.alive or self._worn_out(worker):
+            if worker.alive:
+                self._count("recycled")
+            self._discard(worker)
+            # Start the replacement now, off the caller's thread, so the pool stays warm
+            threading.Thread(target=self._replace, daemon=True).start()
+            return
+        with self._cond:
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def _count(self, key):
+        with self._cond:
+            self.stats[key] += 1
+
+    def run(self, script, argv, cwd=None, env=None, timeout=COMMAND_TIMEOUT, state=None):
+        """Runs `script` on a free worker; returns (returncode, stdout, stderr)."""
+        worker = self.acquire()
+        try:
+            if state is not None:
+                # Publish the worker before checking, so a concurrent cancel either sees it or is seen
+                state["worker"] = worker
+                if state.get("cancelled"):
+                    raise asyncio.CancelledError()
+            self._count("runs")
+            return worker.run(script, argv, cwd, env, timeout)
+        except TimeoutError:
+            self._count("timeouts")
+            worker.kill()
+            raise TimeoutError(f"Command '{script}' timed out after {timeout} seconds")
+        except (EOFError, OSError, ValueError):
+            self._count("crashes")
+            worker.kill()
+            raise
+        finally:
+            self.release(worker)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._workers -= len(idle)
+        for worker in idle:
+            worker.kill()
+
+
+class SkillExecutor:
+    """
+    Routes `run_command` calls that just run a Python skill script
+    (`python <skills_dir>/.../script.py args...`, no pipes, redirects or expansions)
+    to a PythonWorkerPool, and everything else to the regular run_command.
+
+    `wrap` builds the replacement run_command / arun_command (see `Agent(skill_workers=...)`).
+    """
+    def __init__(self, pool: PythonWorkerPool = None, skills_dirs=(), timeout=COMMAND_TIMEOUT):
+        self.pool = pool or default_python_pool()
+        self.skills_dirs = [os.path.realpath(d) for d in skills_dirs]
+        self.timeout = timeout
+
+    def match(self, command, cwd=None):
+        """Returns (script_path, argv) if `command` runs a skill script, else None."""
+        if not _is_simple_command(command):
+            return None
+        try:
+            words = shlex.split(command)
+        except ValueError:
+            return None
+        if len(words) < 2 or not _is_python(words[0]) or not words[1].endswith(".py"):
+            return None
+        script = os.path.realpath(os.path.join(cwd or os.getcwd(), words[1]))
+        if not os.path.isfile(script):
+            return None
+        if not any(script.startswith(d + os.sep) for d in self.skills_dirs):
+            return None
+        return script, words[2:]
+
+    def run_command(self, command, timeout=None, cwd=None, env=None, state=None):
+        """Runs a matching command on the pool; returns None for any other command."""
+        match = self.match(command, cwd)
+        if match is None:
+            return None
+        script, argv = match
+        try:
+            returncode, stdout, stderr = self.pool.run(script, argv, cwd, env, timeout or self.timeout, state)
+        except asyncio.CancelledError:
+            return "Execution Error: cancelled"
+        except Exception as e:
+            return f"Execution Error: {str(e)}"
+        return _format_command_result(returncode, stdout, stderr)
+
+    def wrap(self, run_command, arun_command, cwd=None, env=None):
+        """Returns (run_command, arun_command) that use the pool for skill scripts and fall back otherwise."""
+        def run(command: str, timeout: int = None) -> str:
+            result = self.run_command(command, timeout, cwd, env)
+            return run_command(command, timeout) if result is None else result
+
+        async def arun(command: str, timeout: int = None) -> str:
+            if self.match(command, cwd) is None:
+                return await arun_command(command, timeout)
+            state = {}
+            try:
+                return await asyncio.to_thread(self.run_command, command, timeout, cwd, env, state)
+            except asyncio.CancelledError:
+                # Kill the worker so an abandoned turn doesn't keep a script running
+                state["cancelled"] = True
+                worker = state.get("worker")
+                if worker is not None and worker.alive:
+                    worker.proc.kill()
+                raise
+
+        return run, arun
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+def default_python_pool():
+    """The process-wide PythonWorkerPool, created on first use (ADA_PYTHON_WORKERS workers, default 2)."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = PythonWorkerPool(size=int(os.getenv("ADA_PYTHON_WORKERS", "2")))
+        return _default_pool
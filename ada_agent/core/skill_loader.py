@@ -1,5 +1,6 @@
 import os
-from .utils import parse_frontmatter
+import threading
+from .utils import parse_frontmatter, LazyValue
 
 class CategoryMetadata:
     """Level 1: Category metadata."""
@@ -202,3 +203,80 @@ def search_skills(query: str, skills_dirs: list[str] = None) -> list[dict]:
 def load_skill_by_name(skill_name: str, skills_dirs: list[str] = None) -> Skill:
     return SkillRegistry(skills_dirs).load_skill(skill_name)
 
+
+class SkillIndex:
+    """
+    Read-only snapshot of a SkillRegistry: categories and skill metadata are
+    scanned once, and each skill's instructions are read at most once.
+    Safe to share between threads and Agents.
+    """
+    def __init__(self, skills_dirs: list[str] = None):
+        registry = SkillRegistry(skills_dirs)
+        self.skills_dirs = tuple(registry.skills_dirs)
+        # Categories feed the system prompt, so they are read right away. The
+        # per-skill scan is only needed once the model looks at skills.
+        self.categories = tuple(registry.get_categories())
+        self._scan = LazyValue(lambda: self._build_index(registry))
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def _build_index(self, registry):
+        skills = tuple(registry.list_skills())
+        # First match wins, same as SkillRegistry.load_skill
+        by_name = {}
+        for meta in skills:
+            by_name.setdefault(meta.name, meta)
+        return skills, by_name
+
+    def warm_up(self):
+        """Scans the skill directories on a background thread."""
+        self._scan.start()
+
+    @property
+    def skills(self):
+        return self._scan.get()[0]
+
+    def list_skills_in_category(self, category: str) -> list[dict]:
+        return [
+            {
+                "name": s.name,
+                "description": s.description,
+                "path_name": os.path.basename(s.path)
+            }
+            for s in self.skills if s.category == category
+        ]
+
+    def search_skills(self, query: str) -> list[dict]:
+        query = query.lower()
+        return [
+            {
+                "name": s.name,
+                "description": s.description,
+                "category": s.category
+            }
+            for s in self.skills
+            if query in s.name.lower() or query in s.description.lower()
+        ]
+
+    def load_skill(self, name: str) -> Skill:
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name]
+        meta = self._scan.get()[1].get(name)
+        if meta is None:
+            return None
+        md_path = os.path.join(meta.path, "SKILL.md")
+        try:
+            with open(md_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            _, instructions = parse_frontmatter(content)
+            
+            # Interpolate {skill_path} to make paths absolute
+            if "{skill_path}" in instructions:
+                instructions = instructions.replace("{skill_path}", meta.path)
+        except Exception as e:
+            print(f"Error loading skill {name}: {e}")
+            return None
+        skill = Skill(metadata=meta, instructions=instructions)
+        with self._lock:
+            return self._loaded.setdefault(name, skill)
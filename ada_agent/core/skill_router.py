@@ -0,0 +1,132 @@
+import re
+import math
+import threading
+
+# Words that say nothing about which skill is wanted
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "then", "of", "to", "in", "on", "at", "by",
+    "for", "with", "from", "into", "about", "as", "is", "are", "was", "were", "be", "been",
+    "it", "its", "this", "that", "these", "those", "i", "me", "my", "you", "your", "we",
+    "our", "they", "them", "he", "she", "can", "could", "would", "should", "will", "do",
+    "does", "did", "please", "what", "which", "who", "how", "when", "where", "why", "use",
+    "using", "run", "skill", "skills", "script", "python", "command", "file", "path",
+    "some", "any", "all", "not", "no", "yes", "so", "up", "out", "also", "just", "there",
+    "here", "have", "has", "had", "get", "give", "tell", "want", "need", "like", "make",
+}
+
+# Instruction keywords per skill: the most frequent distinctive words only
+_MAX_KEYWORDS = 30
+
+# Field weights: a hit on the skill name says more than one in its instructions
+_NAME_WEIGHT = 3.0
+_DESCRIPTION_WEIGHT = 2.0
+_KEYWORD_WEIGHT = 1.0
+
+def _stem(word):
+    # Crude prefix stemming, enough to match "calculate" with "calculator" or "reversed" with "reverse"
+    return word[:6]
+
+def _terms(text):
+    words = re.findall(r"[a-z0-9]+", (text or "").lower().replace("_", " ").replace("-", " "))
+    return [_stem(w) for w in words if len(w) > 1 and w not in _STOPWORDS]
+
+
+class SkillRouter:
+    """
+    Scores a user message against the skill index (name, description and
+    instruction keywords) so an Agent can enable likely skills before its first
+    LLM call. Each pre-enabled skill the model then uses saves the
+    `list_skills` and `enable_skill` round trips; one it doesn't use only adds
+    its instructions to the prompt. `stats` counts both.
+
+    Confidence is in [0, 1]: the idf-weighted share of the message's known
+    terms that hit the skill, where a description hit counts fully, a name hit
+    counts more and an instruction-keyword hit less. A skill named verbatim in
+    the message scores 1.0. Skills at or above `threshold` are returned, best
+    first, at most `max_skills` of them.
+    """
+    def __init__(self, skill_index, threshold=0.6, max_skills=2):
+        self.skill_index = skill_index
+        self.threshold = threshold
+        self.max_skills = max_skills
+        self._profiles = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "turns": 0, "routed_turns": 0, "preselected": 0, "used": 0, "unused": 0,
+            "round_trips_saved": 0, "unused_instruction_tokens": 0,
+        }
+
+    def _build_profiles(self):
+        profiles = []
+        for meta in self.skill_index.skills:
+            skill = self.skill_index.load_skill(meta.name)
+            counts = {}
+            for term in _terms(skill.instructions if skill else ""):
+                counts[term] = counts.get(term, 0) + 1
+            keywords = set(sorted(counts, key=counts.get, reverse=True)[:_MAX_KEYWORDS])
+            profiles.append((meta.name, set(_terms(meta.name)), set(_terms(meta.description)), keywords))
+
+        # Terms found in many skills discriminate little
+        document_frequency = {}
+        for _, name, description, keywords in profiles:
+            for term in name | description | keywords:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        idf = {t: math.log(1 + len(profiles) / df) for t, df in document_frequency.items()}
+        return profiles, idf
+
+    def _get_profiles(self):
+        # Built on first use, so reading every skill's instructions stays off the startup path
+        with self._lock:
+            if self._profiles is None:
+                self._profiles = self._build_profiles()
+            return self._profiles
+
+    def score(self, text):
+        """Returns [(skill_name, confidence)] for every skill with a non-zero score, best first."""
+        profiles, idf = self._get_profiles()
+        lowered = (text or "").lower()
+        query = set(_terms(text))
+        known = [t for t in query if t in idf]
+        total = sum(idf[t] for t in known) * _DESCRIPTION_WEIGHT
+
+        scores = []
+        for name, name_terms, description_terms, keywords in profiles:
+            if re.search(rf"\b{re.escape(name.lower())}\b", lowered):
+                scores.append((name, 1.0))
+                continue
+            if not total:
+                continue
+            raw = 0.0
+            for t in known:
+                if t in name_terms:
+                    raw += idf[t] * _NAME_WEIGHT
+                elif t in description_terms:
+                    raw += idf[t] * _DESCRIPTION_WEIGHT
+                elif t in keywords:
+                    raw += idf[t] * _KEYWORD_WEIGHT
+            if raw:
+                scores.append((name, min(1.0, raw / total)))
+        scores.sort(key=lambda s: s[1], reverse=True)
+        return scores
+
+    def route(self, text):
+        """Skills confident enough to enable up front: [(skill_name, confidence)]."""
+        matches = [s for s in self.score(text) if s[1] >= self.threshold]
+        return matches[:self.max_skills]
+
+    def record(self, enabled_count, used_count=0, unused_tokens=0):
+        """
+        Counts one finished turn: `enabled_count` skills were preselected and
+        `used_count` of them used, each saving an estimated two round trips. The
+        others cost `unused_tokens` of instructions the model didn't need.
+        """
+        with self._stats_lock:
+            self.stats["turns"] += 1
+            if enabled_count:
+                self.stats["routed_turns"] += 1
+                self.stats["preselected"] += enabled_count
+                self.stats["used"] += used_count
+                self.stats["unused"] += enabled_count - used_count
+                self.stats["round_trips_saved"] += 2 * used_count
+                self.stats["unused_instruction_tokens"] += unused_tokens
@@ -0,0 +1,162 @@
+"""
+Worker process for PythonWorkerPool (see skill_executor.py), run as a plain
+script so it doesn't import the ada_agent package.
+
+Reads one JSON request per line ({"script", "argv", "cwd", "env", "budget",
+"spill_dir"}), runs the script in this interpreter as if it were
+`python script argv...`, and answers with one JSON line ({"code", "stdout",
+"stderr", "rss_kb"}). Output over `budget` bytes is copied to a file in
+`spill_dir` and answered as {"head", "tail", "total", "head_bytes", "tail_bytes", "path"}.
+"""
+import os
+import sys
+import json
+import runpy
+import shutil
+import resource
+import tempfile
+import importlib
+import traceback
+
+# Imported once at startup so skill scripts find them already loaded
+DEFAULT_PRELOAD = [
+    "argparse", "json", "math", "re", "random", "datetime", "time", "shutil", "collections",
+    "itertools", "functools", "statistics", "decimal", "fractions", "pathlib", "subprocess", "csv",
+]
+
+
+def _exit_code(code):
+    # Same mapping as the interpreter's handling of SystemExit
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+class _Exit(BaseException):
+    # Raised by the stand-in for os._exit, which would otherwise end the worker
+    def __init__(self, code):
+        self.code = code
+
+
+def _os_exit(code):
+    raise _Exit(code)
+
+
+def _run(request, out_file, err_file):
+    script = request["script"]
+    env = request.get("env") or {}
+    # Copying all of os.environ costs more than a small script run; only the request's own
+    # variables are put back (changes a script makes itself last until the worker is recycled)
+    saved_env = {name: os.environ.get(name) for name in env}
+    saved = (list(sys.argv), list(sys.path), os.getcwd(), set(sys.modules), sys.stdout, sys.stderr)
+    sys.argv = [script] + list(request.get("argv") or [])
+    # As with `python script.py`, the script's directory comes first on sys.path
+    sys.path.insert(0, os.path.dirname(script))
+    os.environ.update(env)
+    # Output goes to files at the fd level, so C extensions and child processes are captured too
+    for f in (out_file, err_file):
+        f.seek(0)
+        f.truncate()
+    os.dup2(out_file.fileno(), 1)
+    os.dup2(err_file.fileno(), 2)
+    real_exit = os._exit
+    os._exit = _os_exit
+    try:
+        if request.get("cwd"):
+            os.chdir(request["cwd"])
+        runpy.run_path(script, run_name="__main__")
+        code = 0
+    except SystemExit as e:
+        code = _exit_code(e.code)
+    except _Exit as e:
+        code = e.code
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        os._exit = real_exit
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.stdout, sys.stderr = saved[4], saved[5]
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.argv, sys.path[:] = saved[0], saved[1]
+        os.chdir(saved[2])
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        # Forget modules the script imported from its own directory, so the next run re-imports them
+        script_dir = os.path.dirname(script)
+        for name in set(sys.modules) - saved[3]:
+            path = getattr(sys.modules[name], "__file__", None) or ""
+            if path.startswith(script_dir + os.sep):
+                del sys.modules[name]
+    return code
+
+
+def _read(f, budget=None, spill_dir=None, label="output"):
+    size = os.fstat(f.fileno()).st_size
+    f.seek(0)
+    if budget is None or size <= budget:
+        return f.read().decode("utf-8", errors="replace")
+    # Too big to send back whole: keep the full output in a file, answer with its head and tail
+    os.makedirs(spill_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=spill_dir, prefix=f"{label}-", suffix=".txt", delete=False) as spill:
+        shutil.copyfileobj(f, spill)
+    f.seek(0)
+    head = f.read(budget // 2)
+    f.seek(size - (budget - len(head)))
+    tail = f.read()
+    return {
+        "head": head.decode("utf-8", errors="replace"),
+        "tail": tail.decode("utf-8", errors="replace"),
+        "total": size,
+        "head_bytes": len(head),
+        "tail_bytes": len(tail),
+        "path": spill.name,
+    }
+
+
+def serve(preload=None):
+    # Requests come in on the original stdin and answers go out on the original stdout;
+    # the script itself gets /dev/null as stdin and per-run files as stdout/stderr.
+    requests = os.fdopen(os.dup(0), "rb")
+    responses = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    sys.stdin = open(os.devnull, "r")
+    out_file = tempfile.TemporaryFile()
+    err_file = tempfile.TemporaryFile()
+    # Line buffered, like a terminal-less `python script.py` would flush at exit anyway
+    sys.stdout = open(1, "w", encoding="utf-8", errors="replace", closefd=False, buffering=1)
+    sys.stderr = open(2, "w", encoding="utf-8", errors="replace", closefd=False, buffering=1)
+
+    for name in preload if preload is not None else DEFAULT_PRELOAD:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    responses.write(b'{"ready": true}\n')
+    responses.flush()
+
+    for line in requests:
+        request = json.loads(line)
+        code = _run(request, out_file, err_file)
+        budget, spill_dir = request.get("budget"), request.get("spill_dir")
+        response = {
+            "code": code,
+            "stdout": _read(out_file, budget, spill_dir, "stdout"),
+            "stderr": _read(err_file, budget, spill_dir, "stderr"),
+            "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+        responses.write(json.dumps(response).encode("utf-8") + b"\n")
+        responses.flush()
+
+
+if __name__ == "__main__":
+    serve(json.loads(sys.argv[1]) if len(sys.argv) > 1 else None)
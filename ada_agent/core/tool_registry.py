@@ -0,0 +1,76 @@
+class Tool:
+    """A callable exposed to the model, together with its OpenAI-format schema."""
+    def __init__(self, name, func, description=None, parameters=None, parallel_safe=False, afunc=None, advertise=True):
+        self.name = name
+        self.func = func
+        # Optional coroutine function used by `Agent.achat` instead of `func`
+        self.afunc = afunc
+        # Safe to run concurrently with other calls from the same assistant turn
+        self.parallel_safe = parallel_safe
+        # Dispatchable but left out of the schema sent to the model
+        self.advertise = advertise
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description or "",
+                "parameters": parameters or {"type": "object", "properties": {}, "required": []}
+            }
+        }
+
+
+class ToolRegistry:
+    """
+    Holds the tools an Agent can call.
+
+    Dispatch is a dict lookup, and `schemas()` returns the same list object until
+    the tool set changes. Providers key their converted schemas on that identity,
+    so conversion happens once per tool-set change instead of once per request.
+    """
+    def __init__(self):
+        self._tools = {}
+        self._schemas = None
+        # Bumped on every change; handy for callers keeping their own caches
+        self.version = 0
+
+    def register(self, name, func, description=None, parameters=None, parallel_safe=False, afunc=None, advertise=True):
+        tool = Tool(name, func, description, parameters, parallel_safe, afunc, advertise)
+        self._tools[name] = tool
+        self._invalidate()
+        return tool
+
+    def unregister(self, name):
+        if self._tools.pop(name, None) is not None:
+            self._invalidate()
+
+    def _invalidate(self):
+        self._schemas = None
+        self.version += 1
+
+    def get(self, name):
+        return self._tools.get(name)
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def __len__(self):
+        return len(self._tools)
+
+    def names(self):
+        return list(self._tools)
+
+    def is_parallel_safe(self, name):
+        tool = self._tools.get(name)
+        return tool is not None and tool.parallel_safe
+
+    def schemas(self):
+        """OpenAI-format tool schemas, rebuilt only after the tool set changes."""
+        if self._schemas is None:
+            self._schemas = [t.schema for t in self._tools.values() if t.advertise]
+        return self._schemas
+
+    def dispatch(self, name, args):
+        tool = self._tools.get(name)
+        if tool is None:
+            return f"Error: Tool {name} not found."
+        return tool.func(**args)
@@ -1,53 +1,287 @@
+import asyncio
 import subprocess
 import os
 import sys
 import json
+import time
+import signal
+import mmap
+import bisect
+import threading
+from collections import OrderedDict
+from .output_capture import OUTPUT_BUDGET, OutputCapture, read_output, _decode
 
-def run_command(command: str) -> str:
+COMMAND_TIMEOUT = 60
+
+def _command_env() -> dict:
+    # Check for venv and update PATH to prioritize it
+    env = os.environ.copy()
+    
+    # Use the current python interpreter's directory to ensure we stay in the same environment
+    current_python_dir = os.path.dirname(sys.executable)
+    env["PATH"] = f"{current_python_dir}{os.pathsep}{env.get('PATH', '')}"
+    
+    # Also set VIRTUAL_ENV legacy variable if we are in a venv
+    if sys.prefix != sys.base_prefix:
+         env["VIRTUAL_ENV"] = sys.prefix
+    return env
+
+def _format_command_result(returncode: int, stdout: str, stderr: str) -> str:
+    if returncode == 0:
+        return stdout
+    else:
+        return f"Error (Exit Code {returncode}):\n{stderr}"
+
+def _kill_process_group(proc):
+    # Commands run in their own session, so this also kills whatever the shell started
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _pump(stream, capture):
+    # Reader thread: moves one pipe into its bounded capture until EOF
+    fd = stream.fileno()
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            break
+        capture.write(chunk)
+
+def run_command(command: str, timeout: int = None) -> str:
     """
     Executes a shell command and returns the output.
+    The command is killed after `timeout` seconds (default COMMAND_TIMEOUT).
+    Output beyond the budget is cut to its head and tail and saved to a file (see output_capture.py).
     WARNING: This tool allows executing arbitrary shell commands.
     """
+    timeout = timeout or COMMAND_TIMEOUT
     try:
-        # Check for venv and update PATH to prioritize it
-        env = os.environ.copy()
-        
-        # Use the current python interpreter's directory to ensure we stay in the same environment
-        current_python_dir = os.path.dirname(sys.executable)
-        env["PATH"] = f"{current_python_dir}{os.pathsep}{env.get('PATH', '')}"
-        
-        # Also set VIRTUAL_ENV legacy variable if we are in a venv
-        if sys.prefix != sys.base_prefix:
-             env["VIRTUAL_ENV"] = sys.prefix
-        
-        # Using shell=True to allow complex commands
-        result = subprocess.run(
-            command, 
-            shell=True, 
-            capture_output=True, 
-            text=True, 
-            timeout=60,
-            env=env
+        # Using shell=True to allow complex commands; its own session so a timeout kills everything it started
+        proc = subprocess.Popen(
+            command,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=_command_env(),
+            start_new_session=True
         )
-        if result.returncode == 0:
-            return result.stdout
-        else:
-            return f"Error (Exit Code {result.returncode}):\n{result.stderr}"
     except Exception as e:
         return f"Execution Error: {str(e)}"
 
-def read_file(path: str) -> str:
+    # Streamed into bounded captures instead of buffered whole by communicate()
+    stdout, stderr = OutputCapture(label="stdout"), OutputCapture(label="stderr")
+    readers = [
+        threading.Thread(target=_pump, args=(proc.stdout, stdout), daemon=True),
+        threading.Thread(target=_pump, args=(proc.stderr, stderr), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    deadline = time.monotonic() + timeout
+    try:
+        proc.wait(timeout=timeout)
+        # Background children of the shell can keep the pipes open past its exit
+        for reader in readers:
+            reader.join(max(0, deadline - time.monotonic()))
+        if any(reader.is_alive() for reader in readers):
+            raise subprocess.TimeoutExpired(command, timeout)
+    except subprocess.TimeoutExpired:
+        _kill_process_group(proc)
+        proc.wait()
+        return f"Execution Error: Command '{command}' timed out after {timeout} seconds"
+    except Exception as e:
+        _kill_process_group(proc)
+        return f"Execution Error: {str(e)}"
+    finally:
+        for reader in readers:
+            reader.join()
+        proc.stdout.close()
+        proc.stderr.close()
+        stdout.close()
+        stderr.close()
+    return _format_command_result(proc.returncode, stdout.text(), stderr.text())
+
+async def arun_command(command: str, timeout: int = None) -> str:
+    """
+    Async counterpart of `run_command`. The command's whole process group is
+    killed on timeout or if the awaiting task is cancelled, so an abandoned turn
+    never leaks a process.
+    """
+    try:
+        proc = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=_command_env(),
+            start_new_session=True
+        )
+    except Exception as e:
+        return f"Execution Error: {str(e)}"
+
+    stdout, stderr = OutputCapture(label="stdout"), OutputCapture(label="stderr")
+
+    async def pump(stream, capture):
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            capture.write(chunk)
+
+    timeout = timeout or COMMAND_TIMEOUT
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pumps = [asyncio.ensure_future(pump(proc.stdout, stdout)), asyncio.ensure_future(pump(proc.stderr, stderr))]
+    try:
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=timeout)
+            # Background children of the shell can keep the pipes open past its exit
+            _, pending = await asyncio.wait(pumps, timeout=max(0, deadline - loop.time()))
+            if pending:
+                raise asyncio.TimeoutError()
+        except asyncio.TimeoutError:
+            _kill_process_group(proc)
+            await proc.wait()
+            return f"Execution Error: Command '{command}' timed out after {timeout} seconds"
+        except asyncio.CancelledError:
+            _kill_process_group(proc)
+            await proc.wait()
+            raise
+    finally:
+        # Done already unless the command was killed; then its pipes close with it, and
+        # a pump still waiting on a pipe held by an escaped process is cancelled
+        await asyncio.wait(pumps, timeout=1)
+        for task in pumps:
+            task.cancel()
+        await asyncio.gather(*pumps, return_exceptions=True)
+        stdout.close()
+        stderr.close()
+    return _format_command_result(proc.returncode, stdout.text(), stderr.text())
+
+# Line numbers whose byte offsets are known, per file, so paging by line doesn't rescan from the top
+_LINE_MARKS_FILES = 32
+_LINE_MARKS_PER_FILE = 1024
+_LINE_SCAN_CHUNK = 1 << 20
+_line_marks = OrderedDict()
+_line_marks_lock = threading.Lock()
+
+def _known_line(path, stat, line):
+    # Nearest known (line, offset) at or before `line`; forgotten if the file changed
+    key = os.path.realpath(path)
+    version = (stat.st_size, stat.st_mtime_ns)
+    with _line_marks_lock:
+        entry = _line_marks.get(key)
+        if entry is None or entry[0] != version:
+            entry = _line_marks[key] = (version, [(1, 0)])
+            while len(_line_marks) > _LINE_MARKS_FILES:
+                _line_marks.popitem(last=False)
+        _line_marks.move_to_end(key)
+        marks = entry[1]
+        return marks[bisect.bisect_right(marks, (line, float("inf"))) - 1]
+
+def _remember_line(path, stat, line, offset):
+    key = os.path.realpath(path)
+    with _line_marks_lock:
+        entry = _line_marks.get(key)
+        if entry is None or entry[0] != (stat.st_size, stat.st_mtime_ns):
+            return
+        marks = entry[1]
+        i = bisect.bisect_left(marks, (line, offset))
+        if (i < len(marks) and marks[i][0] == line) or len(marks) >= _LINE_MARKS_PER_FILE:
+            return
+        marks.insert(i, (line, offset))
+
+def _line_offset(data, line, known=(1, 0)):
+    """Byte offset where 1-based `line` starts in `data`, counting on from a known (line, offset); None past the end."""
+    current, pos = known
+    while current < line:
+        # Whole chunks are skipped with a C-level count; only the last one is walked line by line
+        chunk = data[pos:pos + _LINE_SCAN_CHUNK]
+        if not chunk:
+            return None
+        newlines = chunk.count(b"\n")
+        if current + newlines < line:
+            current += newlines
+            pos += len(chunk)
+            continue
+        i = -1
+        for _ in range(line - current):
+            i = chunk.find(b"\n", i + 1)
+        pos += i + 1
+        current = line
+    return pos if pos < len(data) else None
+
+def read_file(path: str, offset: int = None, start_line: int = None, end_line: int = None, page_size: int = None) -> str:
     """
-    Reads the content of a file.
+    Reads the content of a file, or one page of it.
+
+    A file that fits in `page_size` bytes (default: the output budget) is returned
+    whole. Otherwise one page is returned, starting at byte `offset` or at line
+    `start_line` (1-based, up to `end_line` inclusive), and ending on a line
+    boundary where possible. Pages end with the total size and the cursor for the
+    next page. Large files are memory-mapped, so only the pages touched are read.
     """
     try:
         if not os.path.exists(path):
             return f"Error: File '{path}' not found."
-        with open(path, 'r', encoding='utf-8') as f:
-            return f.read()
+        page_size = page_size or OUTPUT_BUDGET
+        if page_size <= 0 or (offset or 0) < 0 or (start_line or 1) < 1 or (end_line is not None and end_line < (start_line or 1)):
+            return "Read Error: offset must be >= 0, page_size > 0, and 1 <= start_line <= end_line."
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            ranged = offset is not None or start_line is not None or end_line is not None
+            if size <= page_size and not ranged:
+                return _decode(f.read())
+            if size == 0:
+                return "\n[bytes 0-0 of 0; end of file]"
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _read_page(data, path, stat, offset, start_line, end_line, page_size)
     except Exception as e:
         return f"Read Error: {str(e)}"
 
+def _read_page(data, path, stat, offset, start_line, end_line, page_size):
+    size = len(data)
+    by_line = start_line is not None or end_line is not None
+    if by_line:
+        start_line = start_line or 1
+        start = _line_offset(data, start_line, _known_line(path, stat, start_line))
+        if start is None:
+            return f"\n[line {start_line} is past the end of the file ({size} bytes)]"
+        stop = size
+        if end_line is not None:
+            stop = _line_offset(data, end_line + 1, (start_line, start)) or size
+    else:
+        start = min(offset or 0, size)
+        stop = size
+    end = min(stop, start + page_size)
+    if end < stop:
+        # Cut the page after its last complete line, unless that line alone is longer than a page
+        cut = data.rfind(b"\n", start, end)
+        if cut != -1:
+            end = cut + 1
+    page = data[start:end]
+
+    footer = f"\n\n[bytes {start}-{end} of {size}"
+    if by_line:
+        lines = page.count(b"\n")
+        # A page that doesn't end in a newline stops partway through one more line
+        last_line = start_line + lines - (1 if page.endswith(b"\n") else 0)
+        footer += f", lines {start_line}-{last_line}"
+        if page.endswith(b"\n"):
+            _remember_line(path, stat, start_line + lines, end)
+    if end >= size:
+        footer += "; end of file]"
+    elif by_line and end_line is not None and end >= stop:
+        footer += f"; end of range, next offset: {end}]"
+    elif by_line and page.endswith(b"\n"):
+        footer += f"; next: start_line={start_line + lines}" + (f", end_line={end_line}" if end_line else "") + "]"
+    else:
+        footer += f"; next offset: {end}]"
+    return _decode(page) + footer
+
 def list_files(path: str = ".") -> str:
     """
     Lists files in a directory.
@@ -70,6 +304,10 @@ TOOLS_SCHEMA = [
                     "command": {
                         "type": "string",
                         "description": "The command line to execute (e.g., 'python skills/my_skill/script.py')"
+                    },
+                    "timeout": {
+                        "type": "integer",
+                        "description": "Seconds before the command is killed (default 60)."
                     }
                 },
                 "required": ["command"]
@@ -80,13 +318,29 @@ TOOLS_SCHEMA = [
         "type": "function",
         "function": {
             "name": "read_file",
-            "description": "Read the contents of a file. Use this to inspect code, logs, or data.",
+            "description": "Read the contents of a file. Use this to inspect code, logs, or data. Large files are read one page at a time: each page ends with the file size and the offset or start_line of the next page.",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "path": {
                         "type": "string",
                         "description": "The path to the file to read."
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "Byte offset to start the page at (e.g. the 'next offset' of the previous page)."
+                    },
+                    "start_line": {
+                        "type": "integer",
+                        "description": "First line to read (1-based). Use instead of offset to read a line range."
+                    },
+                    "end_line": {
+                        "type": "integer",
+                        "description": "Last line to read (inclusive)."
+                    },
+                    "page_size": {
+                        "type": "integer",
+                        "description": "Maximum bytes to return (default 32768)."
                     }
                 },
                 "required": ["path"]
@@ -110,6 +364,31 @@ TOOLS_SCHEMA = [
                 "required": []
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_output",
+            "description": "Read part of a file by byte offset. Use this to page through command output or files that were cut short.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "The file to read, e.g. the saved output path given in a truncation note."
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "Byte offset to start reading at (default 0)."
+                    },
+                    "length": {
+                        "type": "integer",
+                        "description": "Number of bytes to read (default: the tool output budget)."
+                    }
+                },
+                "required": ["path"]
+            }
+        }
     }
 ]
 
@@ -117,5 +396,6 @@ TOOLS_SCHEMA = [
 AVAILABLE_TOOLS = {
     "run_command": run_command,
     "read_file": read_file,
-    "list_files": list_files
+    "list_files": list_files,
+    "read_output": read_output
 }
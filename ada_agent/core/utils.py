@@ -1,3 +1,5 @@
+import threading
+
 def parse_frontmatter(content: str):
     """
     Parses YAML frontmatter from a string.
@@ -27,3 +29,69 @@ def parse_frontmatter(content: str):
             metadata[key.strip()] = value.strip()
             
     return metadata, body.strip()
+
+# Per-message framing overhead (role, separators) most chat APIs add on top of content
+MESSAGE_TOKEN_OVERHEAD = 4
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast token count heuristic: ~4 UTF-8 bytes per token.
+    Close enough for English prose and code, and CJK text (3 bytes/char) lands
+    near its real ~1 token/char. Pass a real tokenizer to the Agent for exact counts.
+    """
+    if not text:
+        return 0
+    return (len(text.encode("utf-8")) + 3) // 4
+
+def estimate_message_tokens(message: dict, estimator=estimate_tokens) -> int:
+    """Estimates the tokens a chat message costs: its content plus any tool calls."""
+    tokens = MESSAGE_TOKEN_OVERHEAD
+    content = message.get("content")
+    if isinstance(content, str):
+        tokens += estimator(content)
+    for tc in message.get("tool_calls") or []:
+        func = tc["function"] if isinstance(tc, dict) else tc.function
+        name = func["name"] if isinstance(func, dict) else func.name
+        arguments = func["arguments"] if isinstance(func, dict) else func.arguments
+        tokens += estimator(name) + estimator(arguments or "")
+    return tokens
+
+
+class LazyValue:
+    """
+    A value computed on first use, at most once. `start()` computes it ahead of
+    time on a daemon thread; `get()` returns it, waiting only if it isn't ready yet.
+    """
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._done = False
+        self._value = None
+        self._error = None
+
+    def start(self):
+        threading.Thread(target=self._load_quietly, daemon=True).start()
+        return self
+
+    def _load_quietly(self):
+        try:
+            self.get()
+        except Exception:
+            pass # Kept in self._error and re-raised to whoever calls get()
+
+    @property
+    def ready(self):
+        return self._done
+
+    def get(self):
+        if not self._done:
+            with self._lock:
+                if not self._done:
+                    try:
+                        self._value = self._loader()
+                    except Exception as e:
+                        self._error = e
+                    self._done = True
+        if self._error is not None:
+            raise self._error
+        return self._value
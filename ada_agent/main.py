@@ -11,8 +11,94 @@ from .core.agent import Agent
 # from .core.llm.anthropic_client import AnthropicProvider
 # from .core.llm.gemini_client import GeminiProvider
 
+def _create_single_provider(provider_name):
+    from .core.llm.factory import default_factory
+    factory = default_factory()
+
+    if provider_name == "deepseek":
+        api_key = os.getenv("DEEPSEEK_API_KEY")
+        if not api_key: raise ValueError("DEEPSEEK_API_KEY not found")
+        provider = factory.openai_compatible(
+            api_key=api_key,
+            base_url="https://api.deepseek.com/v1",
+            model_name="deepseek-chat"
+        )
+        
+    elif provider_name == "grok":
+        api_key = os.getenv("GROK_API_KEY")
+        if not api_key: raise ValueError("GROK_API_KEY not found")
+        provider = factory.openai_compatible(
+            api_key=api_key,
+            base_url="https://api.x.ai/v1",
+            model_name="grok-beta"
+        )
+        
+    elif provider_name == "claude" or provider_name == "anthropic":
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+        if not api_key: raise ValueError("ANTHROPIC_API_KEY not found")
+        provider = factory.anthropic(api_key=api_key)
+        
+    elif provider_name == "gemini":
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key: raise ValueError("GEMINI_API_KEY not found")
+        provider = factory.gemini(api_key=api_key)
+        
+    else:
+        raise ValueError(f"Unknown provider: {provider_name}")
+
+    # Retry transient errors and, with ADA_RPM / ADA_TPM, stay under the API key's rate limits
+    from .core.llm.retry import RetryingProvider
+    provider = RetryingProvider(
+        provider,
+        max_retries=int(os.getenv("ADA_MAX_RETRIES", "4")),
+        requests_per_minute=int(os.getenv("ADA_RPM", "0")) or None,
+        tokens_per_minute=int(os.getenv("ADA_TPM", "0")) or None
+    )
+    return provider
+
+def create_provider(provider_name=None):
+    """
+    Builds the LLM provider named by `provider_name` (default: the LLM_PROVIDER
+    env var, then "deepseek"), reading its API key from the environment.
+    Raises ValueError for unknown providers or missing keys.
+
+    Providers come from the shared ProviderFactory, so repeated calls reuse the
+    same provider (and, with ADA_HTTP_POOL=1, pooled HTTP connections), and are wrapped in a
+    RetryingProvider whose rate limiter is shared per API key.
+
+    A comma-separated list ("deepseek,claude") builds a HedgedProvider: the first
+    provider serves requests, the others take over when it is slow or failing.
+    """
+    provider_name = provider_name or os.getenv("LLM_PROVIDER", "deepseek")
+    names = [name.strip().lower() for name in provider_name.split(",") if name.strip()]
+    providers = [_create_single_provider(name) for name in names]
+
+    if len(providers) == 1:
+        provider = providers[0]
+    else:
+        # Hedge after ADA_HEDGE_PERCENTILE (default p95) of the first provider's latency
+        from .core.llm.hedged import HedgedProvider
+        provider = HedgedProvider(
+            providers,
+            names=names,
+            hedge_percentile=float(os.getenv("ADA_HEDGE_PERCENTILE", "95")),
+            initial_deadline=float(os.getenv("ADA_HEDGE_DEADLINE", "10"))
+        )
+
+    # Record/replay LLM calls, e.g. ADA_CASSETTE_DIR=cassettes ADA_CASSETTE_MODE=replay
+    cassette_dir = os.getenv("ADA_CASSETTE_DIR")
+    if cassette_dir:
+        from .core.llm.cassette import CassetteProvider
+        provider = CassetteProvider(provider, cassette_dir, mode=os.getenv("ADA_CASSETTE_MODE", "auto"))
+    return provider
+
 def main():
     load_dotenv()
+
+    # Subcommands: `ada batch ...` runs prompts from a JSONL file non-interactively
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from .batch import main as batch_main
+        return batch_main(sys.argv[2:])
     
     # Provider Selection Logic
     # Default to DeepSeek if no args or specialized config
@@ -20,44 +106,8 @@ def main():
     
     provider_name = os.getenv("LLM_PROVIDER", "deepseek").lower()
     
-    provider = None
-    
     try:
-        if provider_name == "deepseek":
-            from .core.llm.openai_compatible import OpenAICompatibleProvider
-            api_key = os.getenv("DEEPSEEK_API_KEY")
-            if not api_key: raise ValueError("DEEPSEEK_API_KEY not found")
-            provider = OpenAICompatibleProvider(
-                api_key=api_key,
-                base_url="https://api.deepseek.com/v1",
-                model_name="deepseek-chat"
-            )
-            
-        elif provider_name == "grok":
-            from .core.llm.openai_compatible import OpenAICompatibleProvider
-            api_key = os.getenv("GROK_API_KEY")
-            if not api_key: raise ValueError("GROK_API_KEY not found")
-            provider = OpenAICompatibleProvider(
-                api_key=api_key,
-                base_url="https://api.x.ai/v1",
-                model_name="grok-beta"
-            )
-            
-        elif provider_name == "claude" or provider_name == "anthropic":
-            from .core.llm.anthropic_client import AnthropicProvider
-            api_key = os.getenv("ANTHROPIC_API_KEY")
-            if not api_key: raise ValueError("ANTHROPIC_API_KEY not found")
-            provider = AnthropicProvider(api_key=api_key)
-            
-        elif provider_name == "gemini":
-            from .core.llm.gemini_client import GeminiProvider
-            api_key = os.getenv("GEMINI_API_KEY")
-            if not api_key: raise ValueError("GEMINI_API_KEY not found")
-            provider = GeminiProvider(api_key=api_key)
-            
-        else:
-            print(f"Unknown provider: {provider_name}")
-            return
+        provider = create_provider(provider_name)
 
         print(f"Initializing Agent with Provider: {provider_name.upper()}...")
         agent = Agent(provider=provider, verbose=True) # Enable verbose for demo
@@ -0,0 +1,286 @@
+"""
+Agent-loop overhead benchmarks.
+
+Measures the time the framework itself spends per operation, with no network:
+the LLM is a ScriptedProvider and all tools are local. Every benchmark runs for
+each combination of the size parameters and reports per-iteration timings.
+
+Usage:
+    python benchmarks/agent_loop.py
+    python benchmarks/agent_loop.py --history 20,200,2000 --skills 10,100 --corpus 100,10000 --output results.json
+    python benchmarks/agent_loop.py --compare results.json   # prints the change against an earlier run
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+# Ensure we can import the package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ada_agent import Agent
+from ada_agent.core.context import Context
+from ada_agent.core.skill_loader import SkillIndex
+from ada_agent.core.knowledge.rag import SimpleRAG
+from ada_agent.core.memory.storage import MemoryStorage
+from ada_agent.core.llm.scripted import ScriptedProvider, text, tool_call, skill_discovery_flow
+
+
+# --- Fixtures ---
+
+def make_skills(root, skill_count, categories=5):
+    """Writes `skill_count` skills spread over `categories` categories. Returns the skills dir."""
+    skills_dir = os.path.join(root, "skills")
+    for c in range(categories):
+        cat_dir = os.path.join(skills_dir, f"category_{c}")
+        os.makedirs(cat_dir, exist_ok=True)
+        with open(os.path.join(cat_dir, "CATEGORY.md"), "w", encoding="utf-8") as f:
+            f.write(f"---\nname: category_{c}\ndescription: Benchmark category {c}.\n---\n")
+    for i in range(skill_count):
+        skill_dir = os.path.join(skills_dir, f"category_{i % categories}", f"skill_{i}")
+        os.makedirs(skill_dir, exist_ok=True)
+        with open(os.path.join(skill_dir, "SKILL.md"), "w", encoding="utf-8") as f:
+            f.write(f"---\nname: skill_{i}\ndescription: Benchmark skill number {i}.\n---\n")
+            f.write(f"# Skill {i}\n\n" + "Step: do the thing carefully.\n" * 40)
+    return skills_dir
+
+def make_corpus(root, chunk_count, files=10):
+    """Writes `chunk_count` paragraphs over `files` text files. Returns the knowledge dir."""
+    knowledge_dir = os.path.join(root, "knowledge")
+    os.makedirs(knowledge_dir, exist_ok=True)
+    words = ["agent", "memory", "skill", "tool", "python", "context", "window", "token", "cache", "latency"]
+    per_file = max(1, chunk_count // files)
+    written = 0
+    for n in range(files):
+        paragraphs = []
+        for i in range(min(per_file, chunk_count - written)):
+            k = written + i
+            paragraphs.append(" ".join(words[(k + j) % len(words)] for j in range(40)) + f" fact{k}")
+        written += len(paragraphs)
+        with open(os.path.join(knowledge_dir, f"doc_{n}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(paragraphs))
+    return knowledge_dir
+
+def make_history(length):
+    """A conversation of `length` messages: user turns, tool round trips and answers."""
+    messages = []
+    i = 0
+    while len(messages) < length:
+        messages.append({"role": "user", "content": f"Question {i} about the project?"})
+        messages.append({"role": "assistant", "content": None, "tool_calls": [
+            {"id": f"nav_{i}", "type": "function", "function": {"name": "list_skills", "arguments": json.dumps({"category": "category_0"})}}
+        ]})
+        messages.append({"role": "tool", "tool_call_id": f"nav_{i}", "name": "list_skills", "content": "[]"})
+        messages.append({"role": "assistant", "content": f"Answer {i}. " + "detail " * 30})
+        i += 1
+    return messages[:length]
+
+
+# --- Timing ---
+
+def measure(fn, iterations, setup=None):
+    """Runs fn `iterations` times (after `setup`, untimed) and returns per-call stats in microseconds."""
+    samples = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "mean_us": round(sum(samples) / len(samples), 3),
+        "p50_us": round(samples[len(samples) // 2], 3),
+        "p95_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_us": round(samples[0], 3),
+    }
+
+
+class Fixture:
+    """Temporary context (skills, knowledge, memory) shared by the benchmarks of one parameter set."""
+    def __init__(self, skill_count, corpus_size):
+        self.root = tempfile.mkdtemp(prefix="ada_bench_")
+        self.skills_dir = make_skills(self.root, skill_count)
+        self.knowledge_dir = make_corpus(self.root, corpus_size)
+        self.memory_path = os.path.join(self.root, "memory.json")
+        self.context = Context(
+            memory_path=self.memory_path,
+            skills_dirs=[self.skills_dir],
+            knowledge_path=self.knowledge_dir,
+            warmup=False
+        )
+
+    def agent(self, script, history=None):
+        agent = Agent(ScriptedProvider(script, loop=True), context=self.context)
+        if history:
+            with agent._history_lock:
+                agent._set_messages(agent.messages + [dict(m) for m in history])
+        return agent
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _restoring(agent):
+    # Puts the agent's history back to what it is now; used as an untimed setup step
+    snapshot = list(agent.messages)
+    def restore():
+        with agent._history_lock:
+            agent._set_messages(list(snapshot))
+            agent._set_loaded_skills(set())
+            agent.pending_injections = []
+    return restore
+
+
+# --- Benchmarks ---
+
+def bench_chat_text(fx, history, iterations):
+    agent = fx.agent([text("ok")], make_history(history))
+    return measure(lambda: agent.chat("hello"), iterations, _restoring(agent))
+
+def bench_chat_tool_round_trip(fx, history, iterations):
+    agent = fx.agent([tool_call("recall", query="project"), text("ok")], make_history(history))
+    return measure(lambda: agent.chat("what do you remember?"), iterations, _restoring(agent))
+
+def bench_chat_skill_discovery(fx, history, iterations):
+    agent = fx.agent(skill_discovery_flow("category_0", "skill_0", "done"), make_history(history))
+    return measure(lambda: agent.chat("use skill 0"), iterations, _restoring(agent))
+
+def bench_prune_navigation_history(fx, history, iterations):
+    agent = fx.agent([text("ok")], make_history(history))
+    return measure(agent._prune_navigation_history, iterations, _restoring(agent))
+
+def bench_get_pruned_messages(fx, history, iterations):
+    agent = fx.agent([text("ok")], make_history(history))
+    return measure(agent._get_pruned_messages, iterations)
+
+def bench_skill_scan(fx, history, iterations):
+    return measure(lambda: SkillIndex([fx.skills_dir]).skills, iterations)
+
+def bench_skill_load_cold(fx, history, iterations):
+    index = {}
+    def setup():
+        index["i"] = SkillIndex([fx.skills_dir])
+        index["i"].warm_up()
+        index["i"].skills
+    return measure(lambda: index["i"].load_skill("skill_0"), iterations, setup)
+
+def bench_enable_skill(fx, history, iterations):
+    agent = fx.agent([text("ok")])
+    return measure(lambda: agent._enable_skill("skill_0"), iterations, _restoring(agent))
+
+def bench_rag_index(fx, history, iterations):
+    return measure(lambda: SimpleRAG(fx.knowledge_dir), iterations)
+
+def bench_rag_retrieve(fx, history, iterations):
+    rag = fx.context.rag
+    return measure(lambda: rag.retrieve("agent memory latency fact42"), iterations)
+
+def bench_memory_write(fx, history, iterations):
+    storage = MemoryStorage(fx.memory_path)
+    counter = iter(range(10 ** 9))
+    return measure(lambda: storage.set(f"key_{next(counter) % 100}", "value " * 20), iterations)
+
+
+# name -> (function, parameters that affect the result)
+BENCHMARKS = {
+    "chat.text": (bench_chat_text, ("history",)),
+    "chat.tool_round_trip": (bench_chat_tool_round_trip, ("history",)),
+    "chat.skill_discovery": (bench_chat_skill_discovery, ("history", "skills")),
+    "prune.navigation_history": (bench_prune_navigation_history, ("history",)),
+    "prune.get_pruned_messages": (bench_get_pruned_messages, ("history",)),
+    "skills.scan": (bench_skill_scan, ("skills",)),
+    "skills.load_cold": (bench_skill_load_cold, ("skills",)),
+    "skills.enable": (bench_enable_skill, ("skills",)),
+    "rag.index": (bench_rag_index, ("corpus",)),
+    "rag.retrieve": (bench_rag_retrieve, ("corpus",)),
+    "memory.write": (bench_memory_write, ()),
+}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+def run(histories, skill_counts, corpus_sizes, iterations, only=None, verbose=True):
+    results = []
+    for skills in skill_counts:
+        for corpus in corpus_sizes:
+            fx = Fixture(skills, corpus)
+            try:
+                for history in histories:
+                    params = {"history": history, "skills": skills, "corpus": corpus}
+                    for name, (fn, depends_on) in BENCHMARKS.items():
+                        if only and not any(name.startswith(o) for o in only):
+                            continue
+                        # Run each benchmark once per distinct value of the parameters it depends on
+                        key = {p: params[p] for p in depends_on}
+                        if any(r["name"] == name and r["params"] == key for r in results):
+                            continue
+                        stats = fn(fx, history, iterations)
+                        results.append({"name": name, "params": key, **stats})
+                        if verbose:
+                            print(f"{name:28} {json.dumps(key):45} p50 {stats['p50_us']:>12.1f}us  p95 {stats['p95_us']:>12.1f}us", file=sys.stderr)
+            finally:
+                fx.close()
+    return results
+
+def compare(results, baseline):
+    """Prints the p50 change of every benchmark also present in `baseline`."""
+    previous = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in baseline["results"]}
+    for r in results:
+        old = previous.get((r["name"], json.dumps(r["params"], sort_keys=True)))
+        if old and old["p50_us"]:
+            change = (r["p50_us"] - old["p50_us"]) / old["p50_us"] * 100
+            print(f"{r['name']:28} {json.dumps(r['params']):45} {old['p50_us']:>12.1f}us -> {r['p50_us']:>12.1f}us ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent loop without network access.")
+    parser.add_argument("--history", type=_int_list, default=[20, 200, 2000], help="Comma-separated history lengths (messages).")
+    parser.add_argument("--skills", type=_int_list, default=[10, 100], help="Comma-separated skill counts.")
+    parser.add_argument("--corpus", type=_int_list, default=[100, 5000], help="Comma-separated knowledge corpus sizes (chunks).")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed iterations per benchmark.")
+    parser.add_argument("--only", type=lambda v: v.split(","), default=None, help="Only run benchmarks whose name starts with one of these prefixes.")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout.")
+    parser.add_argument("--compare", help="A previous JSON result to compare against.")
+    args = parser.parse_args()
+
+    results = run(args.history, args.skills, args.corpus, args.iterations, args.only)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,8 @@ setup(
         "openai",
         "python-dotenv",
         "duckduckgo-search",
+        # HTTP library of the openai/anthropic SDKs, used for pooled clients (http_pool.py)
+        "httpx2",
     ],
     extras_require={
         "all": ["anthropic", "google-generativeai"],